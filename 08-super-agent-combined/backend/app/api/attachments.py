@@ -0,0 +1,47 @@
+"""Attachment API endpoints serving content-addressed blobs."""
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.services.attachment_store import get_attachment_store
+from app.services.session_storage import SessionStorageBackend, get_storage
+from app.services.user_service import get_user_id_from_request
+
+
+router = APIRouter(prefix="/api", tags=["attachments"])
+
+
+@router.get("/attachments/{blob_hash}")
+async def get_attachment(
+    blob_hash: str,
+    request: Request,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
+    """
+    Stream an attachment blob by its SHA-256 hash.
+
+    Blobs are shared between users, so a blob is only served to users with a
+    session that references it. Blobs are immutable (the URL is derived from
+    the content), so responses can be cached by the browser indefinitely.
+    """
+    store = get_attachment_store()
+    blob_path = store.path(blob_hash)
+    if blob_path is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    user_id = get_user_id_from_request(request)
+    if not await storage.areferences_attachment(user_id, blob_hash):
+        # Same response as a missing blob, so hashes of other users' content cannot be probed
+        raise HTTPException(status_code=404, detail="Attachment not found")
+
+    mime_type = store.mime_type(blob_hash)
+    disposition = "inline" if store.is_allowed_mime_type(mime_type) else "attachment"
+    return FileResponse(
+        blob_path,
+        media_type=mime_type,
+        headers={
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "ETag": f'"{blob_hash}"',
+            "X-Content-Type-Options": "nosniff",
+            "Content-Disposition": f'{disposition}; filename="{blob_hash}"',
+        }
+    )
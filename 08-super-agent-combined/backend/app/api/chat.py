@@ -1,17 +1,90 @@
 """Chat API endpoints with SSE streaming."""
+import asyncio
 import json
-from fastapi import APIRouter, Request
+import time
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.models.schemas import ChatRequest
+from app.services.admission import get_admission_controller
 from app.services.service_factory import generate_response
+from app.services.session_storage import SessionStorageBackend, get_storage
+from app.services.stream_runs import StreamRun, get_stream_runs
+from app.services.stream_utils import (
+    batch_frames,
+    coalesce_text_events,
+    encode_sse,
+    encode_sse_comment,
+    event_to_sse,
+    with_heartbeat,
+)
 from app.services.user_service import get_user_id_from_request, extract_user_info
 
 
 router = APIRouter()
 
 
+async def _watch_disconnect(request: Request, run: StreamRun, stop: asyncio.Event):
+    """Poll the connection while the agent is busy; end the subscription once the client is gone."""
+    while not stop.is_set():
+        if await request.is_disconnected():
+            stop.set()
+            run.wake()
+            return
+        await asyncio.sleep(settings.stream_disconnect_poll_seconds)
+
+
+def _heartbeat_frame(started: float) -> str:
+    """Build the frame sent while a stream is idle (no id, so Last-Event-ID is unaffected)."""
+    if settings.stream_heartbeat_mode == "progress":
+        return encode_sse("progress", json.dumps({"elapsed_seconds": round(time.monotonic() - started)}))
+    return encode_sse_comment("ping")
+
+
+def _stream_response(run: StreamRun, request: Request, after_seq: int = 0) -> StreamingResponse:
+    """Stream a run's events after `after_seq` as SSE, each with its sequence number as id."""
+
+    async def frames():
+        # Writes only fail once there is something to send, so a client that
+        # left during a long tool call would otherwise go unnoticed
+        stop = asyncio.Event()
+        watcher = asyncio.create_task(_watch_disconnect(request, run, stop))
+        try:
+            async for seq, event in run.subscribe(after_seq, stop):
+                # One string per SSE frame, so each event is a single write
+                yield event_to_sse(event, event_id=seq)
+        finally:
+            stop.set()
+            watcher.cancel()
+
+    body = frames()
+    if settings.stream_heartbeat_seconds > 0:
+        # Keep proxies (e.g. the App Router) from closing the connection during long tool calls
+        started = time.monotonic()
+        body = with_heartbeat(body, settings.stream_heartbeat_seconds, lambda: _heartbeat_frame(started))
+    if settings.stream_batch_per_tick:
+        body = batch_frames(body)
+
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",  # Disable nginx buffering
+            "X-Run-Id": run.run_id,  # For resuming via GET /api/chat-stream/{run_id}
+        }
+    )
+
+
 @router.post("/chat-stream")
-async def chat_stream(chat_request: ChatRequest, request: Request):
+async def chat_stream(
+    chat_request: ChatRequest,
+    request: Request,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
     """
     Stream chat responses using Server-Sent Events (SSE).
 
@@ -25,59 +98,65 @@ async def chat_stream(chat_request: ChatRequest, request: Request):
     - tool_end: Tool invocation completed (JSON with tool_id, success)
     - error: Error messages
     - end: Signals end of stream
+
+    With `coalesce` set in the request, consecutive text chunks are merged
+    into one event per STREAM_COALESCE_WINDOW_MS.
+
+    The response is produced by a background run that outlives the
+    connection. Every event carries an `id:`; a client that lost the
+    connection resumes with GET /api/chat-stream/{X-Run-Id} and Last-Event-ID.
+    If no client is connected for STREAM_DISCONNECT_GRACE_SECONDS, the run
+    is cancelled.
+
+    Responses are admitted per ADMISSION_GLOBAL_LIMIT / ADMISSION_PER_USER_LIMIT;
+    a request that has to wait receives `queue` events with its position.
     """
     user_info = extract_user_info(request)
     user_id = user_info.user_id if user_info else "anonymous"
 
-    async def event_generator():
-        """Generate SSE events from the configured service."""
-        try:
-            # Use service factory to get the appropriate service
-            async for event in generate_response(
-                message=chat_request.message,
-                session_id=chat_request.session_id,
-                user_id=user_id,
-                timezone=chat_request.timezone,
-                user_name=user_info.given_name if user_info else None
-            ):
-                # Format as SSE
-                event_type = event["event"]
-                event_data = event["data"]
-
-                # Serialize data to JSON ONLY for dict/table data
-                # Text chunks should remain as plain strings
-                if isinstance(event_data, dict):
-                    event_data = json.dumps(event_data)
-                elif not isinstance(event_data, str):
-                    event_data = str(event_data)
-                # For strings, keep them as-is (don't JSON encode)
-
-                # Yield SSE formatted event
-                yield f"event: {event_type}\n"
-
-                # Handle multi-line data per SSE spec
-                # If data contains newlines, send multiple data: lines
-                if '\n' in event_data:
-                    for line in event_data.split('\n'):
-                        yield f"data: {line}\n"
-                else:
-                    yield f"data: {event_data}\n"
-
-                yield "\n"  # Empty line to signal end of event
-
-        except Exception as e:
-            # Send error event
-            yield "event: error\n"
-            yield f"data: {str(e)}\n\n"
-            yield "event: end\n"
-            yield "data: \n\n"
-
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",  # Disable nginx buffering
-        }
+    # Use service factory to get the appropriate service
+    events = generate_response(
+        message=chat_request.message,
+        session_id=chat_request.session_id,
+        user_id=user_id,
+        timezone=chat_request.timezone,
+        user_name=user_info.given_name if user_info else None,
+        storage=storage
     )
+    # Waits for a free slot (global and per user) before the service starts
+    events = get_admission_controller().run(user_id, events)
+    if chat_request.coalesce:
+        events = coalesce_text_events(
+            events,
+            window_ms=settings.stream_coalesce_window_ms,
+            max_bytes=settings.stream_coalesce_max_bytes
+        )
+
+    run = get_stream_runs().start(user_id, events)
+    return _stream_response(run, request)
+
+
+@router.get("/chat-stream/{run_id}")
+async def resume_chat_stream(
+    run_id: str,
+    request: Request,
+    last_event_id: Optional[str] = Header(default=None, alias="Last-Event-ID")
+):
+    """
+    Resume a chat stream after a dropped connection.
+
+    Replays the events after Last-Event-ID (all events if absent) and keeps
+    following the run until it ends, without invoking the model again.
+    """
+    user_id = get_user_id_from_request(request)
+    run = get_stream_runs().get(run_id, user_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+
+    try:
+        after_seq = max(0, int(last_event_id)) if last_event_id else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    metrics.inc("stream_runs_resumed_total")
+    return _stream_response(run, request, after_seq)
@@ -4,13 +4,14 @@ Supports user-specific session storage.
 """
 import logging
 from datetime import datetime
-from typing import List, Literal
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Depends, Query, Request, Response
 from pydantic import BaseModel
 
-from app.models.schemas import ChatHistoryItem, ChatSession, ChatMessage, TableData, ChatAttachment
-from app.services.session_storage import get_storage
+from app.models.schemas import ChatHistoryItem, ChatSearchHit, ChatSession, ChatMessage, TableData, ChatAttachment
+from app.services.agent_checkpointer import delete_checkpoint
+from app.services.session_storage import SessionStorageBackend, get_storage
 from app.services.title_generation import generate_session_title as generate_title_with_llm
 from app.services.user_service import get_user_id_from_request
 
@@ -46,25 +47,60 @@ class AddMessageRequest(BaseModel):
 
 
 @router.get("/chat-history", response_model=List[ChatHistoryItem])
-async def list_chat_history(request: Request):
+async def list_chat_history(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=200),
+    cursor: Optional[str] = None,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
     """
-    List all chat sessions with metadata for the current user.
+    List chat sessions with metadata for the current user.
     Returns sessions sorted by most recent first.
+
+    Pass `limit` to page through the history; the cursor for the next page is
+    returned in the `X-Next-Cursor` response header (absent on the last page).
+    """
+    user_id = get_user_id_from_request(request)
+    try:
+        page = await storage.alist_sessions_page(user_id, limit=limit, cursor=cursor)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items
+
+
+@router.get("/chat-history/search", response_model=List[ChatSearchHit])
+async def search_chat_history(
+    request: Request,
+    q: str = Query(min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    storage: SessionStorageBackend = Depends(get_storage)
+):
+    """
+    Full-text search over the current user's messages.
+
+    Returns matching messages (all search terms must occur) with a snippet
+    around the match, most relevant first.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
-    return storage.list_sessions(user_id)
+    return await storage.asearch_messages(user_id, q, limit)
 
 
 @router.get("/chat-history/{session_id}", response_model=ChatSession)
-async def get_chat_session(session_id: str, request: Request):
+async def get_chat_session(
+    session_id: str,
+    request: Request,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
     """
     Get a specific chat session by ID for the current user.
     Returns full session with all messages.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
-    session = storage.get_session(user_id, session_id)
+    session = await storage.aget_session(user_id, session_id)
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -72,7 +108,7 @@ async def get_chat_session(session_id: str, request: Request):
     return session
 
 
-async def _process_untitled_sessions(user_id: str):
+async def _process_untitled_sessions(storage: SessionStorageBackend, user_id: str):
     """
     Background task to generate titles for sessions that don't have LLM-generated titles.
 
@@ -80,23 +116,21 @@ async def _process_untitled_sessions(user_id: str):
     (1 complete exchange). This ensures even single-exchange chats get proper titles.
     """
     try:
-        storage = get_storage()
-        sessions = storage.list_sessions(user_id)
+        sessions = await storage.alist_sessions(user_id)
 
         untitled_count = 0
         for session_item in sessions:
-            # Get full session to check title_generated flag
-            session = storage.get_session(user_id, session_item.session_id)
             # Generate title if: not generated yet AND has at least 2 messages (1 exchange)
+            if session_item.title_generated or session_item.message_count < 2:
+                continue
+            session = await storage.aget_session(user_id, session_item.session_id)
             if session and not session.title_generated and len(session.messages) >= 2:
                 untitled_count += 1
                 logger.info(f"Generating title for old session {session.session_id} ({len(session.messages)} messages)")
 
                 # Generate title
                 title = await generate_title_with_llm(session)
-                session.title = title
-                session.title_generated = True
-                storage.update_session(user_id, session)
+                await storage.aupdate_session_metadata(user_id, session.session_id, title=title, title_generated=True)
 
                 logger.info(f"Generated title for old session {session.session_id}: {title}")
 
@@ -113,7 +147,8 @@ async def _process_untitled_sessions(user_id: str):
 async def create_chat_session(
     request_body: CreateSessionRequest,
     request: Request,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    storage: SessionStorageBackend = Depends(get_storage)
 ):
     """
     Create a new chat session for the current user.
@@ -121,17 +156,20 @@ async def create_chat_session(
     Also triggers background processing of any old sessions without LLM-generated titles.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
-    session = storage.create_session(user_id, title=request_body.title)
+    session = await storage.acreate_session(user_id, title=request_body.title)
 
     # Process old sessions without titles in the background
-    background_tasks.add_task(_process_untitled_sessions, user_id)
+    background_tasks.add_task(_process_untitled_sessions, storage, user_id)
 
     return session
 
 
 @router.delete("/chat-history/{session_id}")
-async def delete_chat_session(session_id: str, request: Request):
+async def delete_chat_session(
+    session_id: str,
+    request: Request,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
     """
     Delete a chat session for the current user.
 
@@ -139,20 +177,20 @@ async def delete_chat_session(session_id: str, request: Request):
     to ensure there's always an active session available.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
-    success = storage.delete_session(user_id, session_id)
+    success = await storage.adelete_session(user_id, session_id)
 
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
+    await delete_checkpoint(user_id, session_id)
 
     # Check if this was the last session
-    remaining_sessions = storage.list_sessions(user_id)
+    remaining_sessions = (await storage.alist_sessions_page(user_id, limit=1)).items
     new_session_id = None
 
     if len(remaining_sessions) == 0:
         # Create a new default session if list is empty
         logger.info(f"Last session deleted for user {user_id}, creating new default session")
-        new_session = storage.create_session(user_id, title="New Chat")
+        new_session = await storage.acreate_session(user_id, title="New Chat")
         new_session_id = new_session.session_id
         logger.info(f"Created new default session: {new_session_id}")
 
@@ -164,15 +202,18 @@ async def delete_chat_session(session_id: str, request: Request):
 
 
 @router.post("/generate-title", response_model=GenerateTitleResponse)
-async def generate_session_title(request_body: GenerateTitleRequest, request: Request):
+async def generate_session_title(
+    request_body: GenerateTitleRequest,
+    request: Request,
+    storage: SessionStorageBackend = Depends(get_storage)
+):
     """
     Generate a title for a chat session based on its messages.
     For now, uses simple logic: first 10 words of first user message.
     Future: Use LLM to generate meaningful titles.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
-    session = storage.get_session(user_id, request_body.session_id)
+    session = await storage.aget_session(user_id, request_body.session_id)
 
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -191,17 +232,15 @@ async def generate_session_title(request_body: GenerateTitleRequest, request: Re
                 title += "..."
 
     # Update session title
-    session.title = title
-    storage.update_session(user_id, session)
+    await storage.aupdate_session_metadata(user_id, session.session_id, title=title)
 
     return GenerateTitleResponse(title=title)
 
 
-async def _generate_title_background(user_id: str, session_id: str):
+async def _generate_title_background(storage: SessionStorageBackend, user_id: str, session_id: str):
     """Background task to generate title for a session using LLM."""
     try:
-        storage = get_storage()
-        session = storage.get_session(user_id, session_id)
+        session = await storage.aget_session(user_id, session_id)
 
         if not session:
             logger.warning(f"Session {session_id} not found for title generation")
@@ -210,10 +249,8 @@ async def _generate_title_background(user_id: str, session_id: str):
         # Generate title using LLM
         title = await generate_title_with_llm(session)
 
-        # Update session with generated title
-        session.title = title
-        session.title_generated = True
-        storage.update_session(user_id, session)
+        # Update only the title so messages appended during generation are not overwritten
+        await storage.aupdate_session_metadata(user_id, session_id, title=title, title_generated=True)
 
         logger.info(f"Background title generation completed for session {session_id}: {title}")
     except Exception as e:
@@ -225,7 +262,8 @@ async def append_chat_message(
     session_id: str,
     request_body: AddMessageRequest,
     request: Request,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    storage: SessionStorageBackend = Depends(get_storage)
 ):
     """
     Append a message to the specified chat session and return the updated session.
@@ -233,9 +271,8 @@ async def append_chat_message(
     Automatically triggers title generation after 4-5 messages if not already generated.
     """
     user_id = get_user_id_from_request(request)
-    storage = get_storage()
 
-    session = storage.get_session(user_id, session_id)
+    session = await storage.aget_session(user_id, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -247,11 +284,15 @@ async def append_chat_message(
         attachments=request_body.attachments,
     )
 
-    success = storage.add_message(user_id, session_id, message)
+    try:
+        success = await storage.aadd_message(user_id, session_id, message)
+    except ValueError as exc:
+        # Rejected attachment type
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     if not success:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    updated_session = storage.get_session(user_id, session_id)
+    updated_session = await storage.aget_session(user_id, session_id)
     if not updated_session:
         raise HTTPException(status_code=500, detail="Failed to load updated session")
 
@@ -260,6 +301,6 @@ async def append_chat_message(
     # 2. Session has at least 4 messages (2 exchanges)
     if not updated_session.title_generated and len(updated_session.messages) >= 4:
         logger.info(f"Triggering background title generation for session {session_id}")
-        background_tasks.add_task(_generate_title_background, user_id, session_id)
+        background_tasks.add_task(_generate_title_background, storage, user_id, session_id)
 
     return updated_session
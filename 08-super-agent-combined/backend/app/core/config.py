@@ -14,13 +14,48 @@ class Settings(BaseSettings):
     port: int = 8000
     cors_origins: str = "http://localhost:5173"
     log_level: str = "INFO"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
+    warmup_enabled: bool = True  # Initialize models, MCP tools and the agent graph at startup (see app/services/warmup.py)
+    warmup_timeout_seconds: float = 60.0  # Per-component limit; /health reports 503 until warm-up has finished
     
     # Service Mode Selection
     mock_mode: bool = True
     agentic_mode: bool = False  # Enable DeepAgent with MCP tools
 
+    # Chat Session Storage
+    session_storage_backend: str = "json"  # "json" (file per session, good for dev) or "sqlite"
+    session_data_dir: str = "./data/sessions"  # Used by the JSON backend
+    session_journal_compact_bytes: int = 262144  # JSON backend: fold the message journal into the snapshot above this size
+    session_sqlite_path: str = "./data/sessions.db"  # Used by the SQLite backend
+    session_cache_max_entries: int = 256  # JSON backend: parsed sessions kept in memory (0 disables)
+    session_cache_max_bytes: int = 67108864  # JSON backend: approximate byte budget of the session cache
+    session_storage_io_workers: int = 4  # Threads for non-blocking storage I/O from async handlers
+    session_serialization_format: str = "orjson"  # JSON backend snapshots: "orjson", "msgpack" or "json" (indented, for debugging)
+    attachment_data_dir: str = "./data/attachments"  # Content-addressed attachment blobs
+
+    # DeepAgent conversation state and tool execution
+    agent_checkpointer: str = "sqlite"  # "sqlite", "postgres", "redis", "memory" or "none" (replay history every turn)
+    agent_checkpoint_sqlite_path: str = "./data/checkpoints.db"  # Used by the sqlite checkpointer
+    agent_checkpoint_url: str = ""  # Connection string for the postgres / redis checkpointers
+    agent_tool_concurrency: int = 4  # Max MCP tool calls of one request running at once (0 = unlimited)
+
+    # Admission control for chat responses
+    admission_global_limit: int = 16  # Max responses generated at once by this pod (0 = unlimited)
+    admission_per_user_limit: int = 2  # Max responses generated at once per user (0 = unlimited)
+    admission_max_queue: int = 100  # Requests waiting beyond this are rejected (0 = unbounded)
+
     # MCP Server
     mcp_server_url: str = "http://localhost:3001/mcp"  # For Kyma: http://backend-mcp-service:3001/mcp
+    mcp_pool_size: int = 2  # Persistent MCP sessions shared by all requests (see app/services/mcp_pool.py)
+    mcp_health_interval_seconds: float = 30.0  # Ping interval per session; a failed ping triggers a reconnect
+    mcp_reconnect_max_seconds: float = 30.0  # Upper bound of the exponential reconnect backoff
+    mcp_connect_timeout_seconds: float = 10.0  # Max wait for a session while the pool is (re)connecting
+    mcp_call_timeout_seconds: float = 300.0  # Read timeout of a single tool call
+    tool_cache_enabled: bool = True  # Cache successful MCP tool results (see app/services/tool_cache.py)
+    tool_cache_ttls: str = "get_product_api_documentation=21600,get_time_and_place=0"  # Per-tool TTLs in seconds, fnmatch patterns, 0 = never
+    tool_cache_metadata_ttl_seconds: float = 21600.0  # Calls that fetch $metadata
+    tool_cache_default_ttl_seconds: float = 30.0  # Data queries
+    tool_cache_max_entries: int = 512
+    tool_cache_global_tools: str = "get_product_api_documentation"  # fnmatch patterns of tools whose results are shared by all users; others are cached per user
     
     # SAP Generative AI Hub
     aicore_base_url: str = Field(
@@ -59,6 +94,26 @@ class Settings(BaseSettings):
     summarization_llm_model: str = "gpt-5-mini"  # Faster/cheaper model for title generation
     summarization_temperature: float = 0.3
     summarization_max_tokens: int = 50
+
+    # Chat history context window (see app/services/context_window.py)
+    context_max_tokens: int = 32000  # Default history token budget per request
+    context_model_budgets: str = ""  # Per-model budgets, e.g. "gpt-4.1=64000,gpt-5-mini=16000"
+    context_keep_turns: int = 6  # Most recent turns sent verbatim; older ones are summarized
+    context_image_turns: int = 2  # Most recent turns whose images are sent; older images become placeholders
+    context_summary_max_tokens: int = 800  # Output limit for the rolling history summary
+
+    # SSE streaming (text coalescing is opt-in per request via ChatRequest.coalesce)
+    stream_coalesce_window_ms: int = 15  # Max time text chunks are held back before a 'text' event is sent
+    stream_coalesce_max_bytes: int = 1024  # Buffered text size that flushes a 'text' event immediately
+    stream_tool_args_deltas: bool = False  # Also send 'tool_args_delta' events while tool call arguments stream
+    stream_batch_per_tick: bool = False  # Send SSE frames produced in the same event loop tick as one write
+    stream_run_buffer_events: int = 2000  # Events kept per response for Last-Event-ID replay
+    stream_run_spill_dir: str = ""  # Directory for events evicted from the buffer (empty = drop them), e.g. ./data/stream_runs
+    stream_run_ttl_seconds: float = 300  # How long a finished response can still be resumed
+    stream_disconnect_grace_seconds: float = 10  # Cancel a response nobody is connected to after this long
+    stream_disconnect_poll_seconds: float = 1  # How often an idle stream checks whether its client is gone
+    stream_heartbeat_seconds: float = 15  # Send a heartbeat after this long without events (0 = disabled)
+    stream_heartbeat_mode: str = "comment"  # "comment" (": ping" frame) or "progress" (progress event)
     
     # Audio Transcription
     audio_transcription_model: str = "gemini-2.5-flash"
@@ -76,6 +131,16 @@ class Settings(BaseSettings):
         """Parse CORS origins from comma-separated string."""
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
+    @property
+    def context_model_budgets_map(self) -> dict[str, int]:
+        """Parse per-model context budgets from comma-separated model=tokens pairs."""
+        budgets = {}
+        for pair in self.context_model_budgets.split(","):
+            model, _, tokens = pair.partition("=")
+            if model.strip() and tokens.strip():
+                budgets[model.strip()] = int(tokens)
+        return budgets
+
     def ensure_sdk_env(self) -> None:
         """Ensure required SAP AI Core env vars are exported for the SDK."""
         env_map = {
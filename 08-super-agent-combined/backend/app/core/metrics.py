@@ -0,0 +1,66 @@
+"""
+Lightweight in-process metrics registry.
+
+Counters, gauges and timing summaries are kept in memory per worker process
+and exposed as JSON by the ``/metrics`` endpoint.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any
+
+
+def _key(name: str, labels: dict[str, Any]) -> str:
+    """Build a flat metric key such as ``mcp_call_seconds{tool=stock_api}``."""
+    if not labels:
+        return name
+    label_str = ",".join(f"{label}={value}" for label, value in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters, gauges and summaries."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counters: dict[str, float] = {}
+        self._gauges: dict[str, float] = {}
+        self._summaries: dict[str, dict[str, float]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Increment a counter."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        """Set a gauge to the given value."""
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        """Record an observation (e.g. a latency in seconds) in a summary."""
+        key = _key(name, labels)
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                summary = self._summaries[key] = {"count": 0, "sum": 0.0, "max": 0.0}
+            summary["count"] += 1
+            summary["sum"] += value
+            summary["max"] = max(summary["max"], value)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a copy of all metrics for reporting."""
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "summaries": {
+                    key: {**summary, "avg": summary["sum"] / summary["count"] if summary["count"] else 0.0}
+                    for key, summary in self._summaries.items()
+                },
+            }
+
+
+# Global metrics instance
+metrics = MetricsRegistry()
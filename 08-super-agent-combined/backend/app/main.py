@@ -1,11 +1,18 @@
 """Main FastAPI application entry point."""
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
-from app.api import chat, chat_history, audio, user
+from app.core.metrics import metrics
+from app.api import chat, chat_history, audio, user, attachments
+from app.services.agent_checkpointer import close_checkpointer
 from app.services.deepagent_service import cleanup_deepagent_service
+from app.services.session_storage import get_storage
+from app.services.stream_runs import close_stream_runs
+from app.services.warmup import is_ready, mark_ready, run_warmup, warmup_status
 
 # Configure logging
 logging.basicConfig(
@@ -25,12 +32,22 @@ logger.info(f"Starting Super Agent Backend (Log Level: {settings.log_level})")
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifespan context manager for startup and shutdown events."""
-    # Startup
+    # Startup: warm up in the background so the server already answers /health
+    warmup_task = None
+    if settings.warmup_enabled:
+        warmup_task = asyncio.create_task(run_warmup())
+    else:
+        mark_ready()
     logger.info("Application startup complete")
     yield
     # Shutdown
     logger.info("Starting application shutdown")
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    await close_stream_runs()
     await cleanup_deepagent_service()
+    await close_checkpointer()
+    get_storage().close()
     logger.info("Application shutdown complete")
 
 
@@ -49,6 +66,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Run-Id"],
 )
 
 # Include routers
@@ -56,6 +74,7 @@ app.include_router(chat.router, prefix="/api", tags=["chat"])
 app.include_router(chat_history.router)
 app.include_router(audio.router)
 app.include_router(user.router)
+app.include_router(attachments.router)
 
 
 @app.get("/")
@@ -71,9 +90,20 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Detailed health check."""
-    return {
-        "status": "healthy",
-        "mock_mode": settings.mock_mode,
-        "cors_origins": settings.cors_origins_list
-    }
+    """Detailed health check; returns 503 until startup warm-up has finished."""
+    ready = is_ready()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "healthy" if ready else "starting",
+            "mock_mode": settings.mock_mode,
+            "cors_origins": settings.cors_origins_list,
+            "warmup": warmup_status(),
+        }
+    )
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process metrics of this worker (counters, gauges and timing summaries)."""
+    return metrics.snapshot()
@@ -14,7 +14,8 @@ class ChatAttachment(BaseModel):
     name: str
     mime_type: str
     size: int
-    data: str  # base64 encoded data
+    data: str | None = None  # base64 encoded data (inline on upload only, moved to the attachment store on save)
+    hash: str | None = None  # SHA-256 of the content in the attachment store
 
 
 class ChatMessage(BaseModel):
@@ -31,6 +32,7 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=5000)
     session_id: str | None = None
     timezone: str | None = None  # IANA timezone from browser, e.g. "America/New_York"
+    coalesce: bool = False  # Merge streamed text chunks into fewer 'text' events (see STREAM_COALESCE_*)
 
 
 class ChatHistoryItem(BaseModel):
@@ -40,6 +42,24 @@ class ChatHistoryItem(BaseModel):
     last_message: str
     timestamp: datetime
     message_count: int
+    title_generated: bool = False  # True if title was generated by LLM
+
+
+class ChatHistoryPage(BaseModel):
+    """One page of chat history items with the cursor for the next page."""
+    items: list[ChatHistoryItem]
+    next_cursor: str | None = None  # None when there are no further pages
+
+
+class ChatSearchHit(BaseModel):
+    """Message matching a chat history search."""
+    session_id: str
+    title: str
+    message_index: int  # Position of the message within the session
+    role: Literal["user", "assistant"]
+    snippet: str  # Excerpt around the match, matched terms wrapped in ** markers
+    timestamp: datetime
+    score: float  # Relevance (BM25), higher is better
 
 
 class ChatSession(BaseModel):
@@ -52,6 +72,8 @@ class ChatSession(BaseModel):
     title_generated: bool = False  # True if title was generated by LLM
     user_id: str | None = None  # Owner of this session
     greeted: bool = False  # True if user has been greeted in this session
+    summary: str | None = None  # Rolling summary of older messages (see context_window.py)
+    summary_message_count: int = 0  # Number of leading messages covered by the summary
 
 
 class CreateSessionRequest(BaseModel):
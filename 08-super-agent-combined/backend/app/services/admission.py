@@ -0,0 +1,214 @@
+"""
+Admission control for chat responses.
+
+Bounds the number of concurrent service runs per pod
+(``settings.admission_global_limit``) and per user
+(``settings.admission_per_user_limit``), so one user sending many requests
+cannot exhaust the AI Core rate limits for everyone. Requests over a limit
+wait in per-user FIFO queues that are served round-robin: whenever a slot
+frees up, the next user in the rotation who is below their own limit gets
+it, whatever the order of arrival.
+
+Waiting requests receive ``queue`` events with their estimated position.
+Metrics: ``admission_wait_seconds``, the ``admission_queue_depth`` and
+``admission_active_runs`` gauges and ``admission_rejected_total{reason=...}``.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Waiter:
+    """A request waiting for a slot."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.granted = False
+        self.wake = asyncio.Event()  # Set when granted or when the queue changed
+
+
+class AdmissionController:
+    """Global and per-user run limits with a round-robin queue across users."""
+
+    def __init__(self, global_limit: int, per_user_limit: int, max_queue: int):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.max_queue = max_queue
+        self._running = 0
+        self._running_per_user: Dict[str, int] = {}
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        # Users with waiting requests, in serving order
+        self._rotation: Deque[str] = deque()
+        self._depth = 0
+
+    @classmethod
+    def from_settings(cls) -> "AdmissionController":
+        """Create a controller configured by the ADMISSION_* settings."""
+        return cls(
+            global_limit=settings.admission_global_limit,
+            per_user_limit=settings.admission_per_user_limit,
+            max_queue=settings.admission_max_queue,
+        )
+
+    def _has_slot(self, user_id: str) -> bool:
+        if self.global_limit > 0 and self._running >= self.global_limit:
+            return False
+        return self.per_user_limit <= 0 or self._running_per_user.get(user_id, 0) < self.per_user_limit
+
+    def _start(self, user_id: str):
+        self._running += 1
+        self._running_per_user[user_id] = self._running_per_user.get(user_id, 0) + 1
+        metrics.set_gauge("admission_active_runs", self._running)
+
+    def _release(self, user_id: str):
+        self._running -= 1
+        remaining = self._running_per_user[user_id] - 1
+        if remaining:
+            self._running_per_user[user_id] = remaining
+        else:
+            del self._running_per_user[user_id]
+        metrics.set_gauge("admission_active_runs", self._running)
+        self._dispatch()
+
+    def _update_depth(self, delta: int):
+        self._depth += delta
+        metrics.set_gauge("admission_queue_depth", self._depth)
+
+    def _dispatch(self):
+        """Grant free slots round-robin to the users in the rotation."""
+        skipped = 0
+        while self._rotation and skipped < len(self._rotation):
+            if self.global_limit > 0 and self._running >= self.global_limit:
+                break
+            user_id = self._rotation.popleft()
+            queue = self._queues[user_id]
+            if not self._has_slot(user_id):
+                # At their own limit: keep their place for the next round
+                self._rotation.append(user_id)
+                skipped += 1
+                continue
+
+            waiter = queue.popleft()
+            self._update_depth(-1)
+            self._start(user_id)
+            waiter.granted = True
+            waiter.wake.set()
+            skipped = 0
+            if queue:
+                self._rotation.append(user_id)
+            else:
+                del self._queues[user_id]
+
+        # Positions may have changed for everyone still waiting
+        for queue in self._queues.values():
+            for waiter in queue:
+                waiter.wake.set()
+
+    def position(self, waiter: _Waiter) -> int:
+        """
+        Estimate how many requests (including this one) will be admitted before the waiter.
+
+        With round-robin serving, a request that is n-th in its user's queue
+        waits for up to n requests of every other user in the rotation.
+        """
+        queue = self._queues[waiter.user_id]
+        ahead_in_own_queue = queue.index(waiter)
+        position = ahead_in_own_queue + 1
+        before_in_rotation = True
+        for user_id in self._rotation:
+            if user_id == waiter.user_id:
+                before_in_rotation = False
+                continue
+            rounds = ahead_in_own_queue + (1 if before_in_rotation else 0)
+            position += min(len(self._queues[user_id]), rounds)
+        return position
+
+    def _remove(self, waiter: _Waiter):
+        """Drop a waiter that gave up (e.g. its run was cancelled)."""
+        queue = self._queues[waiter.user_id]
+        queue.remove(waiter)
+        self._update_depth(-1)
+        if not queue:
+            del self._queues[waiter.user_id]
+            self._rotation.remove(waiter.user_id)
+        self._dispatch()
+
+    async def run(self, user_id: str, events: AsyncIterator[dict]) -> AsyncGenerator[dict, None]:
+        """
+        Pass a service's events through once the user's request is admitted.
+
+        Until then, yields `queue` events whenever the request's position changes.
+
+        Args:
+            user_id: User the request belongs to
+            events: Service event stream (only started once admitted)
+
+        Yields:
+            Queue events, then the service's events
+        """
+        start = time.perf_counter()
+        if not self._queues.get(user_id) and self._has_slot(user_id):
+            self._start(user_id)
+        elif self.max_queue > 0 and self._depth >= self.max_queue:
+            metrics.inc("admission_rejected_total", reason="queue_full")
+            logger.warning(f"Admission queue full ({self._depth}), rejecting request of user {user_id}")
+            yield {"event": "error", "data": "The service is busy, please try again in a moment."}
+            yield {"event": "end", "data": ""}
+            return
+        else:
+            waiter = _Waiter(user_id)
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._rotation.append(user_id)
+            self._queues[user_id].append(waiter)
+            self._update_depth(1)
+
+            last_position = None
+            try:
+                while not waiter.granted:
+                    position = self.position(waiter)
+                    if position != last_position:
+                        last_position = position
+                        yield {"event": "queue", "data": {"position": position, "queue_depth": self._depth}}
+                    await waiter.wake.wait()
+                    waiter.wake.clear()
+            except BaseException:
+                # Cancelled or closed while waiting (or right after being granted)
+                if waiter.granted:
+                    self._release(user_id)
+                else:
+                    self._remove(waiter)
+                raise
+
+            logger.info(f"Admitted request of user {user_id} after {time.perf_counter() - start:.2f}s in queue")
+
+        metrics.observe("admission_wait_seconds", time.perf_counter() - start)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            self._release(user_id)
+
+
+# Global instance
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Get or create the global admission controller.
+
+    Returns:
+        AdmissionController instance
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController.from_settings()
+    return _controller
@@ -0,0 +1,131 @@
+"""
+LangGraph checkpointer for DeepAgent conversation state.
+
+Agent state is checkpointed per chat session (thread ID ``user_id:session_id``),
+so each turn only sends the new user message and the agent resumes from its
+saved state instead of replaying the whole history.
+
+Backends (``settings.agent_checkpointer``):
+    sqlite   - local SQLite file (default, requires langgraph-checkpoint-sqlite)
+    postgres - shared Postgres database (requires langgraph-checkpoint-postgres)
+    redis    - shared Redis instance (requires langgraph-checkpoint-redis)
+    memory   - in-process only, lost on restart (development)
+    none     - disabled; the history is replayed from session storage every turn
+"""
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from pathlib import Path
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Global instance
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_exit_stack: Optional[AsyncExitStack] = None
+_init_lock = asyncio.Lock()
+
+
+def thread_config(user_id: str, session_id: str) -> dict:
+    """Build the LangGraph run config addressing a chat session's checkpoint thread."""
+    return {"configurable": {"thread_id": f"{user_id}:{session_id}"}}
+
+
+async def _create_checkpointer(backend: str, exit_stack: AsyncExitStack) -> Optional[BaseCheckpointSaver]:
+    """Create the configured checkpointer, registering its connection with the exit stack."""
+    if backend == "none":
+        return None
+
+    if backend == "memory":
+        from langgraph.checkpoint.memory import InMemorySaver
+        return InMemorySaver()
+
+    if backend == "sqlite":
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        db_path = Path(settings.agent_checkpoint_sqlite_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        saver = await exit_stack.enter_async_context(AsyncSqliteSaver.from_conn_string(str(db_path)))
+        await saver.setup()
+        return saver
+
+    if backend == "postgres":
+        from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+        saver = await exit_stack.enter_async_context(AsyncPostgresSaver.from_conn_string(settings.agent_checkpoint_url))
+        await saver.setup()
+        return saver
+
+    if backend == "redis":
+        from langgraph.checkpoint.redis.aio import AsyncRedisSaver
+        saver = await exit_stack.enter_async_context(
+            AsyncRedisSaver.from_conn_string(redis_url=settings.agent_checkpoint_url)
+        )
+        await saver.asetup()
+        return saver
+
+    raise ValueError(
+        f"Unsupported AGENT_CHECKPOINTER value: {backend!r}. Use 'sqlite', 'postgres', 'redis', 'memory' or 'none'."
+    )
+
+
+async def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    """
+    Get or create the global checkpointer.
+
+    Returns:
+        Checkpointer instance, or None if checkpointing is disabled
+    """
+    global _checkpointer, _exit_stack
+
+    if _exit_stack is not None:
+        return _checkpointer
+
+    async with _init_lock:
+        if _exit_stack is None:
+            backend = settings.agent_checkpointer.strip().lower()
+            exit_stack = AsyncExitStack()
+            try:
+                _checkpointer = await _create_checkpointer(backend, exit_stack)
+                logger.info(f"Agent checkpointer initialized: {backend}")
+            except ImportError as exc:
+                logger.error(f"Agent checkpointer '{backend}' is not installed ({exc}); replaying history instead")
+                _checkpointer = None
+            _exit_stack = exit_stack
+    return _checkpointer
+
+
+async def has_checkpoint(user_id: str, session_id: str) -> bool:
+    """Check whether a chat session already has saved agent state."""
+    checkpointer = await get_checkpointer()
+    if checkpointer is None:
+        return False
+    return await checkpointer.aget_tuple(thread_config(user_id, session_id)) is not None
+
+
+async def delete_checkpoint(user_id: str, session_id: str) -> None:
+    """Delete the saved agent state of a chat session (e.g. when the session is deleted)."""
+    checkpointer = await get_checkpointer()
+    if checkpointer is None:
+        return
+    try:
+        await checkpointer.adelete_thread(thread_config(user_id, session_id)["configurable"]["thread_id"])
+    except Exception as exc:
+        logger.warning(f"Failed to delete agent checkpoint for session {session_id}: {exc}")
+
+
+async def close_checkpointer() -> None:
+    """
+    Close the checkpointer connection.
+
+    Should be called on application shutdown.
+    """
+    global _checkpointer, _exit_stack
+
+    if _exit_stack is not None:
+        logger.info("Closing agent checkpointer")
+        await _exit_stack.aclose()
+    _checkpointer = None
+    _exit_stack = None
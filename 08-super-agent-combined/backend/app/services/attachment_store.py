@@ -0,0 +1,177 @@
+"""
+Content-addressed blob store for chat attachments.
+
+Attachment bytes are written once to a file named after their SHA-256 hash
+and shared by every session (and user) that references them. Sessions only
+keep the hash, so session files stay small and blobs are read lazily when a
+model request or the attachments endpoint actually needs them.
+"""
+import base64
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+from app.models.schemas import ChatAttachment, ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Mode of newly created files under the current umask (mkstemp alone would create them 0600)
+_umask = os.umask(0)
+os.umask(_umask)
+_NEW_FILE_MODE = 0o666 & ~_umask
+
+# Blobs are served from the backend origin, so only image types that cannot carry script are accepted
+_BLOCKED_IMAGE_TYPES = {"image/svg+xml"}
+
+
+class AttachmentStore:
+    """SHA-256 keyed file store for attachment blobs."""
+
+    def __init__(self, data_dir: str = "./data/attachments"):
+        self.data_dir = Path(data_dir)
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def is_valid_hash(blob_hash: str) -> bool:
+        """Check that a hash is a lowercase hex SHA-256 digest (also guards against path traversal)."""
+        return bool(_HASH_PATTERN.match(blob_hash))
+
+    @staticmethod
+    def is_allowed_mime_type(mime_type: str) -> bool:
+        """Check that a MIME type may be stored and served (raster images only)."""
+        mime_type = mime_type.split(";")[0].strip().lower()
+        return mime_type.startswith("image/") and mime_type not in _BLOCKED_IMAGE_TYPES
+
+    def _blob_path(self, blob_hash: str) -> Path:
+        """Get the path of a blob, fanned out by hash prefix to keep directories small."""
+        return self.data_dir / blob_hash[:2] / blob_hash
+
+    def _mime_path(self, blob_hash: str) -> Path:
+        """Get the path of the sidecar file holding a blob's MIME type."""
+        return self._blob_path(blob_hash).with_suffix(".mime")
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        """Write a file via temp file + rename so readers never see partial content."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            os.chmod(tmp_path, _NEW_FILE_MODE)
+            with os.fdopen(fd, "wb") as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """
+        Store blob bytes, deduplicating identical content.
+
+        Args:
+            data: Raw attachment bytes
+            mime_type: MIME type served with the blob
+
+        Returns:
+            SHA-256 hex digest identifying the blob
+
+        Raises:
+            ValueError: If the MIME type is not an allowed image type
+        """
+        if not self.is_allowed_mime_type(mime_type):
+            raise ValueError(f"Unsupported attachment type: {mime_type}")
+        blob_hash = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(blob_hash)
+        if not blob_path.exists():
+            self._write_atomic(blob_path, data)
+            self._write_atomic(self._mime_path(blob_hash), mime_type.encode("utf-8"))
+            logger.debug(f"Stored attachment blob {blob_hash} ({len(data)} bytes)")
+        return blob_hash
+
+    def path(self, blob_hash: str) -> Optional[Path]:
+        """Get the file path of a stored blob, or None if it does not exist."""
+        if not self.is_valid_hash(blob_hash):
+            return None
+        blob_path = self._blob_path(blob_hash)
+        return blob_path if blob_path.exists() else None
+
+    def mime_type(self, blob_hash: str) -> str:
+        """Get the MIME type recorded for a blob (application/octet-stream unless it is an allowed type)."""
+        mime_path = self._mime_path(blob_hash)
+        if mime_path.exists():
+            mime_type = mime_path.read_text(encoding="utf-8")
+            if self.is_allowed_mime_type(mime_type):
+                return mime_type
+        return "application/octet-stream"
+
+    def read_base64(self, blob_hash: str) -> Optional[str]:
+        """Read a blob as base64 text, or None if it does not exist."""
+        blob_path = self.path(blob_hash)
+        if blob_path is None:
+            return None
+        return base64.b64encode(blob_path.read_bytes()).decode("ascii")
+
+    def externalize(self, attachment: ChatAttachment) -> ChatAttachment:
+        """
+        Move inline base64 data of an attachment into the store.
+
+        Returns:
+            Copy of the attachment holding only the blob reference
+            (unchanged if the attachment has no inline data)
+
+        Raises:
+            ValueError: If the attachment is not an allowed image type
+        """
+        if not attachment.data:
+            return attachment
+        blob_hash = self.put(base64.b64decode(attachment.data), attachment.mime_type)
+        return attachment.model_copy(update={"data": None, "hash": blob_hash})
+
+    def externalize_message(self, message: ChatMessage) -> ChatMessage:
+        """
+        Move the inline data of all attachments of a message into the store.
+
+        Returns:
+            Copy of the message holding only blob references (the message
+            itself if none of its attachments has inline data)
+
+        Raises:
+            ValueError: If an attachment is not an allowed image type
+        """
+        if not any(att.data for att in message.attachments or []):
+            return message
+        return message.model_copy(update={"attachments": [self.externalize(att) for att in message.attachments]})
+
+    def data_url(self, attachment: ChatAttachment) -> Optional[str]:
+        """
+        Build a data: URL for an attachment, loading the blob lazily.
+
+        Returns:
+            data: URL, or None if the attachment content is unavailable
+        """
+        data = attachment.data
+        if not data and attachment.hash:
+            data = self.read_base64(attachment.hash)
+        if not data:
+            logger.warning(f"Attachment {attachment.id} has no inline data and no stored blob")
+            return None
+        return f"data:{attachment.mime_type};base64,{data}"
+
+
+# Global instance
+_attachment_store: Optional[AttachmentStore] = None
+
+
+def get_attachment_store() -> AttachmentStore:
+    """Get or create the global attachment store instance."""
+    global _attachment_store
+    if _attachment_store is None:
+        _attachment_store = AttachmentStore(settings.attachment_data_dir)
+    return _attachment_store
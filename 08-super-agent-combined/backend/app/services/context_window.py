@@ -0,0 +1,237 @@
+"""
+Token-budgeted context window for chat history.
+
+Instead of sending the whole session history to the model every turn, the
+last ``context_keep_turns`` turns are sent verbatim and older messages are
+replaced by a rolling summary stored on the session. The summary is updated
+incrementally (previous summary + newly aged-out messages) by the cheaper
+summarization model, normally in the background after the turn; it is only
+awaited when the unsummarized backlog would not fit the model's budget.
+
+Images are only sent for the most recent turns; older ones are replaced by a
+short text placeholder.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from gen_ai_hub.proxy.core.proxy_clients import get_proxy_client
+from gen_ai_hub.proxy.langchain import init_llm
+
+from app.core.config import settings
+from app.models.schemas import ChatMessage, ChatSession
+from app.services.session_storage import SessionStorageBackend
+
+# Configure logger
+logger = logging.getLogger(__name__)
+
+# Token estimates are heuristic: exact tokenizers differ per model family and
+# some (e.g. tiktoken) download their vocabularies on first use
+CHARS_PER_TOKEN = 4
+# Approximate prompt cost of one image (a high-detail 512px tile plus base cost)
+IMAGE_TOKENS = 850
+# Per-message overhead for role and formatting
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the summary with the new messages below. Keep every fact, name, number, decision,
+API detail and open question that later turns may rely on; drop small talk. Write in the
+language of the conversation, as concise bullet points.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+# Singleton summary LLM instance
+_summary_llm_instance: Optional[BaseChatModel] = None
+
+# Sessions with a summary update in flight, and the tasks running them
+_summaries_in_progress: Set[str] = set()
+_background_tasks: Set[asyncio.Task] = set()
+
+
+@dataclass
+class ContextWindow:
+    """History to send to the model for one turn."""
+    summary: Optional[str]  # Summary of the messages before `messages`, if any
+    messages: List[ChatMessage]  # Recent messages, verbatim (old images replaced by placeholders)
+    tokens: int  # Estimated prompt tokens of summary + messages
+
+
+def context_budget(model_name: str) -> int:
+    """Get the history token budget for a model (CONTEXT_MODEL_BUDGETS override or the default)."""
+    return settings.context_model_budgets_map.get(model_name, settings.context_max_tokens)
+
+
+@lru_cache(maxsize=8192)
+def count_text_tokens(text: str) -> int:
+    """Estimate the tokens of a text (cached, so each stored message is only counted once)."""
+    # Non-ASCII scripts (e.g. Japanese) use roughly one token per character
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return (len(text) - non_ascii) // CHARS_PER_TOKEN + non_ascii + 1
+
+
+def count_message_tokens(msg: ChatMessage) -> int:
+    """Estimate the prompt tokens of a message including image attachments."""
+    return MESSAGE_OVERHEAD_TOKENS + count_text_tokens(msg.content) + IMAGE_TOKENS * len(msg.attachments or [])
+
+
+def _without_images(msg: ChatMessage) -> ChatMessage:
+    """Replace a message's image attachments with a text placeholder."""
+    names = ", ".join(att.name for att in msg.attachments)
+    return msg.model_copy(update={
+        "content": f"{msg.content}\n[Image(s) shared earlier, not shown: {names}]".strip(),
+        "attachments": None,
+    })
+
+
+def _turn_starts(messages: List[ChatMessage]) -> List[int]:
+    """Indexes of the user messages that start each turn."""
+    return [index for index, msg in enumerate(messages) if msg.role == "user"]
+
+
+def _format_for_summary(messages: List[ChatMessage]) -> str:
+    """Render messages as plain text for the summarization prompt."""
+    lines = []
+    for msg in messages:
+        speaker = "User" if msg.role == "user" else "Assistant"
+        text = msg.content
+        if msg.attachments:
+            text += f" [shared image(s): {', '.join(att.name for att in msg.attachments)}]"
+        lines.append(f"{speaker}: {text}")
+    return "\n\n".join(lines)
+
+
+def _get_summary_llm() -> BaseChatModel:
+    """
+    Get or initialize the LLM used for history summaries (singleton pattern).
+
+    Uses the summarization model with its own output limit (titles use a much smaller one).
+
+    Returns:
+        Initialized summary LLM instance
+    """
+    global _summary_llm_instance
+
+    if _summary_llm_instance is None:
+        logger.info("Initializing context summary LLM instance (first time)")
+        _summary_llm_instance = init_llm(
+            model_name=settings.summarization_llm_model,
+            proxy_client=get_proxy_client(proxy_version="gen-ai-hub"),
+            max_tokens=settings.context_summary_max_tokens,
+            temperature=settings.summarization_temperature,
+        )
+        logger.info(f"Context summary LLM initialized with model: {settings.summarization_llm_model}")
+
+    return _summary_llm_instance
+
+
+async def _update_summary(
+    storage: SessionStorageBackend,
+    user_id: str,
+    session: ChatSession,
+    messages: List[ChatMessage],
+    cut: int
+) -> Optional[str]:
+    """
+    Fold messages[summary_message_count:cut] into the session summary and persist it.
+
+    Returns:
+        The updated summary, or None if summarization failed
+    """
+    key = f"{user_id}:{session.session_id}"
+    covered = session.summary_message_count if session.summary else 0
+    _summaries_in_progress.add(key)
+    try:
+        chain = ChatPromptTemplate.from_template(SUMMARY_PROMPT) | _get_summary_llm() | StrOutputParser()
+        summary = (await chain.ainvoke({
+            "summary": session.summary or "(none yet)",
+            "messages": _format_for_summary(messages[covered:cut]),
+        })).strip()
+        if not summary:
+            return None
+
+        await storage.aupdate_session_metadata(
+            user_id, session.session_id, summary=summary, summary_message_count=cut
+        )
+        logger.info(f"Summarized messages {covered}-{cut} of session {session.session_id}")
+        return summary
+    except Exception as exc:
+        logger.warning(f"Failed to update summary of session {session.session_id}: {exc}", exc_info=True)
+        return None
+    finally:
+        _summaries_in_progress.discard(key)
+
+
+async def build_context_window(
+    storage: SessionStorageBackend,
+    user_id: str,
+    session: ChatSession,
+    messages: List[ChatMessage],
+    model_name: str
+) -> ContextWindow:
+    """
+    Select the history to send for this turn.
+
+    Args:
+        storage: Storage to persist summary updates to
+        user_id: Owner of the session
+        session: Session the history belongs to (for its stored summary)
+        messages: History to fit, oldest first (a prefix of session.messages)
+        model_name: Model the history is sent to, for its token budget
+
+    Returns:
+        Summary of older messages plus the recent messages to send verbatim
+    """
+    budget = context_budget(model_name)
+    turn_starts = _turn_starts(messages)
+
+    # Keep the last N turns verbatim, fewer if they alone exceed the budget
+    kept_turns = turn_starts[-settings.context_keep_turns:] if settings.context_keep_turns > 0 else []
+    cut = kept_turns[0] if kept_turns else len(messages)
+    recent_budget = budget - settings.context_summary_max_tokens
+    for start in kept_turns[1:]:
+        if sum(count_message_tokens(msg) for msg in messages[cut:]) <= recent_budget:
+            break
+        cut = start
+
+    covered = min(session.summary_message_count, cut) if session.summary else 0
+    summary = session.summary if covered else None
+
+    if cut > covered:
+        backlog_tokens = sum(count_message_tokens(msg) for msg in messages[covered:])
+        key = f"{user_id}:{session.session_id}"
+        if backlog_tokens + settings.context_summary_max_tokens > budget:
+            # The unsummarized messages do not fit: summarize now
+            updated = await _update_summary(storage, user_id, session, messages, cut)
+            if updated:
+                summary, covered = updated, cut
+        elif key not in _summaries_in_progress:
+            # Fits for now: send the aged-out messages verbatim and summarize them for the next turn
+            task = asyncio.create_task(_update_summary(storage, user_id, session, messages, cut))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+    # Only the last `context_image_turns` turns keep their images
+    image_turns = turn_starts[-settings.context_image_turns:] if settings.context_image_turns > 0 else []
+    image_cut = image_turns[0] if image_turns else len(messages)
+    window = [
+        _without_images(msg) if index < image_cut and msg.attachments else msg
+        for index, msg in enumerate(messages[covered:], start=covered)
+    ]
+
+    tokens = sum(count_message_tokens(msg) for msg in window) + (count_text_tokens(summary) if summary else 0)
+    logger.debug(
+        f"Context window: {len(window)}/{len(messages)} message(s), "
+        f"summary={'yes' if summary else 'no'}, ~{tokens}/{budget} tokens"
+    )
+    return ContextWindow(summary=summary, messages=window, tokens=tokens)
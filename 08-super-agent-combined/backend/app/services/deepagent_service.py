@@ -1,8 +1,13 @@
 """DeepAgent service with MCP tools integration for agentic workflows."""
 import asyncio
 import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, AsyncGenerator, Optional
+from typing import Any, AsyncGenerator, Awaitable, Callable, Optional
 from collections.abc import Iterable
 from textwrap import dedent
 from zoneinfo import ZoneInfo
@@ -13,10 +18,20 @@ from gen_ai_hub.proxy.langchain import init_llm
 from gen_ai_hub.proxy.langchain.amazon import (
     init_chat_converse_model as amazon_init_converse_model
 )
-from langchain_mcp_adapters.client import MultiServerMCPClient
+from langchain.agents.middleware import AgentMiddleware, ModelRequest, ModelResponse, ToolCallRequest
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+from langgraph.types import Command
 
 from app.core.config import settings
-from app.services.session_storage import SessionStorage
+from app.core.metrics import metrics
+from app.models.schemas import ChatMessage
+from app.services.agent_checkpointer import get_checkpointer, has_checkpoint, thread_config
+from app.services.attachment_store import AttachmentStore, get_attachment_store
+from app.services.context_window import build_context_window
+from app.services.mcp_pool import MCPConnectionPool, close_mcp_pool, get_mcp_pool
+from app.services.session_storage import SessionStorageBackend, get_storage
+from app.services.tool_call_assembler import ToolCallAssembler
+from app.services.tool_cache import tool_cache_scope
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -26,22 +41,14 @@ model_name_amazon = 'anthropic--claude-4.5-sonnet'
 model_id_amazon = 'anthropic.claude-sonnet-4-5-20250929-v1:0'
 
 # Singleton instances
-_mcp_client_instance: Optional[MultiServerMCPClient] = None
 _model_instance: Optional[Any] = None
-_mcp_tools: Optional[list] = None
 
-# MCP server configuration - URL from settings (environment variable)
-def _get_mcp_server_config() -> dict:
-    """Get MCP server configuration with URL from settings."""
-    return {
-        "backend": {
-            "transport": "streamable_http",
-            "url": settings.mcp_server_url,
-        }
-    }
+# Compiled agent graphs keyed by (static prompt, model, tools); see _get_agent
+_AGENT_CACHE_SIZE = 4
+_agent_cache: "OrderedDict[tuple, Any]" = OrderedDict()
 
-# Thread configuration for conversation persistence
-THREAD_CONFIG = {"configurable": {"thread_id": "backend-session"}}
+# Caps concurrent MCP tool calls of the current agent run; set per request in generate_deepagent_response
+_tool_semaphore: ContextVar[Optional[asyncio.Semaphore]] = ContextVar("tool_semaphore", default=None)
 
 
 def _get_model() -> Any:
@@ -78,49 +85,69 @@ def _get_model() -> Any:
     return _model_instance
 
 
-async def _load_mcp_tools() -> tuple[list[Any], Optional[MultiServerMCPClient]]:
+@dataclass(frozen=True)
+class UserContext:
+    """Per-request user context, passed to the agent at invoke time (``context=``)."""
+    user_name: Optional[str] = None
+    timezone: Optional[str] = None
+    is_first_message: bool = False
+
+
+def _build_static_system_prompt() -> str:
     """
-    Connect to the local MCP server and retrieve available tools.
+    Build the static part of the system prompt shared by all users.
 
     Returns:
-        Tuple of (tools list, mcp_client instance or None)
+        System prompt the agent graph is compiled with
     """
-    global _mcp_tools, _mcp_client_instance
+    return dedent(
+        """You are a helpful AI assistant with access to various tools and data sources.
 
-    # Return cached tools if available
-    if _mcp_tools is not None and _mcp_client_instance is not None:
-        return _mcp_tools, _mcp_client_instance
+        IMPORTANT: Always respond in the SAME LANGUAGE as the user's message. If the user writes in English, respond in English. If they write in German, respond in German. Never assume a language based on timezone or location.
 
-    try:
-        mcp_config = _get_mcp_server_config()
-        logger.info(f"Connecting to MCP server at {mcp_config['backend']['url']}")
-        mcp_client = MultiServerMCPClient(mcp_config)
-        tools = await mcp_client.get_tools()
-        logger.info(f"Loaded {len(tools)} MCP tool(s)")
-        _mcp_tools = list(tools)
-        _mcp_client_instance = mcp_client
-        return _mcp_tools, _mcp_client_instance
-    except Exception as exc:
-        logger.warning(f"Unable to load MCP tools: {exc}", exc_info=True)
-        return [], None
-
-
-def _build_system_prompt(
-    user_name: Optional[str] = None,
-    timezone: Optional[str] = None,
-    is_first_message: bool = False
-) -> str:
+        MEMORY — DO THIS FIRST:
+        Your VERY FIRST action in every conversation must be to call memory_load to recall what you know from previous sessions.
+        Do this before answering the user's question, even if it seems simple.
+        Throughout the conversation, proactively save noteworthy information to memory using memory_save. Things worth saving include:
+        - The user's name, preferences, or role
+        - API quirks you discovered (e.g. correct entity names, field mappings, which filters work)
+        - Facts about the user's business context (e.g. which plant they work with, their cost center)
+        - Corrections the user made to your answers
+        - Anything you had to figure out the hard way that would save time next time
+        Keep notes short, factual, and useful. Don't save trivial things.
+
+        Make good use of the tools available to you. Be generous with tool calls — better more than less. Don't give up easily.
+        When using S/4HANA Product API tools, call get_product_api_documentation first to understand the available fields and query options.
+        You can use the "get_time_and_place" tool if you need to know the current time or location context.
+
+        ERROR RECOVERY — THIS IS CRITICAL:
+        When any API tool call returns an error (success=false), you MUST NOT give up or ask the user what to do.
+        Instead, follow this recovery strategy:
+        1. Read the error message carefully to understand what went wrong.
+        2. If the error mentions an unknown property/field/entity, fetch the service metadata first
+           (e.g. call stock_api or product_api with path="$metadata" and accept="application/xml")
+           to discover the correct entity names, field names, and relationships.
+        3. Save useful findings to memory (e.g. "Stock API: use A_MatlStkInAcctMod entity, field Material not Plant for filtering").
+        4. Retry the query with corrected parameters based on what you learned from the metadata.
+        5. Only ask the user for help after you have tried at least 2-3 different approaches on your own.
+        You are an expert — users expect you to figure out API quirks autonomously."""
+    )
+
+
+def _build_user_context_prompt(context: UserContext) -> str:
     """
-    Build a dynamic system prompt with user context.
+    Build the per-request part of the system prompt (user context and greeting rules).
 
     Args:
-        user_name: User's given name for personalization
-        timezone: User's IANA timezone
-        is_first_message: Whether this is the first message in the session
+        context: User context passed to the agent at invoke time
 
     Returns:
-        Complete system prompt string
+        Text appended to the static system prompt
     """
+    user_name = context.user_name
+    timezone = context.timezone
+    is_first_message = context.is_first_message
+
     # Get current time in user's timezone
     time_info = ""
     greeting_instruction = ""
@@ -171,80 +198,136 @@ def _build_system_prompt(
         if user_name:
             greeting_instruction = f"\n\nYou may address the user as \"{user_name}\" when appropriate, but do NOT greet them again - this is a continuation of an existing conversation."
 
-    base_prompt = dedent(
-        """You are a helpful AI assistant with access to various tools and data sources.
+    return time_info + greeting_instruction
 
-        IMPORTANT: Always respond in the SAME LANGUAGE as the user's message. If the user writes in English, respond in English. If they write in German, respond in German. Never assume a language based on timezone or location.
 
-        MEMORY — DO THIS FIRST:
-        Your VERY FIRST action in every conversation must be to call memory_load to recall what you know from previous sessions.
-        Do this before answering the user's question, even if it seems simple.
-        Throughout the conversation, proactively save noteworthy information to memory using memory_save. Things worth saving include:
-        - The user's name, preferences, or role
-        - API quirks you discovered (e.g. correct entity names, field mappings, which filters work)
-        - Facts about the user's business context (e.g. which plant they work with, their cost center)
-        - Corrections the user made to your answers
-        - Anything you had to figure out the hard way that would save time next time
-        Keep notes short, factual, and useful. Don't save trivial things.
+class UserContextMiddleware(AgentMiddleware):
+    """
+    Append the per-request user context to the system prompt on every model call.
 
-        Make good use of the tools available to you. Be generous with tool calls — better more than less. Don't give up easily.
-        When using S/4HANA Product API tools, call get_product_api_documentation first to understand the available fields and query options.
-        You can use the "get_time_and_place" tool if you need to know the current time or location context.
+    This keeps user-specific text out of the compiled graph, so one graph can
+    serve every user and request.
+    """
 
-        ERROR RECOVERY — THIS IS CRITICAL:
-        When any API tool call returns an error (success=false), you MUST NOT give up or ask the user what to do.
-        Instead, follow this recovery strategy:
-        1. Read the error message carefully to understand what went wrong.
-        2. If the error mentions an unknown property/field/entity, fetch the service metadata first
-           (e.g. call stock_api or product_api with path="$metadata" and accept="application/xml")
-           to discover the correct entity names, field names, and relationships.
-        3. Save useful findings to memory (e.g. "Stock API: use A_MatlStkInAcctMod entity, field Material not Plant for filtering").
-        4. Retry the query with corrected parameters based on what you learned from the metadata.
-        5. Only ask the user for help after you have tried at least 2-3 different approaches on your own.
-        You are an expert — users expect you to figure out API quirks autonomously."""
-    )
+    @staticmethod
+    def _with_user_context(request: ModelRequest) -> ModelRequest:
+        context = request.runtime.context if request.runtime else None
+        if not isinstance(context, UserContext):
+            return request
+        user_prompt = _build_user_context_prompt(context)
+        if not user_prompt:
+            return request
+
+        system_message = request.system_message
+        if system_message is None:
+            return request.override(system_message=SystemMessage(content=user_prompt.lstrip()))
+        if isinstance(system_message.content, str):
+            content: Any = system_message.content + user_prompt
+        else:
+            content = [*system_message.content, {"type": "text", "text": user_prompt}]
+        return request.override(system_message=SystemMessage(content=content))
 
-    return base_prompt + time_info + greeting_instruction
+    def wrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], ModelResponse],
+    ) -> ModelResponse:
+        return handler(self._with_user_context(request))
 
+    async def awrap_model_call(
+        self,
+        request: ModelRequest,
+        handler: Callable[[ModelRequest], Awaitable[ModelResponse]],
+    ) -> ModelResponse:
+        return await handler(self._with_user_context(request))
 
-async def _get_agent(
-    user_name: Optional[str] = None,
-    timezone: Optional[str] = None,
-    is_first_message: bool = False
-) -> tuple[Any, Optional[MultiServerMCPClient]]:
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """
+    Limit how many MCP tool calls of one agent run execute at the same time.
+
+    Tool calls the model emits in one step are already dispatched concurrently
+    (one graph task per call), so a step takes as long as its slowest tool;
+    this caps the fan-out at AGENT_TOOL_CONCURRENCY per request so a single
+    question cannot flood S/4HANA. Built-in DeepAgent tools (todos, files,
+    sub-agent tasks) are not limited, so a sub-agent never waits on a permit
+    held by its parent's task call.
     """
-    Create a DeepAgent instance with dynamic system prompt.
 
-    Unlike other singletons, the agent is created per-request to allow
-    dynamic system prompts based on user context.
+    def __init__(self, tool_names: Iterable[str]):
+        super().__init__()
+        self.tool_names = frozenset(tool_names)
+
+    def wrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], ToolMessage | Command],
+    ) -> ToolMessage | Command:
+        return handler(request)
+
+    async def awrap_tool_call(
+        self,
+        request: ToolCallRequest,
+        handler: Callable[[ToolCallRequest], Awaitable[ToolMessage | Command]],
+    ) -> ToolMessage | Command:
+        tool_name = request.tool_call["name"]
+        semaphore = _tool_semaphore.get()
+        if semaphore is None or tool_name not in self.tool_names:
+            return await handler(request)
+
+        wait_start = time.perf_counter()
+        async with semaphore:
+            start = time.perf_counter()
+            metrics.observe("deepagent_tool_wait_seconds", start - wait_start)
+            try:
+                return await handler(request)
+            finally:
+                metrics.observe("deepagent_tool_seconds", time.perf_counter() - start, tool=tool_name)
 
-    Args:
-        user_name: User's given name for personalization
-        timezone: User's IANA timezone
-        is_first_message: Whether this is the first message in the session
 
-    Returns:
-        Tuple of (agent instance, mcp_client instance or None)
+async def _get_agent() -> tuple[Any, MCPConnectionPool]:
     """
-    logger.info("Creating DeepAgent with dynamic system prompt")
+    Get a compiled DeepAgent graph.
+
+    Graphs are cached in a small LRU keyed by the static system prompt and the
+    model and tool instances, so the graph is only rebuilt when one of them
+    changes (e.g. after the MCP tool list changed). Per-user context is supplied
+    at invoke time through UserContext and UserContextMiddleware.
 
+    Returns:
+        Tuple of (agent instance, MCP connection pool)
+    """
     # Load model and MCP tools (these are cached)
     model = _get_model()
-    mcp_tools, mcp_client = await _load_mcp_tools()
-
-    # Build dynamic system prompt
-    system_prompt = _build_system_prompt(user_name, timezone, is_first_message)
-    logger.debug(f"System prompt: {system_prompt[:200]}...")
-
-    # Create agent with tools
+    mcp_pool = get_mcp_pool()
+    mcp_tools = await mcp_pool.get_tools()
+    checkpointer = await get_checkpointer()
+    system_prompt = _build_static_system_prompt()
+
+    cache_key = (system_prompt, id(model), tuple(id(tool) for tool in mcp_tools), id(checkpointer))
+    agent = _agent_cache.get(cache_key)
+    if agent is not None:
+        _agent_cache.move_to_end(cache_key)
+        logger.debug("Reusing compiled DeepAgent graph")
+        return agent, mcp_pool
+
+    start = time.perf_counter()
     agent = create_deep_agent(
         model=model,
         tools=mcp_tools,
         system_prompt=system_prompt,
+        middleware=[UserContextMiddleware(), ToolConcurrencyMiddleware(tool.name for tool in mcp_tools)],
+        context_schema=UserContext,
+        checkpointer=checkpointer,
     )
+    elapsed = time.perf_counter() - start
+    metrics.observe("deepagent_graph_build_seconds", elapsed)
+    logger.info(f"DeepAgent graph compiled in {elapsed * 1000:.0f} ms ({len(mcp_tools)} tool(s))")
 
-    logger.info("DeepAgent created successfully")
-    return agent, mcp_client
+    _agent_cache[cache_key] = agent
+    while len(_agent_cache) > _AGENT_CACHE_SIZE:
+        _agent_cache.popitem(last=False)
+    return agent, mcp_pool
 
 
 def _text_from_chunk(chunk: object) -> Iterable[str]:
@@ -267,14 +350,9 @@ def _text_from_chunk(chunk: object) -> Iterable[str]:
     if isinstance(chunk, tuple) and len(chunk) >= 1:
         actual_chunk = chunk[0]
 
-    # Skip non-AI messages (tool messages, human messages, etc.)
-    chunk_type = getattr(actual_chunk, "type", None)
-    chunk_class = type(actual_chunk).__name__
-
-    # Only extract text from AI messages
-    if chunk_class not in ("AIMessage", "AIMessageChunk"):
-        if chunk_type not in ("ai", "AIMessageChunk", None):
-            return []
+    # Only extract text from AI messages, not tool messages, human messages, etc.
+    if isinstance(actual_chunk, BaseMessage) and not isinstance(actual_chunk, AIMessage):
+        return []
 
     # For AIMessageChunk, check if it has actual content (not just tool calls)
     content = getattr(actual_chunk, "content", None)
@@ -304,48 +382,6 @@ def _text_from_chunk(chunk: object) -> Iterable[str]:
             yield from _text_from_chunk(delta)
 
 
-def _extract_tool_calls(chunk: object) -> list[dict]:
-    """
-    Extract tool call information from a LangGraph stream chunk.
-
-    Args:
-        chunk: Stream chunk from agent.astream()
-
-    Returns:
-        List of tool call dicts with 'id', 'name', and optionally 'args'
-    """
-    tool_calls = []
-
-    # Check for tool_calls attribute on message chunks (AIMessageChunk)
-    if hasattr(chunk, "tool_calls") and chunk.tool_calls:
-        for tc in chunk.tool_calls:
-            tool_call = {
-                "id": tc.get("id") if isinstance(tc, dict) else getattr(tc, "id", None),
-                "name": tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", None),
-            }
-            args = tc.get("args") if isinstance(tc, dict) else getattr(tc, "args", None)
-            if args:
-                tool_call["args"] = args
-            if tool_call["id"] and tool_call["name"]:
-                tool_calls.append(tool_call)
-
-    # Check for tool_call_chunks (partial tool call streaming)
-    if hasattr(chunk, "tool_call_chunks") and chunk.tool_call_chunks:
-        for tc in chunk.tool_call_chunks:
-            tool_call = {
-                "id": tc.get("id") if isinstance(tc, dict) else getattr(tc, "id", None),
-                "name": tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", None),
-            }
-            args = tc.get("args") if isinstance(tc, dict) else getattr(tc, "args", None)
-            if args:
-                tool_call["args"] = args
-            # Only add if we have a name (first chunk of a tool call)
-            if tool_call["name"]:
-                tool_calls.append(tool_call)
-
-    return tool_calls
-
-
 def _normalize_content(content: object) -> Iterable[str]:
     """
     Normalize various content formats into plain text strings.
@@ -375,18 +411,65 @@ def _normalize_content(content: object) -> Iterable[str]:
     return [str(content)]
 
 
+def _final_answer(state: Optional[dict]) -> str:
+    """
+    Get the text of the agent's final answer from its graph state.
+
+    Only AI messages after the last human message are considered, so an answer
+    from an earlier turn in a resumed thread is never returned.
+
+    Args:
+        state: Last state from the agent's "values" stream
+
+    Returns:
+        Answer text, or an empty string if the turn produced none
+    """
+    for msg in reversed((state or {}).get("messages", [])):
+        msg_type = getattr(msg, "type", None)
+        if msg_type == "human":
+            break
+        if msg_type == "ai":
+            text = "".join(_normalize_content(getattr(msg, "content", None)))
+            if text:
+                return text
+    return ""
+
+
+def _to_agent_message(msg: ChatMessage, attachment_store: AttachmentStore) -> dict:
+    """
+    Convert a stored chat message into an agent input message.
+
+    User messages with image attachments become multimodal content arrays
+    (OpenAI format); blobs are loaded lazily from the attachment store.
+    """
+    if msg.role != "user" or not msg.attachments:
+        return {"role": msg.role, "content": msg.content}
+
+    content = []
+    if msg.content:
+        content.append({"type": "text", "text": msg.content})
+    for attachment in msg.attachments:
+        data_url = attachment_store.data_url(attachment)
+        if data_url:
+            content.append({"type": "image_url", "image_url": {"url": data_url}})
+    logger.debug(f"Added multimodal message with {len(msg.attachments)} attachment(s)")
+    return {"role": msg.role, "content": content}
+
+
 async def generate_deepagent_response(
     message: str,
     session_id: str | None = None,
     user_id: str = "anonymous",
     timezone: Optional[str] = None,
-    user_name: Optional[str] = None
+    user_name: Optional[str] = None,
+    storage: Optional[SessionStorageBackend] = None
 ) -> AsyncGenerator[dict, None]:
     """
     Generate streaming response using DeepAgent with MCP tools.
 
-    Loads previous messages from the session and includes them as context
-    for the agent to maintain conversation continuity.
+    Resumes the agent from the session's checkpoint so only the new message is
+    sent; without a checkpoint, previous messages from the session are sent as
+    context to maintain conversation continuity.
 
     Args:
         message: User message
@@ -394,157 +477,131 @@ async def generate_deepagent_response(
         user_id: User ID for session storage
         timezone: User's IANA timezone (e.g., 'Asia/Tokyo')
         user_name: User's given name for personalized responses
+        storage: Session storage to load history from (defaults to the global instance)
 
     Yields:
         SSE events as dictionaries with 'event' and 'data' keys
     """
     try:
         # Load chat history from session and determine if first message
-        conversation = []
+        history: list[ChatMessage] = []
         is_first_message = True
-        storage = SessionStorage()
+        storage = storage or get_storage()
+        attachment_store = get_attachment_store()
 
         if session_id:
             logger.debug(f"Loading chat history for session: {session_id}, user: {user_id}")
-            session = storage.get_session(user_id, session_id)
+            session = await storage.aget_session(user_id, session_id)
             if session and session.messages:
                 logger.info(f"Loaded {len(session.messages)} messages from session {session_id}")
+                history = session.messages
                 # Check if user has already been greeted in this session
                 is_first_message = not session.greeted
 
-                for msg in session.messages:
-                    # Check if message has image attachments (multimodal)
-                    if msg.role == "user" and msg.attachments:
-                        # Build multimodal content array (OpenAI format)
-                        content = []
-
-                        # Add text if present
-                        if msg.content:
-                            content.append({
-                                "type": "text",
-                                "text": msg.content
-                            })
-
-                        # Add images
-                        for attachment in msg.attachments:
-                            content.append({
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{attachment.mime_type};base64,{attachment.data}"
-                                }
-                            })
-
-                        conversation.append({
-                            "role": msg.role,
-                            "content": content
-                        })
-                        logger.debug(f"Added multimodal message with {len(msg.attachments)} attachment(s)")
-                    else:
-                        # Text-only message
-                        conversation.append({
-                            "role": msg.role,
-                            "content": msg.content
-                        })
-
                 # Mark session as greeted if this is first message
                 if is_first_message:
-                    session.greeted = True
-                    storage.update_session(user_id, session)
+                    await storage.aupdate_session_metadata(user_id, session_id, greeted=True)
                     logger.debug(f"Marked session {session_id} as greeted")
             else:
                 logger.warning(f"No session or messages found for session_id: {session_id}")
         else:
             logger.debug("No session_id provided, starting fresh conversation")
 
-        # Get or initialize agent with dynamic system prompt
-        agent, _ = await _get_agent(user_name, timezone, is_first_message)
-        
-        # Add current message
-        conversation.append({"role": "user", "content": message})
-        
+        # The frontend stores the user message (with its attachments) before starting the stream
+        if history and history[-1].role == "user" and history[-1].content == message:
+            new_message = _to_agent_message(history[-1], attachment_store)
+            history = history[:-1]
+        else:
+            new_message = {"role": "user", "content": message}
+
+        # Get the compiled agent; user context is injected per request
+        agent, _ = await _get_agent()
+        user_context = UserContext(user_name=user_name, timezone=timezone, is_first_message=is_first_message)
+        config = thread_config(user_id, session_id or str(uuid.uuid4()))
+        tool_limit = settings.agent_tool_concurrency
+        _tool_semaphore.set(asyncio.Semaphore(tool_limit) if tool_limit > 0 else None)
+        # Cached tool results are only reused for the same user (except for global tools)
+        tool_cache_scope.set(user_id)
+
+        # Resume from the session's checkpoint if there is one; otherwise seed the thread with the stored history
+        if session_id and await has_checkpoint(user_id, session_id):
+            conversation = [new_message]
+        elif history:
+            # Older turns are replaced by a rolling summary to stay within the token budget
+            window = await build_context_window(storage, user_id, session, history, settings.llm_model)
+            conversation = [_to_agent_message(msg, attachment_store) for msg in window.messages] + [new_message]
+            if window.summary:
+                # A labelled context turn rather than a second system message; it stays in the checkpointed thread
+                conversation[:0] = [
+                    {"role": "user", "content": f"Summary of the earlier conversation:\n{window.summary}"},
+                    {"role": "assistant", "content": "Understood, I will continue the conversation from this summary."},
+                ]
+        else:
+            conversation = [new_message]
+        logger.debug(f"Sending {len(conversation)} message(s) to the agent")
+
         # Prepare payload for agent
-        payload = {"messages": [dict(msg) for msg in conversation]}
+        payload = {"messages": conversation}
 
-        # Track active tool calls to avoid duplicate events
-        active_tool_ids: set[str] = set()
+        # Assembles streamed tool call chunks into tool_start / tool_end events
+        tool_calls = ToolCallAssembler(emit_arg_deltas=settings.stream_tool_args_deltas)
 
-        # Stream response chunks
+        # Stream message chunks and, in the same run, the graph state after each step
         has_output = False
-        async for chunk in agent.astream(
+        final_state: Optional[dict] = None
+        stream_start = time.perf_counter()
+        async for mode, chunk in agent.astream(
             payload,
-            config=THREAD_CONFIG,
-            stream_mode="messages",
+            config=config,
+            context=user_context,
+            stream_mode=["messages", "values"],
         ):
+            if mode == "values":
+                final_state = chunk
+                continue
+
             # Handle tuple format from stream_mode="messages": (message, metadata)
             actual_chunk = chunk
             if isinstance(chunk, tuple) and len(chunk) >= 1:
                 actual_chunk = chunk[0]
 
-            # Check for tool calls on the actual message chunk
-            tool_calls = _extract_tool_calls(actual_chunk)
-            for tc in tool_calls:
-                tool_id = tc["id"]
-                if tool_id and tool_id not in active_tool_ids:
-                    active_tool_ids.add(tool_id)
-                    logger.info(f"Tool call started: {tc['name']} (id={tool_id})")
-                    yield {
-                        "event": "tool_start",
-                        "data": {
-                            "tool_id": tool_id,
-                            "tool_name": tc["name"],
-                            "args": tc.get("args"),
-                        }
-                    }
-
-            # Check if this is a ToolMessage (tool result) - signals tool completion
-            chunk_class = type(actual_chunk).__name__
-            msg_type = getattr(actual_chunk, "type", None)
-            if msg_type == "tool" or chunk_class in ("ToolMessage", "ToolMessageChunk"):
-                tool_call_id = getattr(actual_chunk, "tool_call_id", None)
-                if tool_call_id and tool_call_id in active_tool_ids:
-                    active_tool_ids.discard(tool_call_id)
-                    logger.info(f"Tool call completed: {tool_call_id}")
-                    yield {
-                        "event": "tool_end",
-                        "data": {
-                            "tool_id": tool_call_id,
-                            "success": True,
-                        }
-                    }
+            for tool_event in tool_calls.feed(actual_chunk):
+                yield tool_event
 
             # Extract text content
             for text in _text_from_chunk(chunk):
                 if text:
+                    if not has_output:
+                        metrics.observe("deepagent_first_token_seconds", time.perf_counter() - stream_start)
                     has_output = True
                     yield {
                         "event": "text",
                         "data": text
                     }
-                    # Small delay to make streaming visible
-                    await asyncio.sleep(0.01)
         
-        # If no streaming output, try invoke as fallback
+        for tool_event in tool_calls.finish():
+            yield tool_event
+
+        # If the model did not stream tokens, send the final answer from the captured state
+        # (re-invoking the agent would run every tool call again)
         if not has_output:
-            logger.warning("No streaming output, using invoke fallback")
-            try:
-                fallback = await agent.ainvoke(payload, config=THREAD_CONFIG)
-                fallback_chunks = list(_text_from_chunk(fallback))
-                if fallback_chunks:
-                    fallback_text = "".join(fallback_chunks)
-                    yield {
-                        "event": "text",
-                        "data": fallback_text
-                    }
-            except Exception as fallback_exc:
-                logger.error(f"Invoke fallback error: {fallback_exc}", exc_info=True)
+            final_text = _final_answer(final_state)
+            if final_text:
+                logger.warning("No streaming output, sending final answer from agent state")
                 yield {
-                    "event": "error",
-                    "data": f"Agent error: {str(fallback_exc)}"
+                    "event": "text",
+                    "data": final_text
                 }
+            else:
+                logger.warning("Agent produced no answer text")
         
         # Signal end of stream
         yield {"event": "end", "data": ""}
-        
+
+    except asyncio.CancelledError:
+        # Client went away: stop the model and tool calls, nothing left to send
+        logger.info("DeepAgent run cancelled")
+        raise
     except Exception as e:
         # Log and send error event
         logger.error(f"DeepAgent error occurred: {str(e)}", exc_info=True)
@@ -559,15 +616,4 @@ async def cleanup_deepagent_service() -> None:
     
     Should be called on application shutdown.
     """
-    global _mcp_client_instance
-    
-    if _mcp_client_instance is not None:
-        logger.info("Cleaning up MCP client connection")
-        close = getattr(_mcp_client_instance, "aclose", None)
-        if callable(close):
-            try:
-                await close()
-                logger.info("MCP client closed successfully")
-            except Exception as exc:
-                logger.warning(f"Error closing MCP client: {exc}")
-        _mcp_client_instance = None
+    await close_mcp_pool()
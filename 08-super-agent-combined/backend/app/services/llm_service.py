@@ -3,14 +3,17 @@ import asyncio
 import logging
 from typing import AsyncGenerator, Optional
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.messages import HumanMessage, AIMessage, BaseMessage, SystemMessage
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.language_models.chat_models import BaseChatModel
 from gen_ai_hub.proxy.langchain import init_llm
 from gen_ai_hub.proxy.core.base import BaseProxyClient
 from gen_ai_hub.proxy.core.proxy_clients import get_proxy_client
 from app.core.config import settings
-from app.services.session_storage import SessionStorage
+from app.models.schemas import ChatMessage
+from app.services.attachment_store import AttachmentStore, get_attachment_store
+from app.services.context_window import build_context_window
+from app.services.session_storage import SessionStorageBackend, get_storage
 
 # Configure logger
 logger = logging.getLogger(__name__)
@@ -56,7 +59,44 @@ def _get_llm() -> BaseChatModel:
     return _llm_instance
 
 
-async def generate_llm_response(message: str, session_id: str | None = None) -> AsyncGenerator[dict, None]:
+def _to_langchain_message(msg: ChatMessage, attachment_store: AttachmentStore) -> BaseMessage:
+    """Convert a stored chat message to a LangChain message (user images as multimodal content)."""
+    if msg.role == "assistant":
+        # Assistant messages remain text-only
+        return AIMessage(content=msg.content)
+    if not msg.attachments:
+        # Text-only message
+        return HumanMessage(content=msg.content)
+
+    # Build multimodal content array (OpenAI format)
+    content = []
+    
+    # Add text if present
+    if msg.content:
+        content.append({
+            "type": "text",
+            "text": msg.content
+        })
+    
+    # Add images (blobs are loaded lazily from the attachment store)
+    for attachment in msg.attachments:
+        data_url = attachment_store.data_url(attachment)
+        if data_url:
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": data_url}
+            })
+    
+    logger.debug(f"Added multimodal message with {len(msg.attachments)} attachment(s)")
+    return HumanMessage(content=content)
+
+
+async def generate_llm_response(
+    message: str,
+    session_id: str | None = None,
+    user_id: str = "anonymous",
+    storage: Optional[SessionStorageBackend] = None
+) -> AsyncGenerator[dict, None]:
     """
     Generate streaming response using SAP Generative AI Hub with chat history.
     
@@ -66,6 +106,8 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
     Args:
         message: User message
         session_id: Session ID to load chat history from
+        user_id: User ID owning the session
+        storage: Session storage to load history from (defaults to the global instance)
         
     Yields:
         SSE events as dictionaries with 'event' and 'data' keys
@@ -76,56 +118,42 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
         
         # Load chat history from session
         chat_history = []
+        summary = None
+        new_message: BaseMessage = HumanMessage(content=message)
         if session_id:
-            logger.debug(f"Loading chat history for session: {session_id}")
-            storage = SessionStorage()
-            session = storage.get_session(session_id)
+            logger.debug(f"Loading chat history for session: {session_id}, user: {user_id}")
+            storage = storage or get_storage()
+            attachment_store = get_attachment_store()
+            session = await storage.aget_session(user_id, session_id)
             if session and session.messages:
-                # Convert stored messages to LangChain message format
                 logger.info(f"Loaded {len(session.messages)} messages from session {session_id}")
-                for msg in session.messages:
+                history = session.messages
+                # The frontend stores the user message (with its attachments) before starting the stream
+                if history[-1].role == "user" and history[-1].content == message:
+                    new_message = _to_langchain_message(history[-1], attachment_store)
+                    history = history[:-1]
+
+                # Older turns are replaced by a rolling summary to stay within the token budget
+                window = await build_context_window(storage, user_id, session, history, settings.llm_model)
+                summary = window.summary
+                # Convert stored messages to LangChain message format
+                for msg in window.messages:
                     logger.debug(f"Message: {msg.role} - {msg.content[:50]}...")
-                    if msg.role == "user":
-                        # Check if message has image attachments
-                        if msg.attachments:
-                            # Build multimodal content array (OpenAI format)
-                            content = []
-                            
-                            # Add text if present
-                            if msg.content:
-                                content.append({
-                                    "type": "text",
-                                    "text": msg.content
-                                })
-                            
-                            # Add images
-                            for attachment in msg.attachments:
-                                content.append({
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:{attachment.mime_type};base64,{attachment.data}"
-                                    }
-                                })
-                            
-                            chat_history.append(HumanMessage(content=content))
-                            logger.debug(f"Added multimodal message with {len(msg.attachments)} attachment(s)")
-                        else:
-                            # Text-only message
-                            chat_history.append(HumanMessage(content=msg.content))
-                    elif msg.role == "assistant":
-                        # Assistant messages remain text-only
-                        chat_history.append(AIMessage(content=msg.content))
+                    chat_history.append(_to_langchain_message(msg, attachment_store))
                 logger.info(f"Chat history prepared with {len(chat_history)} messages")
             else:
                 logger.warning(f"No session or messages found for session_id: {session_id}")
         else:
             logger.debug("No session_id provided, starting fresh conversation")
         
-        # Create prompt with chat history
+        # Create prompt with chat history; the summary goes into the one system message
+        system_prompt = "You are a helpful AI assistant for financial data analysis. You can analyze both text and images. Answer questions clearly and concisely. When providing tables, use proper markdown table format with newlines between rows."
+        if summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{summary}"
         prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are a helpful AI assistant for financial data analysis. You can analyze both text and images. Answer questions clearly and concisely. When providing tables, use proper markdown table format with newlines between rows."),
+            SystemMessage(content=system_prompt),
             MessagesPlaceholder("chat_history"),
-            ("human", "{input}")
+            MessagesPlaceholder("input")
         ])
         
         # Create chain
@@ -133,7 +161,7 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
         
         # Stream response chunks
         async for chunk in chain.astream({
-            "input": message,
+            "input": [new_message],
             "chat_history": chat_history
         }):
             if chunk:
@@ -141,12 +169,14 @@ async def generate_llm_response(message: str, session_id: str | None = None) ->
                     "event": "text",
                     "data": chunk
                 }
-                # Small delay to make streaming visible
-                await asyncio.sleep(0.01)
         
         # Signal end of stream
         yield {"event": "end", "data": ""}
-        
+
+    except asyncio.CancelledError:
+        # Client went away: stop streaming from the model
+        logger.info("LLM run cancelled")
+        raise
     except Exception as e:
         # Log and send error event
         logger.error(f"LLM error occurred: {str(e)}", exc_info=True)
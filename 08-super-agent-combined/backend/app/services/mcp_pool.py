@@ -0,0 +1,351 @@
+"""
+Managed connection pool for the MCP server.
+
+Keeps ``settings.mcp_pool_size`` persistent streamable-HTTP sessions open
+instead of caching one client forever (stale after a server restart) or
+redoing the handshake on every request while the server is down.
+
+Each session is owned by its own task, which connects, pings the server every
+``settings.mcp_health_interval_seconds`` and reconnects with exponential
+backoff when the ping or the transport fails. Tool calls go to the least busy
+healthy session, through the tool result cache (see tool_cache.py) when
+enabled. The tool list is cached and reloaded after a reconnect or a
+``notifications/tools/list_changed`` from the server; the LangChain tools stay
+the same objects as long as the definitions do not change, so compiled agent
+graphs keep being reused.
+
+Metrics: ``mcp_call_seconds{tool=...}``, ``mcp_call_errors_total{tool=...,kind=...}``,
+``mcp_ping_seconds``, ``mcp_connects_total``, ``mcp_connect_errors_total``,
+``mcp_tool_list_changes_total`` and the ``mcp_sessions_ready`` gauge.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+from typing import Any, List, Optional
+
+from langchain_core.tools import BaseTool
+from langchain_mcp_adapters.sessions import create_session
+from langchain_mcp_adapters.tools import convert_mcp_tool_to_langchain_tool
+from mcp import ClientSession, McpError, types
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.tool_cache import ToolResultCache
+
+logger = logging.getLogger(__name__)
+
+# First reconnect delay in seconds; doubled after every failed attempt up to
+# settings.mcp_reconnect_max_seconds
+_RECONNECT_BASE_SECONDS = 0.5
+# Timeout for health pings and the initial handshake
+_PING_TIMEOUT_SECONDS = 10.0
+
+
+class MCPUnavailableError(ConnectionError):
+    """No healthy MCP session is available."""
+
+
+class _PooledSession:
+    """One persistent MCP session, kept alive by a dedicated task."""
+
+    def __init__(self, pool: "MCPConnectionPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.session: Optional[ClientSession] = None
+        self.state = "connecting"  # connecting | ready | backoff | closed
+        self.in_flight = 0
+        self._wake = asyncio.Event()
+        self._broken = False
+        self._task = asyncio.create_task(self._run(), name=f"mcp-session-{index}")
+
+    def mark_broken(self):
+        """Request a reconnect (e.g. after a transport error during a call)."""
+        self._broken = True
+        if self.state == "ready":
+            self.state = "connecting"
+        self._wake.set()
+
+    async def close(self):
+        """Stop the session task and close the connection."""
+        self.state = "closed"
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, _PING_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        except Exception:
+            pass
+
+    async def _run(self):
+        """Connect, watch health and reconnect with backoff until closed."""
+        delay = _RECONNECT_BASE_SECONDS
+        while self.state != "closed":
+            self.state = "connecting"
+            try:
+                async with create_session(self.pool.connection_with_handler) as session:
+                    await asyncio.wait_for(session.initialize(), _PING_TIMEOUT_SECONDS)
+                    self.session = session
+                    self._broken = False
+                    self.state = "ready"
+                    delay = _RECONNECT_BASE_SECONDS
+                    metrics.inc("mcp_connects_total")
+                    self.pool.on_session_ready(self)
+                    await self._watch(session)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Transport errors surface wrapped in (nested) exception groups
+                while isinstance(exc, BaseExceptionGroup) and exc.exceptions:
+                    exc = exc.exceptions[0]
+                metrics.inc("mcp_connect_errors_total")
+                logger.warning(f"MCP session {self.index} failed: {type(exc).__name__}: {exc}")
+            finally:
+                self.session = None
+                self.pool.on_session_lost()
+
+            if self.state == "closed":
+                break
+            self.state = "backoff"
+            wait = min(delay, settings.mcp_reconnect_max_seconds) * random.uniform(0.8, 1.2)
+            logger.info(f"Reconnecting MCP session {self.index} in {wait:.1f}s")
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+            delay *= 2
+
+    async def _watch(self, session: ClientSession):
+        """Ping the server periodically; return to reconnect or close."""
+        while True:
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.mcp_health_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            if self.state == "closed":
+                return
+            if self._broken:
+                logger.warning(f"MCP session {self.index} broken by a failed call; reconnecting")
+                return
+
+            start = time.perf_counter()
+            await asyncio.wait_for(session.send_ping(), _PING_TIMEOUT_SECONDS)
+            metrics.observe("mcp_ping_seconds", time.perf_counter() - start)
+
+
+class _PoolSessionProxy:
+    """
+    Stand-in for a ClientSession in LangChain MCP tools.
+
+    The tools returned by convert_mcp_tool_to_langchain_tool only use
+    ``session.call_tool``, which is routed to a healthy pooled session here.
+    """
+
+    def __init__(self, pool: "MCPConnectionPool"):
+        self._pool = pool
+
+    async def call_tool(self, name: str, arguments: Optional[dict] = None, **kwargs: Any) -> types.CallToolResult:
+        cache = self._pool.cache
+        if cache is None:
+            return await self._pool.call_tool(name, arguments, **kwargs)
+        return await cache.get_or_call(name, arguments, lambda: self._pool.call_tool(name, arguments, **kwargs))
+
+
+class MCPConnectionPool:
+    """Pool of persistent MCP sessions with health checks and a cached tool list."""
+
+    def __init__(self, connection: dict, size: int = 2, cache: Optional[ToolResultCache] = None):
+        self.connection = connection
+        self.size = max(1, size)
+        self.cache = cache
+        self._sessions: List[_PooledSession] = []
+        self._ready = asyncio.Event()
+        self._tools: Optional[List[BaseTool]] = None
+        self._tool_definitions: Optional[list] = None
+        self._tools_stale = True
+        self._tools_lock = asyncio.Lock()
+        self._proxy = _PoolSessionProxy(self)
+
+    @property
+    def connection_with_handler(self) -> dict:
+        """Connection config that routes server notifications to the pool."""
+        session_kwargs = dict(self.connection.get("session_kwargs") or {})
+        session_kwargs["message_handler"] = self._on_message
+        return {**self.connection, "session_kwargs": session_kwargs}
+
+    def start(self):
+        """Open the pooled sessions in the background."""
+        if not self._sessions:
+            logger.info(f"Opening {self.size} MCP session(s) to {self.connection.get('url')}")
+            self._sessions = [_PooledSession(self, index) for index in range(self.size)]
+
+    async def close(self):
+        """Close all sessions."""
+        sessions, self._sessions = self._sessions, []
+        await asyncio.gather(*(session.close() for session in sessions))
+        self._ready.clear()
+
+    def on_session_ready(self, session: _PooledSession):
+        """Called by a session after (re)connecting."""
+        logger.info(f"MCP session {session.index} connected")
+        # The server may have restarted with different tools
+        self._tools_stale = True
+        self._update_ready()
+
+    def on_session_lost(self):
+        """Called by a session when its connection ends."""
+        self._update_ready()
+
+    def _update_ready(self):
+        ready = sum(1 for session in self._sessions if session.state == "ready" and session.session is not None)
+        metrics.set_gauge("mcp_sessions_ready", ready)
+        if ready:
+            self._ready.set()
+        else:
+            self._ready.clear()
+
+    async def _on_message(self, message: Any):
+        """Handle server notifications (tools/list_changed marks the tool list stale)."""
+        if isinstance(message, types.ServerNotification) and isinstance(message.root, types.ToolListChangedNotification):
+            logger.info("MCP server reported a tool list change")
+            metrics.inc("mcp_tool_list_changes_total")
+            self._tools_stale = True
+            if self.cache is not None:
+                self.cache.clear()
+
+    async def _acquire(self, timeout: float) -> _PooledSession:
+        """
+        Pick the least busy healthy session.
+
+        Waits up to `timeout` while sessions are still connecting, but fails
+        immediately if all of them are backing off after failed attempts.
+        """
+        self.start()
+        deadline = time.monotonic() + timeout
+        while True:
+            ready = [s for s in self._sessions if s.state == "ready" and s.session is not None]
+            if ready:
+                return min(ready, key=lambda s: s.in_flight)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not any(s.state == "connecting" for s in self._sessions):
+                raise MCPUnavailableError(f"MCP server at {self.connection.get('url')} is unavailable")
+            try:
+                await asyncio.wait_for(self._ready.wait(), min(remaining, 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: Optional[dict] = None,
+        **kwargs: Any
+    ) -> types.CallToolResult:
+        """
+        Call a tool on a pooled session.
+
+        Calls are not retried on another session, since tools may have side
+        effects; a transport failure marks the session for reconnect.
+        """
+        start = time.perf_counter()
+        try:
+            pooled = await self._acquire(settings.mcp_connect_timeout_seconds)
+        except MCPUnavailableError:
+            metrics.inc("mcp_call_errors_total", tool=name, kind="unavailable")
+            raise
+
+        pooled.in_flight += 1
+        try:
+            timeout = kwargs.pop("read_timeout_seconds", None) or timedelta(seconds=settings.mcp_call_timeout_seconds)
+            result = await pooled.session.call_tool(name, arguments, read_timeout_seconds=timeout, **kwargs)
+            if result.isError:
+                metrics.inc("mcp_call_errors_total", tool=name, kind="tool")
+            return result
+        except McpError:
+            # JSON-RPC error from the server; the session itself is fine
+            metrics.inc("mcp_call_errors_total", tool=name, kind="protocol")
+            raise
+        except Exception:
+            metrics.inc("mcp_call_errors_total", tool=name, kind="transport")
+            pooled.mark_broken()
+            raise
+        finally:
+            pooled.in_flight -= 1
+            metrics.observe("mcp_call_seconds", time.perf_counter() - start, tool=name)
+
+    async def _list_tools(self, session: ClientSession) -> List[types.Tool]:
+        """List all tools, following pagination."""
+        tools: List[types.Tool] = []
+        cursor = None
+        while True:
+            page = await session.list_tools(cursor=cursor)
+            tools.extend(page.tools)
+            cursor = page.nextCursor
+            if not cursor:
+                return tools
+
+    async def get_tools(self) -> List[BaseTool]:
+        """
+        Get the server's tools as LangChain tools.
+
+        Returns:
+            Cached tools (reloaded if stale), the last known tools if the server
+            is unavailable, or an empty list if they were never loaded
+        """
+        if self._tools is not None and not self._tools_stale:
+            return self._tools
+
+        async with self._tools_lock:
+            if self._tools is not None and not self._tools_stale:
+                return self._tools
+            try:
+                pooled = await self._acquire(settings.mcp_connect_timeout_seconds)
+                self._tools_stale = False
+                definitions = await self._list_tools(pooled.session)
+            except Exception as exc:
+                self._tools_stale = True
+                logger.warning(f"Unable to load MCP tools: {exc}")
+                return self._tools or []
+
+            fingerprint = [tool.model_dump(mode="json") for tool in definitions]
+            if fingerprint != self._tool_definitions:
+                self._tools = [convert_mcp_tool_to_langchain_tool(self._proxy, tool) for tool in definitions]
+                self._tool_definitions = fingerprint
+                logger.info(f"Loaded {len(self._tools)} MCP tool(s)")
+            return self._tools
+
+
+# Global instance
+_pool: Optional[MCPConnectionPool] = None
+
+
+def get_mcp_pool() -> MCPConnectionPool:
+    """
+    Get or create the global MCP connection pool.
+
+    Returns:
+        MCPConnectionPool instance
+    """
+    global _pool
+    if _pool is None:
+        _pool = MCPConnectionPool(
+            {"transport": "streamable_http", "url": settings.mcp_server_url},
+            size=settings.mcp_pool_size,
+            cache=ToolResultCache.from_settings() if settings.tool_cache_enabled else None,
+        )
+    return _pool
+
+
+async def close_mcp_pool() -> None:
+    """
+    Close the global MCP connection pool.
+
+    Should be called on application shutdown.
+    """
+    global _pool
+    if _pool is not None:
+        logger.info("Closing MCP connection pool")
+        await _pool.close()
+        _pool = None
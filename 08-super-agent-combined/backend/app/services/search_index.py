@@ -0,0 +1,242 @@
+"""
+Full-text search over chat messages for the JSON storage backend.
+
+Every user directory holds an append-only search log (``.search.jsonl``) with
+one record per indexed message, plus ``drop`` records for sessions that were
+deleted or rewritten. The log is loaded into an in-memory inverted index that
+is refreshed incrementally (only bytes appended since the last load are read,
+also when another worker process wrote them), so a search never touches the
+session files. Results are ranked with BM25, matching the SQLite FTS5 backend.
+"""
+import math
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.session_serializer import dumps_line, loads_line
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Characters of message content shown around the first match
+SNIPPET_CHARS = 160
+SNIPPET_MARKER = "**"
+
+# BM25 parameters (same defaults as SQLite FTS5)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+# Rewrite the log once it holds this many superseded records and more dead than live ones
+_COMPACT_MIN_DEAD = 1000
+
+DocKey = Tuple[str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lower-case word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(text)]
+
+
+def make_snippet(content: str, terms: Set[str], width: int = SNIPPET_CHARS, marker: str = SNIPPET_MARKER) -> str:
+    """Cut a window around the first matching term and highlight the matches in it."""
+    matches = [match for match in _TOKEN_RE.finditer(content) if match.group().lower() in terms]
+    start = max(0, matches[0].start() - width // 4) if matches else 0
+    end = min(len(content), start + width)
+
+    parts = []
+    position = start
+    for match in matches:
+        if match.end() > end:
+            break
+        parts.append(content[position:match.start()])
+        parts.append(f"{marker}{match.group()}{marker}")
+        position = match.end()
+    parts.append(content[position:end])
+
+    snippet = " ".join("".join(parts).split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(content) else "")
+
+
+def message_record(session_id: str, position: int, role: str, content: str, timestamp: str) -> dict:
+    """Build the log record indexing one message."""
+    return {"s": session_id, "p": position, "r": role, "c": content, "t": timestamp}
+
+
+def drop_record(session_id: str) -> dict:
+    """Build the log record removing all indexed messages of a session."""
+    return {"drop": session_id}
+
+
+class _UserIndex:
+    """In-memory inverted index built from one user's search log."""
+
+    def __init__(self, file_id: int):
+        self.file_id = file_id
+        self.offset = 0
+        self.docs: Dict[DocKey, dict] = {}
+        self.doc_lengths: Dict[DocKey, int] = {}
+        self.postings: Dict[str, Dict[DocKey, int]] = {}
+        self.sessions: Dict[str, Set[DocKey]] = {}
+        self.total_length = 0
+        self.dead = 0
+
+    def apply(self, record: dict):
+        """Apply one log record."""
+        if "drop" in record:
+            self._drop_session(record["drop"])
+            return
+
+        key = (record["s"], record["p"])
+        if key in self.docs:
+            self._remove(key)
+            self.dead += 1
+
+        frequencies: Dict[str, int] = {}
+        for token in tokenize(record["c"]):
+            frequencies[token] = frequencies.get(token, 0) + 1
+        for token, count in frequencies.items():
+            self.postings.setdefault(token, {})[key] = count
+
+        length = sum(frequencies.values())
+        self.docs[key] = record
+        self.doc_lengths[key] = length
+        self.total_length += length
+        self.sessions.setdefault(key[0], set()).add(key)
+
+    def _remove(self, key: DocKey):
+        """Remove one message from the postings."""
+        record = self.docs.pop(key)
+        self.total_length -= self.doc_lengths.pop(key)
+        for token in set(tokenize(record["c"])):
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self.postings[token]
+        session_keys = self.sessions.get(key[0])
+        if session_keys is not None:
+            session_keys.discard(key)
+
+    def _drop_session(self, session_id: str):
+        """Remove all messages of a session."""
+        keys = self.sessions.pop(session_id, set())
+        for key in keys:
+            self._remove(key)
+        self.dead += len(keys) + 1
+
+    def search(self, terms: List[str], limit: int) -> List[Tuple[float, DocKey]]:
+        """Rank messages containing all terms with BM25."""
+        postings = [self.postings.get(term) for term in terms]
+        if not postings or any(not term_postings for term_postings in postings):
+            return []
+
+        doc_count = len(self.docs)
+        average_length = self.total_length / doc_count if doc_count else 0.0
+        candidates = set.intersection(*(set(term_postings) for term_postings in postings))
+
+        scored = []
+        for key in candidates:
+            length_norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * self.doc_lengths[key] / (average_length or 1.0))
+            score = 0.0
+            for term_postings in postings:
+                df = len(term_postings)
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                tf = term_postings[key]
+                score += idf * tf * (_BM25_K1 + 1) / (tf + length_norm)
+            scored.append((score, key))
+
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return scored[:limit]
+
+
+class SearchIndex:
+    """Search logs of all users in a data directory with their in-memory indexes."""
+
+    def __init__(self):
+        self._indexes: Dict[Path, _UserIndex] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def encode(records: List[dict]) -> bytes:
+        """Encode records as log lines."""
+        return b"".join(dumps_line(record) + b"\n" for record in records)
+
+    @classmethod
+    def append(cls, log_path: Path, records: List[dict]):
+        """
+        Append records to a user's search log.
+
+        Must be called with the user's index lock held. Nothing is written if
+        the log does not exist yet; it is then built from the sessions on the
+        first search instead.
+        """
+        if not records or not log_path.exists():
+            return
+        with open(log_path, "ab") as f:
+            f.write(cls.encode(records))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _refresh(self, log_path: Path) -> Optional[_UserIndex]:
+        """Bring the in-memory index up to date with the log, reading only appended bytes."""
+        try:
+            stat = log_path.stat()
+        except FileNotFoundError:
+            self._indexes.pop(log_path, None)
+            return None
+
+        index = self._indexes.get(log_path)
+        if index is None or index.file_id != stat.st_ino or stat.st_size < index.offset:
+            index = self._indexes[log_path] = _UserIndex(stat.st_ino)
+        if stat.st_size == index.offset:
+            return index
+
+        with open(log_path, "rb") as f:
+            f.seek(index.offset)
+            data = f.read(stat.st_size - index.offset)
+        # A record still being written has no trailing newline yet; pick it up next time
+        complete = data.rfind(b"\n") + 1
+        for line in data[:complete].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = loads_line(line)
+            except ValueError:
+                # Torn by a crash mid-append; only that record is lost
+                continue
+            index.apply(record)
+        index.offset += complete
+        return index
+
+    def compacted_records(self, log_path: Path) -> Optional[List[dict]]:
+        """
+        Get the live records if the log is mostly superseded records and should be rewritten.
+
+        Returns:
+            Records to write back with encode(), or None if compaction is not needed
+        """
+        with self._lock:
+            index = self._refresh(log_path)
+            if index is None or index.dead < max(_COMPACT_MIN_DEAD, len(index.docs)):
+                return None
+            return sorted(index.docs.values(), key=lambda record: (record["s"], record["p"]))
+
+    def search(self, log_path: Path, query: str, limit: int) -> Optional[List[Tuple[float, dict, str]]]:
+        """
+        Search a user's log.
+
+        Returns:
+            List of (score, message record, snippet), best first, or None if the
+            log has not been built yet
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            index = self._refresh(log_path)
+            if index is None:
+                return None
+            if not terms:
+                return []
+            ranked = [(score, index.docs[key]) for score, key in index.search(terms, limit)]
+        term_set = set(terms)
+        return [(score, record, make_snippet(record["c"], term_set)) for score, record in ranked]
@@ -4,6 +4,7 @@ from app.core.config import settings
 from app.services.mock_service import generate_mock_response
 from app.services.llm_service import generate_llm_response
 from app.services.deepagent_service import generate_deepagent_response
+from app.services.session_storage import SessionStorageBackend
 
 
 # Define service types
@@ -35,7 +36,8 @@ async def generate_response(
     session_id: str | None = None,
     user_id: str = "anonymous",
     timezone: Optional[str] = None,
-    user_name: Optional[str] = None
+    user_name: Optional[str] = None,
+    storage: Optional[SessionStorageBackend] = None
 ) -> AsyncGenerator[dict, None]:
     """
     Generate chat response using the configured service.
@@ -49,6 +51,7 @@ async def generate_response(
         user_id: User ID for session storage (defaults to 'anonymous')
         timezone: User's IANA timezone (e.g., 'Asia/Tokyo')
         user_name: User's given name for personalized responses
+        storage: Session storage to load history from (defaults to the global instance)
 
     Yields:
         SSE events as dictionaries with 'event' and 'data' keys
@@ -62,13 +65,13 @@ async def generate_response(
 
     elif service_type == "llm":
         # Use simple LLM service
-        async for event in generate_llm_response(message, session_id):
+        async for event in generate_llm_response(message, session_id, user_id, storage):
             yield event
 
     elif service_type == "agentic":
         # Use DeepAgent service with MCP tools
         async for event in generate_deepagent_response(
-            message, session_id, user_id, timezone, user_name
+            message, session_id, user_id, timezone, user_name, storage
         ):
             yield event
 
@@ -0,0 +1,99 @@
+"""
+In-process LRU cache of parsed chat sessions.
+
+Entries are validated against a caller-supplied version stamp (for the JSON
+backend: stat() of the snapshot and journal files), so a write by another
+worker process is detected without parsing anything.
+"""
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from app.core.metrics import metrics
+from app.models.schemas import ChatSession
+
+
+class SessionCache:
+    """LRU of ChatSession objects bounded by entry count and approximate bytes."""
+
+    def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[Hashable, ChatSession, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether caching is enabled (a zero limit disables it)."""
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    @staticmethod
+    def _copy(session: ChatSession) -> ChatSession:
+        """
+        Copy a session so callers can change its fields or message list without touching the cache.
+
+        Message objects themselves are shared and must be treated as read-only.
+        """
+        return session.model_copy(update={"messages": list(session.messages)})
+
+    def get(self, key: str, stamp: Hashable) -> Optional[ChatSession]:
+        """Get a session if cached with the same version stamp."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                self.misses += 1
+                metrics.inc("session_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.inc("session_cache_hits")
+        return self._copy(entry[1])
+
+    def peek(self, key: str, stamp: Hashable) -> Optional[ChatSession]:
+        """Get the cached session without copying or counting a hit. The result must not be mutated."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != stamp:
+                return None
+            return entry[1]
+
+    def put(self, key: str, stamp: Hashable, session: ChatSession, size: int):
+        """Store a session (the cache keeps its own copy) and evict least recently used entries."""
+        if not self.enabled or size > self.max_bytes:
+            self.invalidate(key)
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._total_bytes -= previous[2]
+            self._entries[key] = (stamp, self._copy(session), size)
+            self._total_bytes += size
+            while len(self._entries) > self.max_entries or self._total_bytes > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+            metrics.set_gauge("session_cache_entries", len(self._entries))
+            metrics.set_gauge("session_cache_bytes", self._total_bytes)
+
+    def invalidate(self, key: str):
+        """Drop a session from the cache."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._total_bytes -= entry[2]
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
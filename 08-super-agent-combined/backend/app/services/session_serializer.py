@@ -0,0 +1,142 @@
+"""
+Serializers for session snapshot files.
+
+Snapshots start with a one-line header naming the format and version, e.g.
+``#session-format:orjson:2``, followed by the encoded payload. Files without
+a header are legacy pretty-printed JSON; they stay readable and are rewritten
+in the configured format the first time the JSON backend reads them.
+
+orjson and msgpack are optional; if the configured library is not installed
+the stdlib JSON serializer is used instead.
+"""
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+_HEADER_PREFIX = b"#session-format:"
+
+
+class SessionSerializer(ABC):
+    """Encodes and decodes plain session dictionaries."""
+
+    name: str
+
+    @abstractmethod
+    def dumps(self, data: Any) -> bytes:
+        """Encode data to bytes."""
+
+    @abstractmethod
+    def loads(self, raw: bytes) -> Any:
+        """Decode bytes to data."""
+
+
+class JsonSerializer(SessionSerializer):
+    """Stdlib JSON, indented for readability during development."""
+
+    name = "json"
+
+    def dumps(self, data: Any) -> bytes:
+        return json.dumps(data, indent=2).encode("utf-8")
+
+    def loads(self, raw: bytes) -> Any:
+        return json.loads(raw)
+
+
+class OrjsonSerializer(SessionSerializer):
+    """Compact JSON via orjson."""
+
+    name = "orjson"
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+    def loads(self, raw: bytes) -> Any:
+        return orjson.loads(raw)
+
+
+class MsgpackSerializer(SessionSerializer):
+    """Binary MessagePack encoding."""
+
+    name = "msgpack"
+
+    def dumps(self, data: Any) -> bytes:
+        return msgpack.packb(data, use_bin_type=True)
+
+    def loads(self, raw: bytes) -> Any:
+        return msgpack.unpackb(raw, raw=False)
+
+
+_SERIALIZERS: dict[str, SessionSerializer] = {"json": JsonSerializer()}
+if orjson is not None:
+    _SERIALIZERS["orjson"] = OrjsonSerializer()
+if msgpack is not None:
+    _SERIALIZERS["msgpack"] = MsgpackSerializer()
+
+
+def get_serializer(name: str) -> SessionSerializer:
+    """
+    Get a serializer by name, falling back to stdlib JSON if its library is missing.
+
+    Raises:
+        ValueError: If the format name is unknown
+    """
+    name = name.strip().lower()
+    if name not in ("json", "orjson", "msgpack"):
+        raise ValueError(f"Unsupported SESSION_SERIALIZATION_FORMAT value: {name!r}. Use 'json', 'orjson' or 'msgpack'.")
+    serializer = _SERIALIZERS.get(name)
+    if serializer is None:
+        logger.warning(f"Session serialization format '{name}' is not installed, falling back to 'json'")
+        serializer = _SERIALIZERS["json"]
+    return serializer
+
+
+def encode_snapshot(data: dict, serializer: SessionSerializer) -> bytes:
+    """Encode a snapshot with its format header."""
+    header = _HEADER_PREFIX + f"{serializer.name}:{FORMAT_VERSION}\n".encode("ascii")
+    return header + serializer.dumps(data)
+
+
+def decode_snapshot(raw: bytes) -> tuple[dict, bool]:
+    """
+    Decode a snapshot written in any supported format.
+
+    Returns:
+        Tuple of (data, is_legacy), where is_legacy marks headerless JSON files
+    """
+    if not raw.startswith(_HEADER_PREFIX):
+        return json.loads(raw), True
+
+    header, _, payload = raw.partition(b"\n")
+    name, _, _version = header[len(_HEADER_PREFIX):].decode("ascii").partition(":")
+    serializer = _SERIALIZERS.get(name)
+    if serializer is None:
+        raise ValueError(f"Cannot read session snapshot in format '{name}': library not installed")
+    return serializer.loads(payload), False
+
+
+def dumps_line(data: Any) -> bytes:
+    """Encode one compact JSON line (journal records, index files)."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def loads_line(raw: bytes | str) -> Any:
+    """Decode compact JSON written by dumps_line (or any JSON)."""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
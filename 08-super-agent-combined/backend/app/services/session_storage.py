@@ -1,54 +1,664 @@
 """
 Session storage service for managing chat history persistence.
-Uses file-based JSON storage with user segregation.
+
+Defines the storage backend interface and the file-based JSON backend
+(one snapshot plus an append-only message journal per session, and a
+per-user index). Snapshot encoding is configurable, see ``session_serializer.py``. The SQLite backend lives
+in ``sqlite_session_storage.py``; ``get_storage()`` selects one based on
+``settings.session_storage_backend``.
 """
-import json
+import asyncio
+import base64
+import functools
+import logging
+import os
+import stat
+import tempfile
+import threading
 import uuid
+import weakref
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking is available
+    fcntl = None
+
+from app.core.config import settings
+from app.models.schemas import ChatSession, ChatHistoryItem, ChatHistoryPage, ChatMessage, ChatSearchHit
+from app.services.attachment_store import get_attachment_store
+from app.services.search_index import SearchIndex, drop_record, message_record
+from app.services.session_cache import SessionCache
+from app.services.session_serializer import (
+    decode_snapshot, dumps_line, encode_snapshot, get_serializer, loads_line
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of characters of the last message kept for the history sidebar preview
+LAST_MESSAGE_PREVIEW_CHARS = 100
+
+
+def _current_umask() -> int:
+    """Read the process umask (os.umask can only be read by setting it)."""
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Mode of newly created files, as open() would create them; read once since reading sets the umask
+_NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+_fallback_locks: dict[str, threading.Lock] = {}
+_fallback_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _file_lock(lock_path: Path, shared: bool = False) -> Iterator[None]:
+    """
+    Hold an advisory lock on a lock file.
+
+    Uses flock, which excludes other processes (e.g. multiple uvicorn workers
+    sharing the data directory) as well as other threads of this process.
+    Where flock is unavailable, falls back to an in-process exclusive lock.
+    """
+    if fcntl is None:
+        with _fallback_locks_guard:
+            lock = _fallback_locks.setdefault(str(lock_path), threading.Lock())
+        with lock:
+            yield
+        return
+
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _remove_lock_file(lock_path: Path):
+    """
+    Delete a lock file that is no longer needed. Call while holding its lock.
+
+    Only used once the guarded files are gone: a process still waiting on the
+    old file then finds nothing to operate on.
+    """
+    if fcntl is None:
+        with _fallback_locks_guard:
+            _fallback_locks.pop(str(lock_path), None)
+        return
+    lock_path.unlink(missing_ok=True)
+
+
+def _atomic_write(path: Path, data: bytes):
+    """
+    Write a file via temp file + os.replace so a crash never leaves it truncated.
+
+    mkstemp creates the temp file with mode 0600; it gets the previous file's
+    mode (or the umask default) so other readers of the data volume keep access.
+    """
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = _NEW_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+def encode_history_cursor(updated_at: str, session_id: str) -> str:
+    """Encode the sort key of the last listed session into an opaque pagination cursor."""
+    return base64.urlsafe_b64encode(f"{updated_at}|{session_id}".encode("utf-8")).decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> tuple[str, str]:
+    """
+    Decode a pagination cursor into its (updated_at, session_id) sort key.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        updated_at, session_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+    except Exception as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+    return updated_at, session_id
+
+
+class SessionStorageBackend(ABC):
+    """
+    Interface implemented by all chat session storage backends.
+
+    Backends implement the blocking methods; the ``a``-prefixed coroutine
+    variants run them on a dedicated bounded thread pool so that async request
+    handlers never block the event loop (and in-flight SSE streams) on disk I/O.
+    """
+
+    _io_executor: Optional[ThreadPoolExecutor] = None
+    _async_locks: Optional[weakref.WeakValueDictionary] = None
+
+    @abstractmethod
+    def create_session(self, user_id: str, title: str = "New Chat") -> ChatSession:
+        """Create a new chat session for a user."""
+
+    @abstractmethod
+    def get_session(self, user_id: str, session_id: str) -> Optional[ChatSession]:
+        """Get a specific session by ID for a user."""
+
+    @abstractmethod
+    def list_sessions_page(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> ChatHistoryPage:
+        """
+        List one page of sessions for a user, newest first.
+
+        Args:
+            user_id: Owner of the sessions
+            limit: Maximum number of items to return (None for all)
+            cursor: Cursor returned by the previous page, or None for the first page
+
+        Returns:
+            Page of history items with the cursor for the next page (None on the last page)
+        """
+
+    def list_sessions(self, user_id: str) -> List[ChatHistoryItem]:
+        """List all sessions with metadata for a user, newest first."""
+        return self.list_sessions_page(user_id).items
+
+    def references_attachment(self, user_id: str, blob_hash: str) -> bool:
+        """
+        Check whether any of a user's sessions has an attachment with the given blob hash.
+
+        The default scans every session of the user; backends that can query
+        attachments directly override it.
+        """
+        for item in self.list_sessions(user_id):
+            session = self.get_session(user_id, item.session_id)
+            if session is None:
+                continue
+            for msg in session.messages:
+                if any(att.hash == blob_hash for att in msg.attachments or []):
+                    return True
+        return False
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+
+    async def _run_io(self, func, *args, **kwargs):
+        """Run a blocking storage call on the storage I/O thread pool."""
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(
+                max_workers=settings.session_storage_io_workers,
+                thread_name_prefix="session-io",
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._io_executor, functools.partial(func, *args, **kwargs))
+
+    def _async_lock(self, key: str) -> asyncio.Lock:
+        """
+        Get the asyncio lock for a user or session key.
+
+        Writers to the same user index or session queue here instead of tying
+        up I/O threads waiting on file locks. Locks are dropped once unused.
+        """
+        if self._async_locks is None:
+            self._async_locks = weakref.WeakValueDictionary()
+        lock = self._async_locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._async_locks[key] = lock
+        return lock
+
+    async def acreate_session(self, user_id: str, title: str = "New Chat") -> ChatSession:
+        """Async variant of create_session."""
+        async with self._async_lock(f"user:{user_id}"):
+            return await self._run_io(self.create_session, user_id, title)
+
+    async def aget_session(self, user_id: str, session_id: str) -> Optional[ChatSession]:
+        """Async variant of get_session."""
+        return await self._run_io(self.get_session, user_id, session_id)
+
+    async def alist_sessions_page(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> ChatHistoryPage:
+        """Async variant of list_sessions_page."""
+        return await self._run_io(self.list_sessions_page, user_id, limit, cursor)
 
-from app.models.schemas import ChatSession, ChatHistoryItem, ChatMessage, TableData, TableColumn, ChatAttachment
+    async def alist_sessions(self, user_id: str) -> List[ChatHistoryItem]:
+        """Async variant of list_sessions."""
+        return await self._run_io(self.list_sessions, user_id)
 
+    async def aupdate_session(self, user_id: str, session: ChatSession):
+        """Async variant of update_session."""
+        async with self._async_lock(f"session:{user_id}:{session.session_id}"):
+            return await self._run_io(self.update_session, user_id, session)
 
-class SessionStorage:
-    """File-based session storage manager with user segregation."""
+    async def adelete_session(self, user_id: str, session_id: str) -> bool:
+        """Async variant of delete_session."""
+        async with self._async_lock(f"session:{user_id}:{session_id}"):
+            return await self._run_io(self.delete_session, user_id, session_id)
+
+    async def aadd_message(self, user_id: str, session_id: str, message: ChatMessage) -> bool:
+        """Async variant of add_message."""
+        async with self._async_lock(f"session:{user_id}:{session_id}"):
+            return await self._run_io(self.add_message, user_id, session_id, message)
+
+    async def aupdate_session_metadata(
+        self,
+        user_id: str,
+        session_id: str,
+        *,
+        title: Optional[str] = None,
+        title_generated: Optional[bool] = None,
+        greeted: Optional[bool] = None,
+        summary: Optional[str] = None,
+        summary_message_count: Optional[int] = None
+    ) -> bool:
+        """Async variant of update_session_metadata."""
+        async with self._async_lock(f"session:{user_id}:{session_id}"):
+            return await self._run_io(
+                functools.partial(
+                    self.update_session_metadata,
+                    user_id,
+                    session_id,
+                    title=title,
+                    title_generated=title_generated,
+                    greeted=greeted,
+                    summary=summary,
+                    summary_message_count=summary_message_count,
+                )
+            )
+
+    async def asearch_messages(self, user_id: str, query: str, limit: int = 20) -> List[ChatSearchHit]:
+        """Async variant of search_messages."""
+        return await self._run_io(self.search_messages, user_id, query, limit)
+
+    async def areferences_attachment(self, user_id: str, blob_hash: str) -> bool:
+        """Async variant of references_attachment."""
+        return await self._run_io(self.references_attachment, user_id, blob_hash)
+
+    def close(self):
+        """Release the I/O thread pool. Called on application shutdown."""
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=True)
+            self._io_executor = None
+
+    @abstractmethod
+    def update_session(self, user_id: str, session: ChatSession):
+        """Persist changes to an existing session."""
+
+    @abstractmethod
+    def delete_session(self, user_id: str, session_id: str) -> bool:
+        """Delete a session for a user. Returns False if it does not exist."""
+
+    @abstractmethod
+    def add_message(self, user_id: str, session_id: str, message: ChatMessage) -> bool:
+        """Append a message to a session. Returns False if it does not exist."""
+
+    @abstractmethod
+    def update_session_metadata(
+        self,
+        user_id: str,
+        session_id: str,
+        *,
+        title: Optional[str] = None,
+        title_generated: Optional[bool] = None,
+        greeted: Optional[bool] = None,
+        summary: Optional[str] = None,
+        summary_message_count: Optional[int] = None
+    ) -> bool:
+        """
+        Update session metadata without rewriting its messages.
+
+        Unlike update_session, this cannot drop messages appended concurrently
+        by another request. Fields left as None are unchanged.
+
+        Returns:
+            False if the session does not exist
+        """
+
+    @abstractmethod
+    def search_messages(self, user_id: str, query: str, limit: int = 20) -> List[ChatSearchHit]:
+        """
+        Full-text search over the content of a user's messages.
+
+        Args:
+            user_id: Owner of the sessions
+            query: Search terms; messages must contain all of them
+            limit: Maximum number of hits to return
+
+        Returns:
+            Matching messages with snippets, most relevant first
+        """
+
+
+class SessionStorage(SessionStorageBackend):
+    """
+    File-based session storage manager with user segregation.
+
+    Every write goes through a temp file + os.replace (or an fsynced journal
+    append) under flock-based locks: one per user index and one per session,
+    so concurrent requests and multiple worker processes sharing the data
+    directory never lose updates, and unrelated users never wait on each other.
+    Lock order is always session lock before index lock.
+
+    Parsed sessions are kept in an LRU cache validated by file stat()s and
+    updated write-through, so one chat turn parses the session at most once.
+
+    Message content is indexed for search in a per-user append-only log that
+    is written under the index lock (see ``search_index.py``), and the blob
+    hashes of attachments in a per-user hash -> session IDs map, so ownership
+    checks of the attachments endpoint never read session files.
+    """
 
     def __init__(self, data_dir: str = "./data/sessions"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        self._cache = SessionCache(settings.session_cache_max_entries, settings.session_cache_max_bytes)
+        self._serializer = get_serializer(settings.session_serialization_format)
+        self._search = SearchIndex()
 
-    def _user_dir(self, user_id: str) -> Path:
-        """Get or create user-specific directory."""
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the parsed session cache."""
+        return self._cache.stats()
+
+    @staticmethod
+    def _cache_key(user_id: str, session_id: str) -> str:
+        """Key of a session in the parsed session cache."""
+        return f"{user_id}/{session_id}"
+
+    def _version_stamp(self, user_id: str, session_id: str) -> Optional[tuple[tuple, int]]:
+        """
+        Build a version stamp from the stat() of the snapshot and journal files.
+
+        Appends change the size and atomic replaces change the inode, so any
+        write (by this or another process) yields a different stamp.
+
+        Returns:
+            Tuple of (stamp, total size in bytes), or None if the session does not exist
+        """
+        stamp = []
+        total_size = 0
+        for path in (
+            self._session_file(user_id, session_id),
+            self._folding_file(user_id, session_id),
+            self._journal_file(user_id, session_id),
+        ):
+            try:
+                file_stat = path.stat()
+            except FileNotFoundError:
+                if not stamp:
+                    return None
+                stamp.append(None)
+                continue
+            stamp.append((file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns))
+            total_size += file_stat.st_size
+        return tuple(stamp), total_size
+
+    def _cache_write_through(self, user_id: str, session_id: str, session: Optional[ChatSession]):
+        """Store the session as written, or drop it from the cache if unknown. Call with the session lock held."""
+        key = self._cache_key(user_id, session_id)
+        version = self._version_stamp(user_id, session_id)
+        if session is None or version is None:
+            self._cache.invalidate(key)
+            return
+        stamp, size = version
+        self._cache.put(key, stamp, session, size)
+
+    def _cached_before_write(self, user_id: str, session_id: str) -> Optional[ChatSession]:
+        """Get the cached session if it is current. Call with the session lock held, before writing."""
+        version = self._version_stamp(user_id, session_id)
+        if version is None:
+            return None
+        return self._cache.peek(self._cache_key(user_id, session_id), version[0])
+
+    def _user_path(self, user_id: str) -> Path:
+        """Get the path of the user-specific directory without creating it."""
         # Sanitize user_id for filesystem safety
         safe_user_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in user_id)
-        user_dir = self.data_dir / safe_user_id
+        return self.data_dir / safe_user_id
+
+    def _user_dir(self, user_id: str) -> Path:
+        """Get or create user-specific directory."""
+        user_dir = self._user_path(user_id)
         user_dir.mkdir(parents=True, exist_ok=True)
         return user_dir
 
+    def _session_exists(self, user_id: str, session_id: str) -> bool:
+        """
+        Check for a session's snapshot without creating the user directory or a lock file.
+
+        Lets lookups of unknown ids return early instead of leaving a lock file
+        behind; callers re-check under the session lock.
+        """
+        return (self._user_path(user_id) / f"{session_id}.json").exists()
+
     def _index_file(self, user_id: str) -> Path:
         """Get path to user's index file."""
         return self._user_dir(user_id) / "index.json"
 
-    def _ensure_index(self, user_id: str):
-        """Ensure user's index file exists."""
-        index_file = self._index_file(user_id)
-        if not index_file.exists():
-            index_file.write_text(json.dumps([], indent=2))
+    def _index_lock(self, user_id: str):
+        """Lock guarding read-modify-write of the user's index file."""
+        return _file_lock(self._user_dir(user_id) / ".index.lock")
+
+    def _session_lock_file(self, user_id: str, session_id: str) -> Path:
+        """Get path to the lock file of a session."""
+        return self._user_dir(user_id) / f"{session_id}.lock"
+
+    def _session_lock(self, user_id: str, session_id: str, shared: bool = False):
+        """Lock guarding a session's snapshot and journals (shared for readers)."""
+        return _file_lock(self._session_lock_file(user_id, session_id), shared=shared)
 
     def _load_index(self, user_id: str) -> List[dict]:
         """Load user's session index."""
-        self._ensure_index(user_id)
-        return json.loads(self._index_file(user_id).read_text())
+        index_file = self._index_file(user_id)
+        if not index_file.exists():
+            return []
+        return loads_line(index_file.read_bytes())
 
     def _save_index(self, user_id: str, index: List[dict]):
         """Save user's session index."""
-        self._index_file(user_id).write_text(json.dumps(index, indent=2))
+        _atomic_write(self._index_file(user_id), dumps_line(index))
+
+    def _update_index_entry(self, user_id: str, session_id: str, **fields):
+        """Update fields of one index entry under the index lock."""
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            for entry in index:
+                if entry["session_id"] == session_id:
+                    entry.update(fields)
+                    break
+            self._save_index(user_id, index)
+
+    def _search_file(self, user_id: str) -> Path:
+        """Get path to user's search log."""
+        return self._user_dir(user_id) / ".search.jsonl"
+
+    @staticmethod
+    def _search_records(session: ChatSession) -> List[dict]:
+        """Build search log records replacing everything indexed for a session."""
+        return [drop_record(session.session_id)] + [
+            message_record(session.session_id, position, msg.role, msg.content, msg.timestamp.isoformat())
+            for position, msg in enumerate(session.messages)
+        ]
+
+    def _compact_search_log(self, user_id: str):
+        """Rewrite the search log if it is mostly superseded records. Call with the index lock held."""
+        search_file = self._search_file(user_id)
+        records = self._search.compacted_records(search_file)
+        if records is not None:
+            _atomic_write(search_file, self._search.encode(records))
+
+    def _build_search_log(self, user_id: str):
+        """
+        Build the search log from the user's sessions the first time they search.
+
+        Sessions are read before taking the index lock (session -> index lock
+        order). Every write rewrites the index file, so if it changed while
+        reading, the sessions are read again.
+        """
+        index_file = self._index_file(user_id)
+        search_file = self._search_file(user_id)
+        for _ in range(3):
+            stamp = index_file.stat().st_mtime_ns if index_file.exists() else None
+            records = []
+            for entry in self._load_index(user_id):
+                session = self.get_session(user_id, entry["session_id"])
+                if session:
+                    records.extend(self._search_records(session)[1:])
+
+            with self._index_lock(user_id):
+                if search_file.exists():
+                    return
+                current = index_file.stat().st_mtime_ns if index_file.exists() else None
+                if current == stamp:
+                    _atomic_write(search_file, self._search.encode(records))
+                    return
+
+    def _attachment_index_file(self, user_id: str) -> Path:
+        """Get path to the user's map of attachment blob hashes to session IDs."""
+        return self._user_path(user_id) / ".attachments.json"
+
+    @staticmethod
+    def _attachment_hashes(messages: List[ChatMessage]) -> set[str]:
+        """Collect the blob hashes referenced by stored messages."""
+        return {att.hash for msg in messages for att in msg.attachments or [] if att.hash}
+
+    def _index_attachments(self, user_id: str, session_id: str, hashes: set[str], replace: bool = False):
+        """
+        Record the blob hashes a session references. Call with the index lock held.
+
+        Users whose map has not been built yet are skipped; it is built from
+        their sessions on the first lookup.
+
+        Args:
+            user_id: Owner of the session
+            session_id: Session referencing the blobs
+            hashes: Blob hashes to add
+            replace: Drop the session's other hashes (its messages were rewritten or deleted)
+        """
+        attachment_file = self._attachment_index_file(user_id)
+        if (not hashes and not replace) or not attachment_file.exists():
+            return
+
+        attachment_index = loads_line(attachment_file.read_bytes())
+        changed = False
+        if replace:
+            for blob_hash in [blob_hash for blob_hash, session_ids in attachment_index.items()
+                              if session_id in session_ids and blob_hash not in hashes]:
+                attachment_index[blob_hash].remove(session_id)
+                if not attachment_index[blob_hash]:
+                    del attachment_index[blob_hash]
+                changed = True
+        for blob_hash in hashes:
+            session_ids = attachment_index.setdefault(blob_hash, [])
+            if session_id not in session_ids:
+                session_ids.append(session_id)
+                changed = True
+        if changed:
+            _atomic_write(attachment_file, dumps_line(attachment_index))
+
+    def _build_attachment_index(self, user_id: str) -> dict:
+        """
+        Build the attachment map from the user's sessions the first time it is needed.
+
+        Reads sessions before taking the index lock, re-reading them if the
+        index file changed meanwhile (as in _build_search_log).
+
+        Returns:
+            Map of blob hash to the IDs of the sessions referencing it
+        """
+        index_file = self._index_file(user_id)
+        attachment_file = self._attachment_index_file(user_id)
+        for _ in range(3):
+            stamp = index_file.stat().st_mtime_ns if index_file.exists() else None
+            attachment_index: dict = {}
+            for entry in self._load_index(user_id):
+                session = self.get_session(user_id, entry["session_id"])
+                if session:
+                    for blob_hash in self._attachment_hashes(session.messages):
+                        attachment_index.setdefault(blob_hash, []).append(session.session_id)
+
+            with self._index_lock(user_id):
+                if attachment_file.exists():
+                    return loads_line(attachment_file.read_bytes())
+                current = index_file.stat().st_mtime_ns if index_file.exists() else None
+                if current == stamp:
+                    _atomic_write(attachment_file, dumps_line(attachment_index))
+                    return attachment_index
+        return attachment_index
+
+    def references_attachment(self, user_id: str, blob_hash: str) -> bool:
+        """Look the blob hash up in the user's attachment map, building it on first use."""
+        if not self._user_path(user_id).exists():
+            return False
+        attachment_file = self._attachment_index_file(user_id)
+        if attachment_file.exists():
+            attachment_index = loads_line(attachment_file.read_bytes())
+        else:
+            attachment_index = self._build_attachment_index(user_id)
+        return blob_hash in attachment_index
 
     def _session_file(self, user_id: str, session_id: str) -> Path:
         """Get path to session file."""
         return self._user_dir(user_id) / f"{session_id}.json"
 
+    @staticmethod
+    def _index_entry(session: ChatSession) -> dict:
+        """
+        Build the index entry for a session.
+
+        Listing fields are denormalized here at write time so that listing
+        sessions only ever reads the index, never the session files.
+        """
+        return {
+            "session_id": session.session_id,
+            "title": session.title,
+            "title_generated": session.title_generated,
+            "created_at": session.created_at.isoformat(),
+            "updated_at": session.updated_at.isoformat(),
+            "message_count": len(session.messages),
+            "last_message": session.messages[-1].content[:LAST_MESSAGE_PREVIEW_CHARS] if session.messages else "",
+        }
+
+    def _backfill_index(self, user_id: str, index: List[dict]) -> List[dict]:
+        """One-time migration of index entries written before listing fields were denormalized."""
+        # Sessions are read before taking the index lock to respect the session -> index lock order
+        backfilled = {}
+        for entry in index:
+            if "last_message" not in entry:
+                session = self.get_session(user_id, entry["session_id"])
+                backfilled[entry["session_id"]] = self._index_entry(session) if session else {"last_message": ""}
+
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            for entry in index:
+                if "last_message" not in entry and entry["session_id"] in backfilled:
+                    entry.update(backfilled[entry["session_id"]])
+            self._save_index(user_id, index)
+        return index
+
     def create_session(self, user_id: str, title: str = "New Chat") -> ChatSession:
         """Create a new chat session for a user."""
         session_id = str(uuid.uuid4())
@@ -64,176 +674,470 @@ class SessionStorage:
         )
 
         # Save session file
-        self._save_session(user_id, session)
+        with self._session_lock(user_id, session_id):
+            self._save_session(user_id, session)
+            self._cache_write_through(user_id, session_id, session)
 
         # Update index
-        index = self._load_index(user_id)
-        index.append({
-            "session_id": session_id,
-            "title": title,
-            "created_at": now.isoformat(),
-            "updated_at": now.isoformat(),
-            "message_count": 0
-        })
-        self._save_index(user_id, index)
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            if not index and not self._attachment_index_file(user_id).exists():
+                # Nothing to build from for a new user
+                _atomic_write(self._attachment_index_file(user_id), dumps_line({}))
+            index.append(self._index_entry(session))
+            self._save_index(user_id, index)
 
         return session
 
-    def _save_session(self, user_id: str, session: ChatSession):
-        """Save session to file."""
+    def _journal_file(self, user_id: str, session_id: str) -> Path:
+        """Get path to the live append-only message journal of a session."""
+        return self._user_dir(user_id) / f"{session_id}.journal.jsonl"
+
+    def _folding_file(self, user_id: str, session_id: str) -> Path:
+        """Get path to a journal that is being folded into the session snapshot."""
+        return self._user_dir(user_id) / f"{session_id}.journal.folding"
+
+    @staticmethod
+    def _message_to_dict(msg: ChatMessage) -> dict:
+        """Serialize a message for the snapshot or journal."""
+        if msg.attachments:
+            # Keep attachment bytes out of session files; only blob references are stored
+            msg = get_attachment_store().externalize_message(msg)
+        return msg.model_dump(mode="json", exclude_none=True)
+
+    @staticmethod
+    def _message_from_dict(msg_data: dict) -> ChatMessage:
+        """Deserialize a message from the snapshot or journal."""
+        return ChatMessage.model_validate(msg_data)
+
+    def _save_session(self, user_id: str, session: ChatSession, folded_journal_id: Optional[str] = None):
+        """
+        Save the session snapshot to file.
+
+        Args:
+            user_id: Owner of the session
+            session: Session to write
+            folded_journal_id: ID of the journal whose records are included in this snapshot
+        """
         session_file = self._session_file(user_id, session.session_id)
-        session_data = {
-            "session_id": session.session_id,
-            "title": session.title,
-            "title_generated": session.title_generated,
-            "greeted": session.greeted,
-            "user_id": user_id,
-            "messages": [
-                {
-                    "role": msg.role,
-                    "content": msg.content,
-                    "timestamp": msg.timestamp.isoformat(),
-                    **({"tables": [
-                        {
-                            "columns": [{"header": col.header, "accessor": col.accessor} for col in table.columns],
-                            "rows": table.rows
-                        } for table in msg.tables
-                    ]} if msg.tables else {}),
-                    **({"attachments": [
-                        {
-                            "id": att.id,
-                            "name": att.name,
-                            "mime_type": att.mime_type,
-                            "size": att.size,
-                            "data": att.data
-                        } for att in msg.attachments
-                    ]} if msg.attachments else {})
-                }
-                for msg in session.messages
-            ],
-            "created_at": session.created_at.isoformat(),
-            "updated_at": session.updated_at.isoformat()
-        }
-        session_file.write_text(json.dumps(session_data, indent=2))
+        session_data = session.model_dump(mode="json", exclude={"messages"})
+        session_data["user_id"] = user_id
+        session_data["messages"] = [self._message_to_dict(msg) for msg in session.messages]
+        session_data["folded_journal_id"] = folded_journal_id
+        _atomic_write(session_file, encode_snapshot(session_data, self._serializer))
 
-    def get_session(self, user_id: str, session_id: str) -> Optional[ChatSession]:
-        """Get a specific session by ID for a user."""
+    @staticmethod
+    def _read_journal(journal_file: Path) -> tuple[Optional[str], List[dict]]:
+        """
+        Read a journal file.
+
+        Returns:
+            Tuple of (journal ID, list of records). A torn trailing line left by a
+            crash mid-write is skipped.
+        """
+        if not journal_file.exists():
+            return None, []
+
+        journal_id = None
+        records = []
+        for line in journal_file.read_bytes().splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = loads_line(line)
+            except ValueError:
+                continue
+            if "journal_id" in record:
+                journal_id = record["journal_id"]
+            else:
+                records.append(record)
+        return journal_id, records
+
+    @classmethod
+    def _apply_journal(cls, session: ChatSession, records: List[dict]):
+        """Replay journal records (messages and metadata changes) on top of a session snapshot."""
+        for record in records:
+            if "message" in record:
+                session.messages.append(cls._message_from_dict(record["message"]))
+            for field, value in record.get("metadata", {}).items():
+                setattr(session, field, value)
+            session.updated_at = datetime.fromisoformat(record["updated_at"])
+
+    def _append_journal(self, user_id: str, session_id: str, record: dict) -> int:
+        """
+        Append one record to the session's live journal with a single write + fsync.
+
+        Must be called with the session lock held.
+
+        Returns:
+            Size of the journal after the append, in bytes
+        """
+        line = dumps_line(record) + b"\n"
+
+        with open(self._journal_file(user_id, session_id), "a+b") as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                line = dumps_line({"journal_id": str(uuid.uuid4())}) + b"\n" + line
+            else:
+                # Start on a fresh line if a previous write was torn by a crash
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    line = b"\n" + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        return size + len(line)
+
+    def _read_snapshot(self, user_id: str, session_id: str) -> Optional[tuple[ChatSession, Optional[str], bool]]:
+        """
+        Read the session snapshot without replaying journals.
+
+        Returns:
+            Tuple of (session, folded journal ID, is_legacy), where is_legacy marks
+            headerless JSON snapshots still to be migrated
+        """
         session_file = self._session_file(user_id, session_id)
         if not session_file.exists():
             return None
 
-        data = json.loads(session_file.read_text())
+        data, is_legacy = decode_snapshot(session_file.read_bytes())
+        folded_journal_id = data.pop("folded_journal_id", None)
+        data.setdefault("user_id", user_id)
+        return ChatSession.model_validate(data), folded_journal_id, is_legacy
 
-        # Parse messages
-        messages = []
-        for msg_data in data["messages"]:
-            msg = ChatMessage(
-                role=msg_data["role"],
-                content=msg_data["content"],
-                timestamp=datetime.fromisoformat(msg_data["timestamp"])
-            )
-            # Add tables if present
-            if "tables" in msg_data:
-                msg.tables = [
-                    TableData(
-                        columns=[TableColumn(**col) for col in table["columns"]],
-                        rows=table["rows"]
-                    )
-                    for table in msg_data["tables"]
-                ]
-            # Add attachments if present
-            if "attachments" in msg_data:
-                msg.attachments = [
-                    ChatAttachment(**att)
-                    for att in msg_data["attachments"]
-                ]
-            messages.append(msg)
-
-        return ChatSession(
-            session_id=data["session_id"],
-            title=data["title"],
-            messages=messages,
-            created_at=datetime.fromisoformat(data["created_at"]),
-            updated_at=datetime.fromisoformat(data["updated_at"]),
-            title_generated=data.get("title_generated", False),
-            greeted=data.get("greeted", False),
-            user_id=data.get("user_id", user_id),
-        )
+    def _migrate_snapshot(self, user_id: str, session_id: str):
+        """
+        Rewrite a legacy JSON snapshot in the configured format (journals are left as they are).
 
-    def list_sessions(self, user_id: str) -> List[ChatHistoryItem]:
-        """List all sessions with metadata for a user."""
+        Called after the first read of a legacy session; a failure is logged and
+        retried on the next read.
+        """
+        try:
+            with self._session_lock(user_id, session_id):
+                snapshot = self._read_snapshot(user_id, session_id)
+                if snapshot is None or not snapshot[2]:
+                    return
+                session, folded_journal_id, _ = snapshot
+                self._save_session(user_id, session, folded_journal_id=folded_journal_id)
+            logger.info(f"Migrated legacy snapshot of session {session_id} to {self._serializer.name}")
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Could not migrate legacy snapshot of session {session_id}: {exc}")
+
+    def _finish_folding(self, user_id: str, session_id: str):
+        """
+        Fold a rotated journal into the snapshot and remove it.
+
+        Safe to re-run after a crash: a journal already recorded as folded in the
+        snapshot is not applied twice.
+        """
+        folding_file = self._folding_file(user_id, session_id)
+        if not folding_file.exists():
+            return
+
+        snapshot = self._read_snapshot(user_id, session_id)
+        if snapshot is not None:
+            session, folded_journal_id, _ = snapshot
+            journal_id, records = self._read_journal(folding_file)
+            if journal_id != folded_journal_id:
+                self._apply_journal(session, records)
+                self._save_session(user_id, session, folded_journal_id=journal_id)
+        folding_file.unlink()
+
+    def _rotate_journal(self, user_id: str, session_id: str) -> Optional[str]:
+        """
+        Move the live journal aside so new appends start a fresh journal.
+
+        Returns:
+            ID of the rotated journal, or None if there was no live journal
+        """
+        self._finish_folding(user_id, session_id)
+        journal_file = self._journal_file(user_id, session_id)
+        if not journal_file.exists():
+            return None
+        # The journal ID header is always the first line
+        with open(journal_file, "rb") as f:
+            journal_id = loads_line(f.readline()).get("journal_id")
+        os.replace(journal_file, self._folding_file(user_id, session_id))
+        return journal_id
+
+    def compact_session(self, user_id: str, session_id: str):
+        """Fold the session's message journal into its snapshot."""
+        with self._session_lock(user_id, session_id):
+            cached = self._cached_before_write(user_id, session_id)
+            self._compact_locked(user_id, session_id)
+            self._cache_write_through(user_id, session_id, cached)
+
+    def _compact_locked(self, user_id: str, session_id: str):
+        """Fold the journal into the snapshot. Must be called with the session lock held."""
+        self._rotate_journal(user_id, session_id)
+        self._finish_folding(user_id, session_id)
+
+    def get_session(self, user_id: str, session_id: str) -> Optional[ChatSession]:
+        """Get a specific session by ID for a user (snapshot plus journal tail)."""
+        if not self._session_exists(user_id, session_id):
+            self._cache.invalidate(self._cache_key(user_id, session_id))
+            return None
+
+        with self._session_lock(user_id, session_id, shared=True):
+            key = self._cache_key(user_id, session_id)
+            version = self._version_stamp(user_id, session_id)
+            if version is None:
+                self._cache.invalidate(key)
+                return None
+            cached = self._cache.get(key, version[0])
+            if cached is not None:
+                return cached
+
+            snapshot = self._read_snapshot(user_id, session_id)
+            if snapshot is None:
+                return None
+            session, folded_journal_id, is_legacy = snapshot
+
+            # A journal left by an interrupted compaction comes before the live journal
+            for journal_file in (self._folding_file(user_id, session_id), self._journal_file(user_id, session_id)):
+                journal_id, records = self._read_journal(journal_file)
+                if journal_id is not None and journal_id != folded_journal_id:
+                    self._apply_journal(session, records)
+
+            self._cache.put(key, version[0], session, version[1])
+
+        if is_legacy:
+            # Needs the exclusive lock, so only after the shared one is released
+            self._migrate_snapshot(user_id, session_id)
+        return session
+
+    def list_sessions_page(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> ChatHistoryPage:
+        """List one page of sessions for a user, reading only the index file."""
         index = self._load_index(user_id)
+        if any("last_message" not in entry for entry in index):
+            index = self._backfill_index(user_id, index)
 
-        # Convert to ChatHistoryItem objects
-        items = []
-        for entry in index:
-            # Get last message from session file if exists
-            session = self.get_session(user_id, entry["session_id"])
-            last_message = ""
-            if session and session.messages:
-                last_message = session.messages[-1].content[:100]  # First 100 chars
+        # Sort by timestamp descending (newest first), session_id breaks ties for stable cursors
+        entries = sorted(index, key=lambda entry: (entry["updated_at"], entry["session_id"]), reverse=True)
+        if cursor:
+            after = decode_history_cursor(cursor)
+            entries = [entry for entry in entries if (entry["updated_at"], entry["session_id"]) < after]
+
+        page = entries[:limit] if limit else entries
+        next_cursor = None
+        if limit and len(entries) > limit:
+            next_cursor = encode_history_cursor(page[-1]["updated_at"], page[-1]["session_id"])
 
-            items.append(ChatHistoryItem(
+        items = [
+            ChatHistoryItem(
                 session_id=entry["session_id"],
                 title=entry["title"],
-                last_message=last_message,
+                last_message=entry.get("last_message", ""),
                 timestamp=datetime.fromisoformat(entry["updated_at"]),
-                message_count=entry.get("message_count", 0)
-            ))
-
-        # Sort by timestamp descending (newest first)
-        items.sort(key=lambda x: x.timestamp, reverse=True)
-        return items
+                message_count=entry.get("message_count", 0),
+                title_generated=entry.get("title_generated", False)
+            )
+            for entry in page
+        ]
+        return ChatHistoryPage(items=items, next_cursor=next_cursor)
 
     def update_session(self, user_id: str, session: ChatSession):
-        """Update an existing session."""
+        """Update an existing session, rewriting its snapshot and folding the journal."""
         session.updated_at = datetime.utcnow()
-        self._save_session(user_id, session)
+        entry = self._index_entry(session)
+        with self._session_lock(user_id, session.session_id):
+            # Cached and indexed as stored, without inline attachment data (the caller's session is not modified)
+            attachment_store = get_attachment_store()
+            stored = session.model_copy(update={
+                "messages": [attachment_store.externalize_message(msg) for msg in session.messages],
+            })
 
-        # Update index
-        index = self._load_index(user_id)
-        for entry in index:
-            if entry["session_id"] == session.session_id:
-                entry["title"] = session.title
-                entry["updated_at"] = session.updated_at.isoformat()
-                entry["message_count"] = len(session.messages)
-                break
-        self._save_index(user_id, index)
+            # The session object is authoritative, so the live journal is folded away rather than replayed
+            journal_id = self._rotate_journal(user_id, session.session_id)
+            self._save_session(user_id, stored, folded_journal_id=journal_id)
+            self._folding_file(user_id, session.session_id).unlink(missing_ok=True)
+            self._cache_write_through(user_id, session.session_id, stored)
+
+            # Messages may have been replaced, so the session is re-indexed from scratch. The index
+            # file is rewritten in the same locked step, which tells builders of the maps to re-read.
+            with self._index_lock(user_id):
+                self._search.append(self._search_file(user_id), self._search_records(stored))
+                self._compact_search_log(user_id)
+                self._index_attachments(
+                    user_id, session.session_id, self._attachment_hashes(stored.messages), replace=True
+                )
+                index = self._load_index(user_id)
+                for index_entry in index:
+                    if index_entry["session_id"] == session.session_id:
+                        index_entry.update(entry)
+                        break
+                self._save_index(user_id, index)
+
+    def update_session_metadata(
+        self,
+        user_id: str,
+        session_id: str,
+        *,
+        title: Optional[str] = None,
+        title_generated: Optional[bool] = None,
+        greeted: Optional[bool] = None,
+        summary: Optional[str] = None,
+        summary_message_count: Optional[int] = None
+    ) -> bool:
+        """Update session metadata by appending a journal record."""
+        metadata = {
+            field: value
+            for field, value in (
+                ("title", title),
+                ("title_generated", title_generated),
+                ("greeted", greeted),
+                ("summary", summary),
+                ("summary_message_count", summary_message_count),
+            )
+            if value is not None
+        }
+        now = datetime.utcnow()
+
+        if not self._session_exists(user_id, session_id):
+            return False
+        with self._session_lock(user_id, session_id):
+            if not self._session_file(user_id, session_id).exists():
+                return False
+            cached = self._cached_before_write(user_id, session_id)
+            self._append_journal(user_id, session_id, {"metadata": metadata, "updated_at": now.isoformat()})
+            if cached is not None:
+                cached = cached.model_copy(update={**metadata, "updated_at": now})
+            self._cache_write_through(user_id, session_id, cached)
+
+        index_fields = {field: value for field, value in metadata.items() if field in ("title", "title_generated")}
+        self._update_index_entry(user_id, session_id, updated_at=now.isoformat(), **index_fields)
+        return True
 
     def delete_session(self, user_id: str, session_id: str) -> bool:
         """Delete a session for a user."""
-        session_file = self._session_file(user_id, session_id)
-        if not session_file.exists():
+        if not self._session_exists(user_id, session_id):
             return False
+        with self._session_lock(user_id, session_id):
+            session_file = self._session_file(user_id, session_id)
+            if not session_file.exists():
+                return False
 
-        # Delete session file
-        session_file.unlink()
+            # Delete session file, journals and (still holding it) the lock file
+            self._cache.invalidate(self._cache_key(user_id, session_id))
+            session_file.unlink()
+            self._journal_file(user_id, session_id).unlink(missing_ok=True)
+            self._folding_file(user_id, session_id).unlink(missing_ok=True)
+            _remove_lock_file(self._session_lock_file(user_id, session_id))
 
         # Update index
-        index = self._load_index(user_id)
-        index = [entry for entry in index if entry["session_id"] != session_id]
-        self._save_index(user_id, index)
+        with self._index_lock(user_id):
+            index = self._load_index(user_id)
+            index = [entry for entry in index if entry["session_id"] != session_id]
+            self._save_index(user_id, index)
+            self._search.append(self._search_file(user_id), [drop_record(session_id)])
+            self._compact_search_log(user_id)
+            self._index_attachments(user_id, session_id, set(), replace=True)
 
         return True
 
     def add_message(self, user_id: str, session_id: str, message: ChatMessage) -> bool:
-        """Add a message to a session."""
-        session = self.get_session(user_id, session_id)
-        if not session:
+        """
+        Add a message to a session.
+
+        The message is appended to the session's journal with a single write and
+        fsync, so the cost does not grow with the session history. The journal
+        is folded into the snapshot once it exceeds the configured size.
+        """
+        now = datetime.utcnow()
+
+        if not self._session_exists(user_id, session_id):
             return False
+        with self._session_lock(user_id, session_id):
+            if not self._session_file(user_id, session_id).exists():
+                return False
+            # Attachment blobs are written only for a known session, on a copy of the caller's message
+            if message.attachments:
+                message = get_attachment_store().externalize_message(message)
+            record = {"message": self._message_to_dict(message), "updated_at": now.isoformat()}
+            cached = self._cached_before_write(user_id, session_id)
+            journal_size = self._append_journal(user_id, session_id, record)
+            if journal_size > settings.session_journal_compact_bytes:
+                self._compact_locked(user_id, session_id)
+            if cached is not None:
+                cached = cached.model_copy(update={
+                    "messages": [*cached.messages, message.model_copy(deep=True)],
+                    "updated_at": now,
+                })
+            self._cache_write_through(user_id, session_id, cached)
 
-        session.messages.append(message)
-        self.update_session(user_id, session)
+            # Update index (still under the session lock so message_count cannot race)
+            with self._index_lock(user_id):
+                index = self._load_index(user_id)
+                for entry in index:
+                    if entry["session_id"] == session_id:
+                        position = entry.get("message_count", 0)
+                        entry["updated_at"] = now.isoformat()
+                        entry["message_count"] = position + 1
+                        entry["last_message"] = message.content[:LAST_MESSAGE_PREVIEW_CHARS]
+                        self._search.append(self._search_file(user_id), [
+                            message_record(session_id, position, message.role, message.content, record["message"]["timestamp"])
+                        ])
+                        break
+                self._index_attachments(user_id, session_id, self._attachment_hashes([message]))
+                self._save_index(user_id, index)
         return True
 
+    def search_messages(self, user_id: str, query: str, limit: int = 20) -> List[ChatSearchHit]:
+        """Search message content using the user's search log, building it on first use."""
+        search_file = self._search_file(user_id)
+        results = self._search.search(search_file, query, limit)
+        if results is None:
+            self._build_search_log(user_id)
+            results = self._search.search(search_file, query, limit) or []
+
+        titles = {entry["session_id"]: entry["title"] for entry in self._load_index(user_id)}
+        return [
+            ChatSearchHit(
+                session_id=hit["s"],
+                title=titles[hit["s"]],
+                message_index=hit["p"],
+                role=hit["r"],
+                snippet=snippet,
+                timestamp=datetime.fromisoformat(hit["t"]),
+                score=score
+            )
+            for score, hit, snippet in results
+            if hit["s"] in titles
+        ]
+
 
 # Global instance
-_storage: Optional[SessionStorage] = None
+_storage: Optional[SessionStorageBackend] = None
+
+
+def create_storage(backend: Optional[str] = None) -> SessionStorageBackend:
+    """
+    Create a storage backend instance.
+
+    Args:
+        backend: Backend name ("json" or "sqlite"). Defaults to settings.session_storage_backend.
+
+    Returns:
+        Configured storage backend
+    """
+    backend = (backend or settings.session_storage_backend).strip().lower()
+    if backend == "json":
+        return SessionStorage(settings.session_data_dir)
+    if backend == "sqlite":
+        # Imported lazily to avoid a circular import (the SQLite backend subclasses the interface above)
+        from app.services.sqlite_session_storage import SqliteSessionStorage
+        return SqliteSessionStorage(settings.session_sqlite_path)
+    raise ValueError(f"Unsupported SESSION_STORAGE_BACKEND value: {backend!r}. Use 'json' or 'sqlite'.")
 
 
-def get_storage() -> SessionStorage:
+def get_storage() -> SessionStorageBackend:
     """Get or create the global storage instance."""
     global _storage
     if _storage is None:
-        _storage = SessionStorage()
+        _storage = create_storage()
     return _storage
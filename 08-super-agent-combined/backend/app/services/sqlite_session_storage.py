@@ -0,0 +1,405 @@
+"""
+SQLite-backed session storage.
+
+Sessions and messages live in normalized tables inside a single database file
+running in WAL mode, so readers never block the writer and appending a message
+is a single INSERT instead of a rewrite of the whole session. Message content
+is indexed for search by an FTS5 table kept in sync by triggers.
+"""
+import json
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from app.models.schemas import (
+    ChatSession, ChatHistoryItem, ChatHistoryPage, ChatMessage, ChatSearchHit, TableData, ChatAttachment
+)
+from app.services.attachment_store import get_attachment_store
+from app.services.search_index import SNIPPET_MARKER, tokenize
+from app.services.session_storage import (
+    LAST_MESSAGE_PREVIEW_CHARS,
+    SessionStorageBackend,
+    decode_history_cursor,
+    encode_history_cursor,
+)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    title_generated INTEGER NOT NULL DEFAULT 0,
+    greeted INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    summary_message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_user_updated ON sessions (user_id, updated_at, session_id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL REFERENCES sessions (session_id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    tables TEXT,
+    attachments TEXT,
+    UNIQUE (session_id, position)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5 (
+    content, content='messages', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+    INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+"""
+
+# Columns added to the sessions table after its first release, with their definitions
+_ADDED_SESSION_COLUMNS = {
+    "summary": "TEXT",
+    "summary_message_count": "INTEGER NOT NULL DEFAULT 0",
+}
+
+# Tokens of context around the first match in search snippets
+_SNIPPET_TOKENS = 24
+
+
+class SqliteSessionStorage(SessionStorageBackend):
+    """SQLite (WAL mode) session storage with user segregation."""
+
+    def __init__(self, db_path: str = "./data/sessions.db"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # sqlite3 connections must not be shared between threads, so each thread gets its own
+        self._local = threading.local()
+        with self._connect() as conn:
+            has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+            ).fetchone()
+            conn.executescript(_SCHEMA)
+            # Add columns introduced after the table was first created
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(sessions)")}
+            for column, definition in _ADDED_SESSION_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {definition}")
+            if not has_fts:
+                # Index messages stored before full-text search was added
+                conn.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _message_row(session_id: str, position: int, msg: ChatMessage) -> tuple:
+        """Convert a message into a row for the messages table."""
+        tables = json.dumps([table.model_dump() for table in msg.tables]) if msg.tables else None
+        attachments = None
+        if msg.attachments:
+            # Keep attachment bytes out of the database; only blob references are stored
+            stored = get_attachment_store().externalize_message(msg)
+            attachments = json.dumps([att.model_dump(exclude_none=True) for att in stored.attachments])
+        return (
+            session_id,
+            position,
+            msg.role,
+            msg.content,
+            msg.timestamp.isoformat(),
+            tables,
+            attachments,
+        )
+
+    @staticmethod
+    def _message_from_row(row: sqlite3.Row) -> ChatMessage:
+        """Convert a messages table row back into a message."""
+        msg = ChatMessage(
+            role=row["role"],
+            content=row["content"],
+            timestamp=datetime.fromisoformat(row["timestamp"])
+        )
+        if row["tables"]:
+            msg.tables = [TableData(**table) for table in json.loads(row["tables"])]
+        if row["attachments"]:
+            msg.attachments = [ChatAttachment(**att) for att in json.loads(row["attachments"])]
+        return msg
+
+    def _insert_messages(self, conn: sqlite3.Connection, session_id: str, start: int, messages: List[ChatMessage]):
+        """Insert messages starting at the given position."""
+        conn.executemany(
+            "INSERT INTO messages (session_id, position, role, content, timestamp, tables, attachments) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [self._message_row(session_id, start + offset, msg) for offset, msg in enumerate(messages)]
+        )
+
+    def create_session(self, user_id: str, title: str = "New Chat") -> ChatSession:
+        """Create a new chat session for a user."""
+        session_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, user_id, title, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, user_id, title, now.isoformat(), now.isoformat())
+            )
+
+        return ChatSession(
+            session_id=session_id,
+            title=title,
+            messages=[],
+            created_at=now,
+            updated_at=now,
+            user_id=user_id,
+        )
+
+    def get_session(self, user_id: str, session_id: str) -> Optional[ChatSession]:
+        """Get a specific session by ID for a user."""
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT * FROM sessions WHERE session_id = ? AND user_id = ?",
+            (session_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+
+        message_rows = conn.execute(
+            "SELECT * FROM messages WHERE session_id = ? ORDER BY position",
+            (session_id,)
+        ).fetchall()
+
+        return ChatSession(
+            session_id=row["session_id"],
+            title=row["title"],
+            messages=[self._message_from_row(message_row) for message_row in message_rows],
+            created_at=datetime.fromisoformat(row["created_at"]),
+            updated_at=datetime.fromisoformat(row["updated_at"]),
+            title_generated=bool(row["title_generated"]),
+            greeted=bool(row["greeted"]),
+            user_id=row["user_id"],
+            summary=row["summary"],
+            summary_message_count=row["summary_message_count"],
+        )
+
+    def list_sessions_page(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> ChatHistoryPage:
+        """List one page of sessions for a user using keyset pagination on (updated_at, session_id)."""
+        query = """
+            SELECT s.session_id, s.title, s.title_generated, s.updated_at, s.message_count,
+                   (SELECT substr(m.content, 1, ?) FROM messages m
+                    WHERE m.session_id = s.session_id
+                    ORDER BY m.position DESC LIMIT 1) AS last_message
+            FROM sessions s
+            WHERE s.user_id = ?
+        """
+        params: list = [LAST_MESSAGE_PREVIEW_CHARS, user_id]
+        if cursor:
+            query += " AND (s.updated_at, s.session_id) < (?, ?)"
+            params.extend(decode_history_cursor(cursor))
+        query += " ORDER BY s.updated_at DESC, s.session_id DESC"
+        if limit:
+            # Fetch one extra row to know whether another page exists
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._connect().execute(query, params).fetchall()
+
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1]["updated_at"], rows[-1]["session_id"])
+
+        items = [
+            ChatHistoryItem(
+                session_id=row["session_id"],
+                title=row["title"],
+                last_message=row["last_message"] or "",
+                timestamp=datetime.fromisoformat(row["updated_at"]),
+                message_count=row["message_count"],
+                title_generated=bool(row["title_generated"])
+            )
+            for row in rows
+        ]
+        return ChatHistoryPage(items=items, next_cursor=next_cursor)
+
+    def update_session(self, user_id: str, session: ChatSession):
+        """
+        Update an existing session.
+
+        Messages are treated as append-only: messages beyond the stored count are
+        inserted, and the stored tail is trimmed if the session has fewer messages.
+        """
+        session.updated_at = datetime.utcnow()
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE sessions SET title = ?, title_generated = ?, greeted = ?, updated_at = ?, message_count = ?, "
+                "summary = ?, summary_message_count = ? "
+                "WHERE session_id = ? AND user_id = ?",
+                (
+                    session.title,
+                    int(session.title_generated),
+                    int(session.greeted),
+                    session.updated_at.isoformat(),
+                    len(session.messages),
+                    session.summary,
+                    session.summary_message_count,
+                    session.session_id,
+                    user_id,
+                )
+            )
+            if cursor.rowcount == 0:
+                return
+
+            stored_count = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ?",
+                (session.session_id,)
+            ).fetchone()[0]
+            if len(session.messages) > stored_count:
+                self._insert_messages(conn, session.session_id, stored_count, session.messages[stored_count:])
+            elif len(session.messages) < stored_count:
+                conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND position >= ?",
+                    (session.session_id, len(session.messages))
+                )
+
+    def update_session_metadata(
+        self,
+        user_id: str,
+        session_id: str,
+        *,
+        title: Optional[str] = None,
+        title_generated: Optional[bool] = None,
+        greeted: Optional[bool] = None,
+        summary: Optional[str] = None,
+        summary_message_count: Optional[int] = None
+    ) -> bool:
+        """Update session metadata columns without touching its messages."""
+        assignments = ["updated_at = ?"]
+        params: list = [datetime.utcnow().isoformat()]
+        for column, value in (
+            ("title", title),
+            ("title_generated", title_generated),
+            ("greeted", greeted),
+            ("summary", summary),
+            ("summary_message_count", summary_message_count),
+        ):
+            if value is not None:
+                assignments.append(f"{column} = ?")
+                params.append(int(value) if isinstance(value, bool) else value)
+
+        with self._connect() as conn:
+            cursor = conn.execute(
+                f"UPDATE sessions SET {', '.join(assignments)} WHERE session_id = ? AND user_id = ?",
+                (*params, session_id, user_id)
+            )
+        return cursor.rowcount > 0
+
+    def delete_session(self, user_id: str, session_id: str) -> bool:
+        """Delete a session for a user."""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE session_id = ? AND user_id = ?",
+                (session_id, user_id)
+            )
+        return cursor.rowcount > 0
+
+    def add_message(self, user_id: str, session_id: str, message: ChatMessage) -> bool:
+        """Add a message to a session with a single INSERT."""
+        now = datetime.utcnow()
+
+        with self._connect() as conn:
+            # Checked before building the row, which writes attachment blobs
+            if conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ? AND user_id = ?",
+                (session_id, user_id)
+            ).fetchone() is None:
+                return False
+
+            _, _, role, content, timestamp, tables, attachments = self._message_row(session_id, 0, message)
+            # Position is read inside the INSERT so concurrent appends cannot claim the same slot
+            cursor = conn.execute(
+                "INSERT INTO messages (session_id, position, role, content, timestamp, tables, attachments) "
+                "SELECT session_id, message_count, ?, ?, ?, ?, ? FROM sessions WHERE session_id = ? AND user_id = ?",
+                (role, content, timestamp, tables, attachments, session_id, user_id)
+            )
+            if cursor.rowcount == 0:
+                return False
+
+            conn.execute(
+                "UPDATE sessions SET message_count = message_count + 1, updated_at = ? WHERE session_id = ?",
+                (now.isoformat(), session_id)
+            )
+        return True
+
+    def references_attachment(self, user_id: str, blob_hash: str) -> bool:
+        """Check whether any of a user's messages has an attachment with the given blob hash."""
+        # Attachments are stored as json.dumps() of the model dumps, so the hash appears as "hash": "<hex>"
+        row = self._connect().execute(
+            """
+            SELECT 1 FROM messages m
+            JOIN sessions s ON s.session_id = m.session_id
+            WHERE s.user_id = ? AND m.attachments LIKE ?
+            LIMIT 1
+            """,
+            (user_id, f'%"hash": "{blob_hash}"%')
+        ).fetchone()
+        return row is not None
+
+    def search_messages(self, user_id: str, query: str, limit: int = 20) -> List[ChatSearchHit]:
+        """Search message content with FTS5, ranked by bm25()."""
+        # Quote every term so user input is never parsed as FTS5 query syntax
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        match = " ".join(f'"{term}"' for term in terms)
+
+        rows = self._connect().execute(
+            """
+            SELECT m.session_id, s.title, m.position, m.role, m.timestamp,
+                   snippet(messages_fts, 0, ?, ?, '…', ?) AS snippet,
+                   bm25(messages_fts) AS rank
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN sessions s ON s.session_id = m.session_id
+            WHERE messages_fts MATCH ? AND s.user_id = ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (SNIPPET_MARKER, SNIPPET_MARKER, _SNIPPET_TOKENS, match, user_id, limit)
+        ).fetchall()
+
+        return [
+            ChatSearchHit(
+                session_id=row["session_id"],
+                title=row["title"],
+                message_index=row["position"],
+                role=row["role"],
+                snippet=" ".join(row["snippet"].split()),
+                timestamp=datetime.fromisoformat(row["timestamp"]),
+                # bm25() is lower for better matches
+                score=-row["rank"]
+            )
+            for row in rows
+        ]
@@ -0,0 +1,347 @@
+"""
+Resumable chat stream runs.
+
+A chat response is produced by a background task (a "run") that is decoupled
+from the HTTP connection. Each event gets a monotonically increasing sequence
+number (sent as the SSE ``id:``) and is kept in a bounded per-run ring buffer.
+A client whose connection dropped reconnects with ``Last-Event-ID`` and gets
+the missed events replayed, then keeps tailing the same run, so the model
+and its tool calls are not invoked again.
+
+Events that fall out of the ring buffer are lost for replay unless
+``settings.stream_run_spill_dir`` is set, in which case they are appended to
+a per-run spill file. Spill files are written and read in a worker thread
+(evicted events are written in batches by one writer task per run), so the
+event loop never waits on disk. Finished runs are kept for
+``settings.stream_run_ttl_seconds`` and then purged by a periodic task.
+
+A run whose last subscriber disconnected is cancelled unless a client
+resumes it within ``settings.stream_disconnect_grace_seconds``, so closed
+tabs stop consuming LLM tokens and S/4HANA calls. The cancellation
+propagates into the service generator (and from there into the agent's
+model and tool calls). Cancelled runs are counted in
+``stream_runs_cancelled_total{reason=...}``; the output tokens they did not
+generate are estimated from the average answer length of completed runs
+(``stream_runs_tokens_saved_total``).
+"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from pathlib import Path
+from typing import AsyncGenerator, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.session_serializer import dumps_line, loads_line
+
+logger = logging.getLogger(__name__)
+
+SeqEvent = Tuple[int, dict]
+
+# Rough characters per token for estimating the tokens saved by cancelled runs
+_CHARS_PER_TOKEN = 4
+# How often finished runs are checked against STREAM_RUN_TTL_SECONDS
+_PURGE_INTERVAL_SECONDS = 30.0
+
+
+class StreamRun:
+    """One chat response: a producer task plus the buffer of its events."""
+
+    def __init__(self, run_id: str, user_id: str, buffer_size: int, spill_dir: Optional[Path] = None):
+        self.run_id = run_id
+        self.user_id = user_id
+        self.last_seq = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._buffer: Deque[SeqEvent] = deque(maxlen=max(1, buffer_size))
+        self._spill_path = spill_dir / f"{run_id}.jsonl" if spill_dir else None
+        # Evicted events not yet written to the spill file, and the task writing them
+        self._unspilled: List[SeqEvent] = []
+        self._spill_task: Optional[asyncio.Task] = None
+        # Held while the spill file is written or read, so events move to the file atomically for readers
+        self._spill_lock = asyncio.Lock()
+        self._changed = asyncio.Event()
+        self._gap_logged = False
+        self.subscribers = 0
+        self.cancel_reason: Optional[str] = None
+        self.text_chars = 0  # Answer text produced so far
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+
+    def wake(self):
+        """Wake all subscribers so they re-check the buffer and their stop signal."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _append(self, event: dict):
+        """Store an event under the next sequence number and wake the subscribers."""
+        self.last_seq += 1
+        if event["event"] == "text":
+            self.text_chars += len(event["data"])
+        if len(self._buffer) == self._buffer.maxlen and self._spill_path is not None:
+            self._unspilled.append(self._buffer[0])
+            if self._spill_task is None or self._spill_task.done():
+                self._spill_task = asyncio.create_task(self._spill(), name=f"stream-run-spill-{self.run_id}")
+        self._buffer.append((self.last_seq, event))
+        self.wake()
+
+    async def _spill(self):
+        """Write evicted events to the spill file in batches until none are left."""
+        try:
+            while self._unspilled:
+                async with self._spill_lock:
+                    batch, self._unspilled = self._unspilled, []
+                    await asyncio.to_thread(self._write_spill, batch)
+        except OSError as exc:
+            logger.warning(f"Stream run {self.run_id}: could not spill events: {exc}")
+
+    def _write_spill(self, batch: List[SeqEvent]):
+        """Append events to the spill file (runs in a worker thread)."""
+        self._spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self._spill_path, "ab") as f:
+            f.write(b"".join(dumps_line({"seq": seq, "event": event}) + b"\n" for seq, event in batch))
+
+    def _finish(self):
+        self.done = True
+        self.finished_at = time.monotonic()
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        self._changed.set()
+        metrics.inc("stream_runs_finished_total")
+
+    def cancel(self, reason: str):
+        """Cancel the producer task (no-op once the run is done)."""
+        if self.done or self.task is None or self.task.done():
+            return
+        self.cancel_reason = reason
+        logger.info(f"Cancelling stream run {self.run_id}: {reason}")
+        self.task.cancel()
+
+    def _cancel_if_abandoned(self):
+        self._abandon_timer = None
+        if self.subscribers == 0:
+            self.cancel("client_disconnected")
+
+    def _attach(self):
+        self.subscribers += 1
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+
+    def _detach(self):
+        """Forget a subscriber; start the grace period once the last one is gone."""
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.done and self._abandon_timer is None:
+            self._abandon_timer = asyncio.get_running_loop().call_later(
+                settings.stream_disconnect_grace_seconds, self._cancel_if_abandoned
+            )
+
+    async def produce(self, events: AsyncIterator[dict]):
+        """Consume the service's event stream into the buffer (runs as the run's task)."""
+        try:
+            async for event in events:
+                self._append(event)
+        except asyncio.CancelledError:
+            self._append({"event": "error", "data": "Response cancelled"})
+            self._append({"event": "end", "data": ""})
+            raise
+        except Exception as exc:
+            logger.error(f"Stream run {self.run_id} failed: {exc}", exc_info=True)
+            self._append({"event": "error", "data": str(exc)})
+            self._append({"event": "end", "data": ""})
+        finally:
+            self._finish()
+
+    def _read_spill(self, after_seq: int) -> List[SeqEvent]:
+        """Read spilled events with seq > after_seq (runs in a worker thread)."""
+        if self._spill_path is None or not self._spill_path.exists():
+            return []
+        events = []
+        with open(self._spill_path, "rb") as f:
+            for line in f:
+                record = loads_line(line)
+                if record["seq"] > after_seq:
+                    events.append((record["seq"], record["event"]))
+        return events
+
+    def _buffered_after(self, after_seq: int) -> List[SeqEvent]:
+        """Get buffered events with seq > after_seq, oldest first."""
+        # Subscribers usually tail the end of the buffer, so walk it from the right
+        recent: List[SeqEvent] = []
+        for item in reversed(self._buffer):
+            if item[0] <= after_seq:
+                break
+            recent.append(item)
+        recent.reverse()
+        return recent
+
+    async def _events_after(self, after_seq: int) -> List[SeqEvent]:
+        """Get buffered (and spilled) events with seq > after_seq, oldest first."""
+        if after_seq >= self.last_seq:
+            return []
+        recent = self._buffered_after(after_seq)
+        first_buffered = recent[0][0] if recent else self.last_seq + 1
+        if first_buffered == after_seq + 1:
+            return recent
+
+        # Behind the buffer: the missing events are in the spill file or still waiting to be written
+        async with self._spill_lock:
+            spilled = await asyncio.to_thread(self._read_spill, after_seq)
+            unspilled = [item for item in self._unspilled if item[0] > after_seq]
+            recent = self._buffered_after(after_seq)
+        events = spilled + unspilled + recent
+        first_buffered = recent[0][0] if recent else self.last_seq + 1
+        if len(spilled) + len(unspilled) < first_buffered - after_seq - 1 and not self._gap_logged:
+            self._gap_logged = True
+            logger.warning(f"Stream run {self.run_id}: events after {after_seq} are no longer buffered")
+        return events
+
+    async def subscribe(
+        self,
+        after_seq: int = 0,
+        stop: Optional[asyncio.Event] = None
+    ) -> AsyncGenerator[SeqEvent, None]:
+        """
+        Replay events after `after_seq`, then follow the run until it is done.
+
+        Args:
+            after_seq: Last sequence number the client already has
+            stop: Set (followed by `wake()`) to end the subscription early, e.g. when the client disconnected
+
+        Yields:
+            (sequence number, event) pairs
+        """
+        seq = after_seq
+        self._attach()
+        try:
+            while stop is None or not stop.is_set():
+                changed = self._changed
+                for item in await self._events_after(seq):
+                    seq = item[0]
+                    yield item
+                if self.done and seq >= self.last_seq:
+                    return
+                await changed.wait()
+        finally:
+            self._detach()
+
+    async def cleanup(self):
+        """Remove the spill file once pending spill writes are done."""
+        if self._spill_task is not None:
+            await asyncio.wait([self._spill_task])
+        if self._spill_path is not None:
+            await asyncio.to_thread(self._spill_path.unlink, missing_ok=True)
+
+
+class StreamRunManager:
+    """Registry of the runs of this worker process."""
+
+    def __init__(self):
+        self._runs: Dict[str, StreamRun] = {}
+        # Answer length of completed runs, for the tokens-saved estimate
+        self._completed_runs = 0
+        self._completed_chars = 0
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def start(self, user_id: str, events: AsyncIterator[dict]) -> StreamRun:
+        """
+        Start producing a response in the background.
+
+        Args:
+            user_id: Owner of the run (only they can resume it)
+            events: Service event stream to buffer
+
+        Returns:
+            The new run
+        """
+        if self._purge_task is None:
+            self._purge_task = asyncio.create_task(self._purge_periodically(), name="stream-run-purge")
+        spill_dir = Path(settings.stream_run_spill_dir) if settings.stream_run_spill_dir else None
+
+        run = StreamRun(uuid.uuid4().hex, user_id, settings.stream_run_buffer_events, spill_dir)
+        run.task = asyncio.create_task(run.produce(events), name=f"stream-run-{run.run_id}")
+        run.task.add_done_callback(lambda _: self._on_run_done(run))
+        self._runs[run.run_id] = run
+        metrics.inc("stream_runs_started_total")
+        return run
+
+    def get(self, run_id: str, user_id: str) -> Optional[StreamRun]:
+        """Get a run of the given user, or None if unknown, purged or owned by someone else."""
+        run = self._runs.get(run_id)
+        if run is None or run.user_id != user_id:
+            return None
+        return run
+
+    def _on_run_done(self, run: StreamRun):
+        """Count cancelled runs and estimate the output tokens they saved."""
+        if not run.task.cancelled():
+            self._completed_runs += 1
+            self._completed_chars += run.text_chars
+            return
+
+        reason = run.cancel_reason or "unknown"
+        metrics.inc("stream_runs_cancelled_total", reason=reason)
+        if self._completed_runs:
+            average_chars = self._completed_chars / self._completed_runs
+            saved_tokens = max(0.0, average_chars - run.text_chars) / _CHARS_PER_TOKEN
+            metrics.inc("stream_runs_tokens_saved_total", saved_tokens, reason=reason)
+
+    async def _purge(self):
+        """Drop runs that finished more than STREAM_RUN_TTL_SECONDS ago."""
+        cutoff = time.monotonic() - settings.stream_run_ttl_seconds
+        expired = [self._runs.pop(run_id) for run_id, run in list(self._runs.items()) if run.done and run.finished_at < cutoff]
+        await asyncio.gather(*(run.cleanup() for run in expired))
+
+    async def _purge_periodically(self):
+        """Purge expired runs every _PURGE_INTERVAL_SECONDS, also while no new runs are started."""
+        while True:
+            await asyncio.sleep(_PURGE_INTERVAL_SECONDS)
+            try:
+                await self._purge()
+            except OSError as exc:
+                logger.warning(f"Failed to purge stream runs: {exc}")
+
+    async def close(self):
+        """Stop purging and cancel all running producers (application shutdown)."""
+        if self._purge_task is not None:
+            self._purge_task.cancel()
+            await asyncio.gather(self._purge_task, return_exceptions=True)
+            self._purge_task = None
+        runs = list(self._runs.values())
+        for run in runs:
+            run.cancel("shutdown")
+        await asyncio.gather(*(run.task for run in runs if run.task is not None), return_exceptions=True)
+        await asyncio.gather(*(run.cleanup() for run in runs))
+        self._runs.clear()
+
+
+# Global instance
+_manager: Optional[StreamRunManager] = None
+
+
+def get_stream_runs() -> StreamRunManager:
+    """
+    Get or create the global stream run registry.
+
+    Returns:
+        StreamRunManager instance
+    """
+    global _manager
+    if _manager is None:
+        _manager = StreamRunManager()
+    return _manager
+
+
+async def close_stream_runs() -> None:
+    """
+    Cancel running streams.
+
+    Should be called on application shutdown.
+    """
+    global _manager
+    if _manager is not None:
+        await _manager.close()
+        _manager = None
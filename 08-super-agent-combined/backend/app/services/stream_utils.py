@@ -0,0 +1,255 @@
+"""
+Helpers for post-processing streams of chat events and encoding them as SSE.
+
+Services yield events as dictionaries with 'event' and 'data' keys; the
+helpers here wrap such async generators before they are written as SSE.
+Each SSE frame is built as one string, so it goes out in a single ASGI send.
+"""
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Any, AsyncGenerator, AsyncIterator, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# How long closing a stream waits for its cancelled pump task to finish
+_PUMP_CLOSE_TIMEOUT_SECONDS = 5.0
+
+# Line terminators recognized by the SSE spec
+_LINE_BREAK = re.compile(r"\r\n|\r|\n")
+
+# Marks the end of the source stream in a pump queue
+_END = object()
+
+
+class _PumpError:
+    """Carries an exception raised by the source stream through a pump queue."""
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+async def _pump(source: AsyncIterator[dict], queue: asyncio.Queue) -> None:
+    """Move events from the source stream into a queue, ending with _END."""
+    try:
+        async for event in source:
+            await queue.put(event)
+    except asyncio.CancelledError:
+        # The reader is gone: waiting for space in a full queue would never return
+        try:
+            queue.put_nowait(_END)
+        except asyncio.QueueFull:
+            pass
+        raise
+    except Exception as exc:
+        await queue.put(_PumpError(exc))
+    await queue.put(_END)
+
+
+async def _close_pump(task: asyncio.Task, source: AsyncIterator[dict]) -> None:
+    """Stop a pump task and close its source stream."""
+    if not task.done():
+        task.cancel()
+        # asyncio.wait neither raises the task's CancelledError nor swallows our own
+        await asyncio.wait([task], timeout=_PUMP_CLOSE_TIMEOUT_SECONDS)
+        if not task.done():
+            # The source does not react to cancellation; leave it to finish in the background
+            logger.warning(f"Stream pump did not stop within {_PUMP_CLOSE_TIMEOUT_SECONDS:.0f}s of cancellation")
+            return
+    aclose = getattr(source, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+async def coalesce_text_events(
+    events: AsyncIterator[dict],
+    window_ms: int = 15,
+    max_bytes: int = 1024
+) -> AsyncGenerator[dict, None]:
+    """
+    Merge consecutive 'text' events into fewer, larger ones.
+
+    Text is buffered until `window_ms` have passed since the first buffered
+    chunk or the buffer reaches `max_bytes`; any other event flushes the buffer
+    first, so event order is preserved. The source is read by one background
+    task, so a pending flush is sent on time even while the source is idle
+    (e.g. while the model is waiting on a tool call).
+
+    Args:
+        events: Source event stream
+        window_ms: Maximum time text is held back, in milliseconds
+        max_bytes: Buffer size (UTF-8 bytes) that triggers an immediate flush
+
+    Yields:
+        Events with consecutive text chunks merged
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+    pump = asyncio.create_task(_pump(events, queue))
+    window = window_ms / 1000
+
+    buffer: list[str] = []
+    buffer_bytes = 0
+    deadline = 0.0
+    try:
+        while True:
+            item: Any
+            if buffer:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout) if timeout > 0 else None
+                except asyncio.TimeoutError:
+                    item = None
+                if item is None:
+                    # Window elapsed
+                    yield {"event": "text", "data": "".join(buffer)}
+                    buffer, buffer_bytes = [], 0
+                    continue
+            else:
+                item = await queue.get()
+
+            if isinstance(item, dict) and item.get("event") == "text" and isinstance(item.get("data"), str):
+                if not buffer:
+                    deadline = time.monotonic() + window
+                buffer.append(item["data"])
+                buffer_bytes += len(item["data"].encode("utf-8"))
+                if buffer_bytes >= max_bytes:
+                    yield {"event": "text", "data": "".join(buffer)}
+                    buffer, buffer_bytes = [], 0
+                continue
+
+            if buffer:
+                yield {"event": "text", "data": "".join(buffer)}
+                buffer, buffer_bytes = [], 0
+            if item is _END:
+                break
+            if isinstance(item, _PumpError):
+                raise item.exc
+            yield item
+    finally:
+        await _close_pump(pump, events)
+
+
+async def with_heartbeat(
+    items: AsyncIterator[Any],
+    interval: float,
+    heartbeat: Callable[[], Any]
+) -> AsyncGenerator[Any, None]:
+    """
+    Yield `heartbeat()` whenever the source has been idle for `interval` seconds.
+
+    The source is read by one background task for the whole stream; each wait
+    for its next item is raced against an asyncio.timeout, which only
+    reschedules a timer, so no task is spawned per item.
+
+    Args:
+        items: Source stream (events or encoded SSE frames)
+        interval: Idle time in seconds after which a heartbeat is sent
+        heartbeat: Builds the item to yield when idle
+
+    Yields:
+        The source's items, with heartbeats in the idle gaps
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+    pump = asyncio.create_task(_pump(items, queue))
+    try:
+        while True:
+            try:
+                async with asyncio.timeout(interval):
+                    item = await queue.get()
+            except TimeoutError:
+                yield heartbeat()
+                continue
+
+            if item is _END:
+                break
+            if isinstance(item, _PumpError):
+                raise item.exc
+            yield item
+    finally:
+        await _close_pump(pump, items)
+
+
+def encode_sse(
+    event: Optional[str] = None,
+    data: str = "",
+    event_id: Optional[str | int] = None,
+    retry: Optional[int] = None
+) -> str:
+    """
+    Encode one complete SSE frame.
+
+    Args:
+        event: Event type (omitted for the default "message" type)
+        data: Payload; every line becomes its own data: field
+        event_id: Value of the id: field (what the client sends back as Last-Event-ID)
+        retry: Reconnection delay for the client, in milliseconds
+
+    Returns:
+        Frame including the terminating blank line
+    """
+    parts = []
+    if event_id is not None:
+        parts.append(f"id: {event_id}\n")
+    if event:
+        parts.append(f"event: {event}\n")
+    if retry is not None:
+        parts.append(f"retry: {retry}\n")
+    for line in _LINE_BREAK.split(data):
+        parts.append(f"data: {line}\n")
+    parts.append("\n")
+    return "".join(parts)
+
+
+def encode_sse_comment(text: str = "") -> str:
+    """Encode an SSE comment frame (ignored by clients, keeps idle connections open)."""
+    return "".join(f": {line}\n" for line in _LINE_BREAK.split(text)) + "\n"
+
+
+def event_to_sse(event: dict, event_id: Optional[str | int] = None) -> str:
+    """
+    Encode a service event as an SSE frame.
+
+    Dict data (tables, tool events) is sent as JSON; text chunks stay plain strings.
+    """
+    data = event["data"]
+    if isinstance(data, dict):
+        data = json.dumps(data)
+    elif not isinstance(data, str):
+        data = str(data)
+    return encode_sse(event["event"], data, event_id=event_id)
+
+
+async def batch_frames(frames: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """
+    Join SSE frames that are ready in the same event loop tick into one write.
+
+    After each frame the producer gets one tick to queue more, then everything
+    queued is sent together; a frame is never held back waiting for the next.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=256)
+    pump = asyncio.create_task(_pump(frames, queue))
+    try:
+        while True:
+            item = await queue.get()
+            if item is _END:
+                break
+            if isinstance(item, _PumpError):
+                raise item.exc
+            batch = [item]
+            await asyncio.sleep(0)
+            done = False
+            while not queue.empty():
+                item = queue.get_nowait()
+                if item is _END or isinstance(item, _PumpError):
+                    done = True
+                    break
+                batch.append(item)
+            yield "".join(batch)
+            if done:
+                if isinstance(item, _PumpError):
+                    raise item.exc
+                break
+    finally:
+        await _close_pump(pump, frames)
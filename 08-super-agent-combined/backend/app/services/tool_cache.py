@@ -0,0 +1,201 @@
+"""
+TTL cache for MCP tool results.
+
+The agent is told to fetch API documentation and ``$metadata`` whenever it is
+unsure, so the same slow S/4HANA round-trips repeat across sessions. Results
+are cached by user, tool name and canonicalized arguments with per-tool TTLs:
+
+- ``TOOL_CACHE_TTLS`` maps tool name patterns (fnmatch) to seconds, first
+  match wins; ``0`` disables caching (memory tools are never cached).
+- Calls whose arguments mention ``$metadata`` use ``TOOL_CACHE_METADATA_TTL_SECONDS``.
+- Everything else uses ``TOOL_CACHE_DEFAULT_TTL_SECONDS``.
+
+Results are only shared between users for tools matching ``TOOL_CACHE_GLOBAL_TOOLS``
+(e.g. API documentation); other tools may return data the user is authorized
+for, so their entries are scoped to the user in ``tool_cache_scope`` and not
+cached at all when no user is set.
+
+Failed calls (``isError`` results or exceptions) are never cached, and
+concurrent identical calls share one request to the server.
+
+Metrics: ``tool_cache_hits_total{tool=...}``, ``tool_cache_misses_total{tool=...}``
+and the ``tool_cache_hit_ratio{tool=...}`` gauge.
+"""
+import asyncio
+import fnmatch
+import json
+import logging
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from mcp import types
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tools that must never be cached, whatever TOOL_CACHE_TTLS says
+_NEVER_CACHE = ("memory_*",)
+
+# User the current tool calls run for; set per request by the agent service
+tool_cache_scope: ContextVar[Optional[str]] = ContextVar("tool_cache_scope", default=None)
+
+
+def canonical_args(arguments: Optional[dict]) -> str:
+    """
+    Serialize tool arguments so equivalent calls get the same key.
+
+    Keys are sorted, None values dropped and surrounding whitespace of strings removed.
+    """
+    def normalize(value: Any) -> Any:
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items() if item is not None}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    return json.dumps(normalize(arguments or {}), sort_keys=True, separators=(",", ":"), default=str)
+
+
+def parse_patterns(spec: str) -> List[str]:
+    """Parse a comma-separated list of fnmatch patterns."""
+    return [pattern.strip() for pattern in spec.split(",") if pattern.strip()]
+
+
+def parse_ttls(spec: str) -> List[Tuple[str, float]]:
+    """Parse "pattern=seconds,..." into (pattern, seconds) pairs, keeping their order."""
+    ttls = []
+    for item in spec.split(","):
+        pattern, _, seconds = item.partition("=")
+        if pattern.strip() and seconds.strip():
+            ttls.append((pattern.strip(), float(seconds)))
+    return ttls
+
+
+class ToolResultCache:
+    """In-process LRU of successful tool results with per-tool TTLs."""
+
+    def __init__(
+        self,
+        ttls: List[Tuple[str, float]],
+        default_ttl: float,
+        metadata_ttl: float,
+        max_entries: int = 512,
+        global_tools: Optional[List[str]] = None
+    ):
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.metadata_ttl = metadata_ttl
+        self.max_entries = max_entries
+        self.global_tools = global_tools or []
+        # Keyed by (user scope, tool name, canonical arguments); the scope is "" for global tools
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, types.CallToolResult]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._counts: Dict[str, List[int]] = {}
+
+    @classmethod
+    def from_settings(cls) -> "ToolResultCache":
+        """Create a cache configured by the TOOL_CACHE_* settings."""
+        return cls(
+            ttls=parse_ttls(settings.tool_cache_ttls),
+            default_ttl=settings.tool_cache_default_ttl_seconds,
+            metadata_ttl=settings.tool_cache_metadata_ttl_seconds,
+            max_entries=settings.tool_cache_max_entries,
+            global_tools=parse_patterns(settings.tool_cache_global_tools),
+        )
+
+    def ttl_for(self, name: str, args_key: str) -> float:
+        """Get the TTL in seconds for a call (0 = do not cache)."""
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in _NEVER_CACHE):
+            return 0.0
+        for pattern, ttl in self.ttls:
+            if fnmatch.fnmatchcase(name, pattern):
+                return ttl
+        if "$metadata" in args_key:
+            return self.metadata_ttl
+        return self.default_ttl
+
+    def scope_for(self, name: str) -> Optional[str]:
+        """Get the cache scope of a call: "" for global tools, else the current user (None if unknown)."""
+        if any(fnmatch.fnmatchcase(name, pattern) for pattern in self.global_tools):
+            return ""
+        return tool_cache_scope.get()
+
+    def clear(self):
+        """Drop all cached results (e.g. after the server's tool list changed)."""
+        self._entries.clear()
+
+    def _record(self, name: str, hit: bool):
+        counts = self._counts.setdefault(name, [0, 0])
+        counts[0 if hit else 1] += 1
+        metrics.inc("tool_cache_hits_total" if hit else "tool_cache_misses_total", tool=name)
+        metrics.set_gauge("tool_cache_hit_ratio", counts[0] / (counts[0] + counts[1]), tool=name)
+
+    async def get_or_call(
+        self,
+        name: str,
+        arguments: Optional[dict],
+        call: Callable[[], Awaitable[types.CallToolResult]]
+    ) -> types.CallToolResult:
+        """
+        Return a cached result for the call, or run `call` and cache its result.
+
+        Args:
+            name: Tool name
+            arguments: Tool arguments
+            call: Performs the actual tool call
+
+        Returns:
+            Tool result
+        """
+        args_key = canonical_args(arguments)
+        ttl = self.ttl_for(name, args_key)
+        scope = self.scope_for(name)
+        if ttl <= 0 or scope is None:
+            return await call()
+
+        key = (scope, name, args_key)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, result = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self._record(name, hit=True)
+                return result
+            del self._entries[key]
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # Share the running call; if it fails, make our own
+            await asyncio.wait([inflight])
+            if not inflight.cancelled() and inflight.exception() is None:
+                self._record(name, hit=True)
+                return inflight.result()
+
+        self._record(name, hit=False)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            # Retrieved here so an unawaited future does not log "exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if not result.isError:
+                self._entries[key] = (time.monotonic() + ttl, result)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return result
+        finally:
+            self._inflight.pop(key, None)
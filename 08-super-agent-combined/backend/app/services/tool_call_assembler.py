@@ -0,0 +1,188 @@
+"""
+Incremental assembly of streamed tool calls into SSE tool events.
+
+Models stream a tool call as ``tool_call_chunks``: the first chunk carries the
+call's id and name, later ones only the call's ``index`` and a fragment of
+its JSON arguments. ToolCallAssembler accumulates the fragments per message
+and index and emits ``tool_start`` once with the complete arguments (when
+they parse as JSON, at the end of the model message, or at the latest when
+the tool result arrives), optionally ``tool_args_delta`` per fragment, and
+``tool_end`` when the matching ToolMessage is streamed.
+
+Messages are routed by a type dispatch table built once per message class,
+so the per-chunk cost is one dict lookup.
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingCall:
+    """A tool call whose arguments are still streaming."""
+    tool_id: Optional[str]
+    name: Optional[str]
+    args_text: str = ""
+    args: Optional[dict] = None
+    started: bool = False
+    deltas: List[str] = field(default_factory=list)  # Fragments received before the id was known
+
+
+class ToolCallAssembler:
+    """Turn streamed agent messages into tool_start / tool_args_delta / tool_end events."""
+
+    def __init__(self, emit_arg_deltas: bool = False):
+        self.emit_arg_deltas = emit_arg_deltas
+        # Calls still streaming, keyed by (message id, tool call index)
+        self._pending: Dict[Tuple[Optional[str], int], _PendingCall] = {}
+        # Started calls waiting for their result
+        self._active: Dict[str, str] = {}
+        self._started_ids: set[str] = set()
+        self._handlers: Dict[type, Optional[Callable[[Any], List[dict]]]] = {
+            AIMessageChunk: self._on_ai_chunk,
+            AIMessage: self._on_ai_message,
+            ToolMessage: self._on_tool_message,
+        }
+
+    def _handler_for(self, message_type: type) -> Optional[Callable[[Any], List[dict]]]:
+        """Resolve (and remember) the handler of a message class, following its base classes."""
+        for base in message_type.__mro__:
+            if base in self._handlers:
+                handler = self._handlers[base]
+                break
+        else:
+            handler = None
+        self._handlers[message_type] = handler
+        return handler
+
+    def feed(self, message: Any) -> List[dict]:
+        """
+        Process one streamed message.
+
+        Args:
+            message: Message from the agent's "messages" stream
+
+        Returns:
+            Tool events to send, in order
+        """
+        message_type = type(message)
+        handler = self._handlers[message_type] if message_type in self._handlers else self._handler_for(message_type)
+        return handler(message) if handler is not None else []
+
+    def finish(self) -> List[dict]:
+        """Emit tool_start for calls whose arguments never completed (e.g. the stream was cut short)."""
+        events = []
+        for pending in self._pending.values():
+            events.extend(self._start(pending))
+        self._pending.clear()
+        return events
+
+    def _start(self, pending: _PendingCall) -> List[dict]:
+        """Emit tool_start for a call once."""
+        if pending.started or not pending.tool_id or not pending.name or pending.tool_id in self._started_ids:
+            return []
+        pending.started = True
+        self._started_ids.add(pending.tool_id)
+        self._active[pending.tool_id] = pending.name
+        logger.info(f"Tool call started: {pending.name} (id={pending.tool_id})")
+        return [{
+            "event": "tool_start",
+            "data": {
+                "tool_id": pending.tool_id,
+                "tool_name": pending.name,
+                "args": pending.args,
+            }
+        }]
+
+    def _delta_events(self, pending: _PendingCall, fragment: str) -> List[dict]:
+        """Emit tool_args_delta for a fragment (buffered until the call's id is known)."""
+        if not self.emit_arg_deltas or not fragment:
+            return []
+        if not pending.tool_id:
+            pending.deltas.append(fragment)
+            return []
+        fragments, pending.deltas = pending.deltas + [fragment], []
+        return [
+            {"event": "tool_args_delta", "data": {"tool_id": pending.tool_id, "delta": part}}
+            for part in fragments
+        ]
+
+    def _on_ai_chunk(self, chunk: AIMessageChunk) -> List[dict]:
+        events: List[dict] = []
+        for tool_chunk in chunk.tool_call_chunks:
+            index = tool_chunk.get("index") or 0
+            key = (chunk.id, index)
+            tool_id = tool_chunk.get("id")
+            pending = self._pending.get(key)
+            if pending is None or (tool_id and pending.tool_id and tool_id != pending.tool_id):
+                if pending is not None:
+                    events.extend(self._start(pending))
+                pending = self._pending[key] = _PendingCall(tool_id=tool_id, name=tool_chunk.get("name"))
+            else:
+                pending.tool_id = pending.tool_id or tool_id
+                pending.name = pending.name or tool_chunk.get("name")
+
+            fragment = tool_chunk.get("args") or ""
+            events.extend(self._delta_events(pending, fragment))
+            if fragment and not pending.started:
+                pending.args_text += fragment
+                # Arguments are a JSON object, so they can only be complete after a closing brace
+                if "}" not in fragment:
+                    continue
+                try:
+                    args = json.loads(pending.args_text)
+                except ValueError:
+                    continue
+                if isinstance(args, dict):
+                    pending.args = args
+                    events.extend(self._start(pending))
+
+        if chunk.chunk_position == "last":
+            # End of the model message: no more fragments will arrive
+            events.extend(self._flush_message(chunk.id))
+        return events
+
+    def _flush_message(self, message_id: Optional[str]) -> List[dict]:
+        """Start the calls of a finished message, with whatever arguments arrived."""
+        events = []
+        for key in [key for key in self._pending if key[0] == message_id]:
+            events.extend(self._start(self._pending.pop(key)))
+        return events
+
+    def _on_ai_message(self, message: AIMessage) -> List[dict]:
+        # Complete messages (non-streaming models) carry parsed tool calls
+        events = self._flush_message(message.id)
+        for tool_call in message.tool_calls:
+            events.extend(self._start(_PendingCall(
+                tool_id=tool_call.get("id"),
+                name=tool_call.get("name"),
+                args=tool_call.get("args"),
+            )))
+        return events
+
+    def _on_tool_message(self, message: ToolMessage) -> List[dict]:
+        events: List[dict] = []
+        tool_id = message.tool_call_id
+        if tool_id not in self._active:
+            # Result of a call whose start is still pending
+            for key, pending in list(self._pending.items()):
+                if pending.tool_id == tool_id:
+                    events.extend(self._start(self._pending.pop(key)))
+        if self._active.pop(tool_id, None) is None:
+            return events
+
+        logger.info(f"Tool call completed: {tool_id}")
+        events.append({
+            "event": "tool_end",
+            "data": {
+                "tool_id": tool_id,
+                "success": message.status != "error",
+            }
+        })
+        return events
+
@@ -0,0 +1,118 @@
+"""
+Application warm-up.
+
+Initializes the lazily created clients (chat model, MCP tools, agent graph,
+title and audio clients) at startup instead of on the first user request.
+Independent components are initialized concurrently; blocking initializers
+run in worker threads. ``/health`` reports the service as ready only once
+warm-up has finished, so Kubernetes can gate traffic on it.
+
+A failing component does not block readiness: it is logged, reported in
+``/health`` and initialized lazily again on first use.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.agent_checkpointer import get_checkpointer
+from app.services.audio_transcription import _get_audio_client
+from app.services.deepagent_service import _get_agent, _get_model
+from app.services.llm_service import _get_llm
+from app.services.mcp_pool import get_mcp_pool
+from app.services.service_factory import get_service_type
+from app.services.title_generation import _get_summarization_llm
+
+logger = logging.getLogger(__name__)
+
+# Warm-up state reported by /health
+_ready = False
+_components: Dict[str, Dict[str, Any]] = {}
+
+
+def is_ready() -> bool:
+    """Check whether warm-up has finished (or is disabled)."""
+    return _ready
+
+
+def warmup_status() -> Dict[str, Dict[str, Any]]:
+    """Get the outcome and duration of each warmed-up component."""
+    return {name: dict(status) for name, status in _components.items()}
+
+
+def mark_ready() -> None:
+    """Report the service as ready without warming up (WARMUP_ENABLED=false)."""
+    global _ready
+    _ready = True
+
+
+async def _run_component(name: str, init: Callable[[], Awaitable[Any]]) -> None:
+    """Run one initializer with a timeout and record its duration and outcome."""
+    _components[name] = {"status": "running"}
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(init(), settings.warmup_timeout_seconds)
+        status = {"status": "ok"}
+    except asyncio.TimeoutError:
+        status = {"status": "error", "error": f"timed out after {settings.warmup_timeout_seconds:.0f}s"}
+    except Exception as exc:
+        status = {"status": "error", "error": str(exc)}
+    elapsed = time.perf_counter() - start
+
+    _components[name] = {**status, "seconds": round(elapsed, 3)}
+    metrics.observe("warmup_seconds", elapsed, component=name)
+    if status["status"] == "ok":
+        logger.info(f"Warm-up: {name} ready in {elapsed * 1000:.0f} ms")
+    else:
+        logger.warning(f"Warm-up: {name} failed after {elapsed * 1000:.0f} ms: {status['error']}")
+
+
+async def _load_mcp_tools() -> None:
+    """Load the MCP tool list (the pool only logs failures, so check the result)."""
+    if not await get_mcp_pool().get_tools():
+        raise ConnectionError(f"no tools loaded from {settings.mcp_server_url}")
+
+
+def _components_for_service() -> Dict[str, Callable[[], Awaitable[Any]]]:
+    """Select the initializers needed by the configured service."""
+    service_type = get_service_type()
+    if service_type == "mock":
+        return {}
+
+    components: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "title_llm": lambda: asyncio.to_thread(_get_summarization_llm),
+        "audio_client": lambda: asyncio.to_thread(_get_audio_client),
+    }
+    if service_type == "agentic":
+        components["agent_model"] = lambda: asyncio.to_thread(_get_model)
+        components["mcp_tools"] = _load_mcp_tools
+        components["agent_checkpointer"] = get_checkpointer
+    else:
+        components["llm"] = lambda: asyncio.to_thread(_get_llm)
+    return components
+
+
+async def run_warmup() -> None:
+    """
+    Initialize all components concurrently, then compile the agent graph.
+
+    Marks the service as ready when done, whether or not every component succeeded.
+    """
+    global _ready
+
+    start = time.perf_counter()
+    components = _components_for_service()
+    logger.info(f"Warm-up started: {', '.join(components) or 'nothing to initialize'}")
+    try:
+        await asyncio.gather(*(_run_component(name, init) for name, init in components.items()))
+        # Needs the model, tools and checkpointer above, so it only compiles the graph here
+        if get_service_type() == "agentic":
+            await _run_component("agent_graph", _get_agent)
+    finally:
+        _ready = True
+
+    elapsed = time.perf_counter() - start
+    metrics.observe("warmup_seconds", elapsed, component="total")
+    logger.info(f"Warm-up finished in {elapsed * 1000:.0f} ms")
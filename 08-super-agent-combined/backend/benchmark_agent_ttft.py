@@ -0,0 +1,106 @@
+"""
+Benchmark for DeepAgent time-to-first-token with a cold and a cached agent graph.
+
+Runs generate_deepagent_response against an instant fake chat model and a
+set of synthetic tools (standing in for the MCP server's), so the measured
+time is the service's own overhead before the first text event. "cold"
+clears the compiled graph cache before every request, which is what every
+request paid before graphs were cached; "cached" reuses the graph compiled
+by warm-up.
+
+Usage:
+    python benchmark_agent_ttft.py [--requests 20] [--tools 25]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from typing import Any, List, Optional
+
+# Add backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from langchain_core.language_models.chat_models import BaseChatModel  # noqa: E402
+from langchain_core.messages import AIMessage, BaseMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+from langchain_core.tools import BaseTool, StructuredTool  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services import deepagent_service  # noqa: E402
+
+
+class InstantChatModel(BaseChatModel):
+    """Fake chat model that answers immediately without calling tools."""
+
+    @property
+    def _llm_type(self) -> str:
+        return "instant"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Hello!"))])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "InstantChatModel":
+        return self
+
+
+def build_tools(count: int) -> List[BaseTool]:
+    """Create tools with argument schemas similar to the MCP server's."""
+    def make(i: int) -> BaseTool:
+        def query(entity: str, filter: str = "", top: int = 10) -> str:
+            return f"result {i}"
+        return StructuredTool.from_function(query, name=f"tool_{i}", description=f"Query entity set {i}.")
+    return [make(i) for i in range(count)]
+
+
+class StaticToolPool:
+    """Stands in for the MCP connection pool with a fixed tool list."""
+
+    def __init__(self, tools: List[BaseTool]):
+        self.tools = tools
+
+    async def get_tools(self) -> List[BaseTool]:
+        return self.tools
+
+
+async def time_to_first_token() -> float:
+    """Time one request until its first text event, in milliseconds."""
+    start = time.perf_counter()
+    ttft = None
+    async for event in deepagent_service.generate_deepagent_response("Hi there", user_id="benchmark-user"):
+        if event["event"] == "error":
+            raise RuntimeError(event["data"])
+        if event["event"] == "text" and ttft is None:
+            ttft = (time.perf_counter() - start) * 1000
+    return ttft
+
+
+async def run(requests: int, tool_count: int):
+    settings.agent_checkpointer = "memory"
+    model = InstantChatModel()
+    pool = StaticToolPool(build_tools(tool_count))
+    deepagent_service._get_model = lambda: model
+    deepagent_service.get_mcp_pool = lambda: pool
+
+    # Warm-up: first build plus lazy imports, as done at application startup
+    await time_to_first_token()
+
+    print(f"{requests} requests, {tool_count} tools, instant fake model")
+    print(f"{'agent graph':<12}{'mean (ms)':>11}{'p50 (ms)':>10}{'max (ms)':>10}")
+    for name, cold in (("cold", True), ("cached", False)):
+        samples = []
+        for _ in range(requests):
+            if cold:
+                deepagent_service._agent_cache.clear()
+            samples.append(await time_to_first_token())
+        print(f"{name:<12}{statistics.mean(samples):>11.1f}{statistics.median(samples):>10.1f}{max(samples):>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--tools", type=int, default=25)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.tools))
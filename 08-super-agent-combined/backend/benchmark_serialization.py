@@ -0,0 +1,83 @@
+"""
+Micro-benchmark for session snapshot serialization formats.
+
+Builds a synthetic chat session with tables and attachment references and
+measures serialize/parse throughput (including Pydantic validation) for every
+installed format in app.services.session_serializer.
+
+Usage:
+    python benchmark_serialization.py [--messages 200] [--rows 50] [--iterations 200]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+# Add backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from app.models.schemas import ChatAttachment, ChatMessage, ChatSession, TableColumn, TableData  # noqa: E402
+from app.services.session_serializer import decode_snapshot, encode_snapshot, get_serializer  # noqa: E402
+
+
+def build_session(message_count: int, table_rows: int) -> ChatSession:
+    """Create a session resembling real history: text, tables and image references."""
+    messages = []
+    for i in range(message_count):
+        msg = ChatMessage(
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"Message {i}: " + "lorem ipsum dolor sit amet " * 20,
+            timestamp=datetime.utcnow(),
+        )
+        if i % 2 == 1 and i % 5 == 1:
+            msg.tables = [TableData(
+                columns=[TableColumn(header=f"Column {c}", accessor=f"col{c}") for c in range(6)],
+                rows=[{f"col{c}": f"value {r}-{c}" if c % 2 else r * c for c in range(6)} for r in range(table_rows)],
+            )]
+        if i % 2 == 0 and i % 7 == 0:
+            msg.attachments = [ChatAttachment(
+                id=f"att-{i}", name="chart.png", mime_type="image/png", size=123456, hash="ab" * 32
+            )]
+        messages.append(msg)
+
+    now = datetime.utcnow()
+    return ChatSession(
+        session_id="benchmark", title="Benchmark", messages=messages,
+        created_at=now, updated_at=now, user_id="benchmark-user",
+    )
+
+
+def run(message_count: int, table_rows: int, iterations: int):
+    session = build_session(message_count, table_rows)
+    data = session.model_dump(mode="json", exclude_none=True)
+
+    print(f"Session: {message_count} messages, {table_rows} table rows, {iterations} iterations")
+    print(f"{'format':<10}{'size (KB)':>12}{'serialize/s':>14}{'parse/s':>12}")
+    for name in ("json", "orjson", "msgpack"):
+        serializer = get_serializer(name)
+        if serializer.name != name:
+            print(f"{name:<10}{'not installed':>12}")
+            continue
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            raw = encode_snapshot(data, serializer)
+        serialize_rate = iterations / (time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            ChatSession.model_validate(decode_snapshot(raw)[0])
+        parse_rate = iterations / (time.perf_counter() - start)
+
+        print(f"{name:<10}{len(raw) / 1024:>12.1f}{serialize_rate:>14.1f}{parse_rate:>12.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    run(args.messages, args.rows, args.iterations)
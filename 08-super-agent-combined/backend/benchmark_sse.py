@@ -0,0 +1,89 @@
+"""
+Benchmark for SSE frame encoding of /api/chat-stream.
+
+Records the mock service's events once (including its table response) and
+replays them without delay through a StreamingResponse, counting the ASGI
+body sends (one transport write each) per response. Compares the former
+per-line encoding with single-frame encoding and per-tick batching.
+
+Usage:
+    python benchmark_sse.py [--responses 500] [--message "show me a table"]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncGenerator, Callable
+
+from fastapi.responses import StreamingResponse
+
+# Add backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from app.services.mock_service import generate_mock_response  # noqa: E402
+from app.services.stream_utils import batch_frames, event_to_sse  # noqa: E402
+
+
+async def legacy_frames(events: list[dict]) -> AsyncGenerator[str, None]:
+    """The former encoding: event line, each data line and the terminator as separate strings."""
+    for event in events:
+        data = event["data"]
+        data = json.dumps(data) if isinstance(data, dict) else str(data)
+        yield f"event: {event['event']}\n"
+        for line in data.split("\n"):
+            yield f"data: {line}\n"
+        yield "\n"
+
+
+async def frame_per_event(events: list[dict]) -> AsyncGenerator[str, None]:
+    """One string per SSE frame."""
+    for event in events:
+        yield event_to_sse(event)
+
+
+async def measure(factory: Callable[[], AsyncGenerator[str, None]], responses: int) -> tuple[float, float, int]:
+    """Stream `responses` responses through StreamingResponse; return (seconds, sends per response, bytes)."""
+    sends = 0
+    size = 0
+
+    async def receive():
+        await asyncio.sleep(3600)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal sends, size
+        if message["type"] == "http.response.body" and message.get("body"):
+            sends += 1
+            size += len(message["body"])
+
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}, "method": "POST", "path": "/api/chat-stream", "headers": []}
+    start = time.perf_counter()
+    for _ in range(responses):
+        await StreamingResponse(factory(), media_type="text/event-stream")(scope, receive, send)
+    return time.perf_counter() - start, sends / responses, size // responses
+
+
+async def run(responses: int, message: str):
+    events = [event async for event in generate_mock_response(message)]
+    print(f"Mock response for {message!r}: {len(events)} events, replayed {responses} times without delay")
+    print(f"{'encoding':<24}{'events/s':>12}{'sends/response':>16}{'bytes':>8}")
+
+    scenarios = [
+        ("per line (before)", lambda: legacy_frames(events)),
+        ("one frame per event", lambda: frame_per_event(events)),
+        ("batched per tick", lambda: batch_frames(frame_per_event(events))),
+    ]
+    for name, factory in scenarios:
+        seconds, sends, size = await measure(factory, responses)
+        print(f"{name:<24}{len(events) * responses / seconds:>12.0f}{sends:>16.1f}{size:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--responses", type=int, default=500)
+    parser.add_argument("--message", default="show me a table")
+    args = parser.parse_args()
+    asyncio.run(run(args.responses, args.message))
@@ -0,0 +1,128 @@
+"""
+Benchmark for event-loop stalls caused by session history writes.
+
+Simulates an SSE stream that sends a token every `--tick-ms` while other
+requests write chat history to the same process, once with the blocking
+storage methods called from the event loop (as the endpoints did before the
+async API) and once with their ``a``-prefixed variants. Reports how late the
+stream's ticks were (stream latency jitter) and the write throughput.
+
+Usage:
+    python benchmark_storage_io.py [--backend json] [--writers 8] [--writes 50] [--messages 200] [--tick-ms 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from app.core.config import settings  # noqa: E402
+from app.models.schemas import ChatMessage  # noqa: E402
+from app.services.session_storage import SessionStorageBackend, create_storage  # noqa: E402
+
+
+def build_message(i: int) -> ChatMessage:
+    """Create a history message of realistic length."""
+    return ChatMessage(
+        role="user" if i % 2 == 0 else "assistant",
+        content=f"Message {i}: " + "lorem ipsum dolor sit amet " * 20,
+        timestamp=datetime.utcnow(),
+    )
+
+
+def create_sessions(storage: SessionStorageBackend, count: int, messages: int) -> list[tuple[str, str]]:
+    """Create one session with `messages` messages per writer; return (user_id, session_id) pairs."""
+    sessions = []
+    for w in range(count):
+        user_id = f"benchmark-user-{w}"
+        session = storage.create_session(user_id, title="Benchmark")
+        session.messages = [build_message(i) for i in range(messages)]
+        storage.update_session(user_id, session)
+        sessions.append((user_id, session.session_id))
+    return sessions
+
+
+async def stream(tick_ms: float, stop: asyncio.Event) -> list[float]:
+    """Tick like an SSE stream sending tokens; return how late each tick was, in ms."""
+    lateness = []
+    interval = tick_ms / 1000
+    expected = time.perf_counter() + interval
+    while not stop.is_set():
+        await asyncio.sleep(max(0.0, expected - time.perf_counter()))
+        now = time.perf_counter()
+        lateness.append((now - expected) * 1000)
+        expected = now + interval
+    return lateness
+
+
+async def writer(storage: SessionStorageBackend, user_id: str, session_id: str, writes: int, use_async: bool):
+    """Append messages and rewrite the session's metadata, like the chat history endpoints."""
+    for i in range(writes):
+        message = build_message(i)
+        if use_async:
+            await storage.aadd_message(user_id, session_id, message)
+            await storage.aupdate_session_metadata(user_id, session_id, greeted=True)
+            await storage.aget_session(user_id, session_id)
+        else:
+            storage.add_message(user_id, session_id, message)
+            storage.update_session_metadata(user_id, session_id, greeted=True)
+            storage.get_session(user_id, session_id)
+        # Give the stream a chance to run between requests
+        await asyncio.sleep(0)
+
+
+async def measure(storage: SessionStorageBackend, sessions: list[tuple[str, str]], writes: int,
+                  tick_ms: float, use_async: bool) -> tuple[list[float], float]:
+    """Run the writers next to a stream; return (tick lateness in ms, seconds for all writes)."""
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(stream(tick_ms, stop))
+    await asyncio.sleep(tick_ms / 1000 * 5)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(storage, user_id, session_id, writes, use_async) for user_id, session_id in sessions))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    return await ticker, elapsed
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def run(backend: str, writers: int, writes: int, messages: int, tick_ms: float):
+    with tempfile.TemporaryDirectory() as data_dir:
+        settings.session_data_dir = os.path.join(data_dir, "sessions")
+        settings.session_sqlite_path = os.path.join(data_dir, "sessions.db")
+        storage = create_storage(backend)
+        sessions = create_sessions(storage, writers, messages)
+
+        print(f"Backend {backend}: {writers} writers x {writes} writes, {messages} messages per session, "
+              f"stream tick {tick_ms} ms")
+        print(f"{'storage calls':<16}{'ticks':>8}{'mean (ms)':>11}{'p99 (ms)':>10}{'max (ms)':>10}{'writes/s':>10}")
+        for name, use_async in (("sync in loop", False), ("async (a*)", True)):
+            lateness, elapsed = await measure(storage, sessions, writes, tick_ms, use_async)
+            print(
+                f"{name:<16}{len(lateness):>8}{statistics.mean(lateness):>11.2f}"
+                f"{percentile(lateness, 0.99):>10.2f}{max(lateness):>10.2f}{writers * writes / elapsed:>10.0f}"
+            )
+        storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="json", choices=["json", "sqlite"])
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--tick-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.backend, args.writers, args.writes, args.messages, args.tick_ms))
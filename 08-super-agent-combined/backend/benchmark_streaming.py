@@ -0,0 +1,80 @@
+"""
+Benchmark for SSE text streaming with and without chunk coalescing.
+
+Streams the mock service and a synthetic LLM-like token stream through the
+same path as /api/chat-stream (optionally wrapped in coalesce_text_events)
+and reports total time, number of SSE events and bytes written. The synthetic
+stream is also measured with the former 10 ms sleep per chunk for comparison.
+
+Usage:
+    python benchmark_streaming.py [--tokens 2000] [--token-gap-ms 2] [--window-ms 15] [--max-bytes 1024]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from typing import AsyncGenerator
+
+# Add backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+from app.services.mock_service import generate_mock_response  # noqa: E402
+from app.services.stream_utils import coalesce_text_events  # noqa: E402
+
+
+async def synthetic_tokens(count: int, gap_ms: float, sleep_ms: float = 0.0) -> AsyncGenerator[dict, None]:
+    """Yield `count` short text chunks with a model-like gap, plus an optional per-chunk sleep."""
+    for i in range(count):
+        await asyncio.sleep(gap_ms / 1000)
+        yield {"event": "text", "data": f" tok{i % 100}"}
+        if sleep_ms:
+            await asyncio.sleep(sleep_ms / 1000)
+    yield {"event": "end", "data": ""}
+
+
+def sse_frame(event: dict) -> str:
+    """Format an event the way the chat endpoint does."""
+    data = event["data"] if isinstance(event["data"], str) else str(event["data"])
+    lines = "".join(f"data: {line}\n" for line in data.split("\n"))
+    return f"event: {event['event']}\n{lines}\n"
+
+
+async def measure(events: AsyncGenerator[dict, None]) -> tuple[float, int, int]:
+    """Consume a stream and return (seconds, SSE events, bytes)."""
+    start = time.perf_counter()
+    count = size = 0
+    async for event in events:
+        count += 1
+        size += len(sse_frame(event).encode("utf-8"))
+    return time.perf_counter() - start, count, size
+
+
+async def run(tokens: int, gap_ms: float, window_ms: int, max_bytes: int):
+    def coalesced(events):
+        return coalesce_text_events(events, window_ms=window_ms, max_bytes=max_bytes)
+
+    scenarios = [
+        ("mock", lambda: generate_mock_response("show me a table")),
+        ("mock + coalesce", lambda: coalesced(generate_mock_response("show me a table"))),
+        (f"{tokens} tokens + 10ms sleep", lambda: synthetic_tokens(tokens, gap_ms, sleep_ms=10)),
+        (f"{tokens} tokens", lambda: synthetic_tokens(tokens, gap_ms)),
+        (f"{tokens} tokens + coalesce", lambda: coalesced(synthetic_tokens(tokens, gap_ms))),
+    ]
+
+    print(f"Coalescing window {window_ms} ms, max {max_bytes} bytes; synthetic token gap {gap_ms} ms")
+    print(f"{'scenario':<30}{'time (s)':>10}{'events':>10}{'bytes':>10}")
+    for name, factory in scenarios:
+        seconds, count, size = await measure(factory())
+        print(f"{name:<30}{seconds:>10.2f}{count:>10}{size:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--token-gap-ms", type=float, default=2.0)
+    parser.add_argument("--window-ms", type=int, default=15)
+    parser.add_argument("--max-bytes", type=int, default=1024)
+    args = parser.parse_args()
+    asyncio.run(run(args.tokens, args.token_gap_ms, args.window_ms, args.max_bytes))
@@ -0,0 +1,28 @@
+"""Minimal FastMCP server for the MCP pool tests: python fastmcp_server.py <port>."""
+import sys
+
+from mcp.server.fastmcp import Context, FastMCP
+
+mcp = FastMCP("pool-test", port=int(sys.argv[1]))
+
+
+@mcp.tool()
+def add(a: int, b: int) -> int:
+    """Add two numbers."""
+    return a + b
+
+
+@mcp.tool()
+async def register_multiply(ctx: Context) -> str:
+    """Register the multiply tool and notify clients that the tool list changed."""
+    def multiply(a: int, b: int) -> int:
+        """Multiply two numbers."""
+        return a * b
+
+    mcp.add_tool(multiply)
+    await ctx.session.send_tool_list_changed()
+    return "registered"
+
+
+if __name__ == "__main__":
+    mcp.run("streamable-http")
@@ -0,0 +1,98 @@
+"""Tests for DeepAgent response streaming with a fake chat model."""
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import StructuredTool
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.services import deepagent_service
+
+FINAL_ANSWER = "Revenue in 2024 was 42 million."
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Fake chat model returning scripted replies, one per call."""
+
+    replies: Iterator[AIMessage]
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=next(self.replies))])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return self
+
+
+class StaticToolPool:
+    """Stands in for the MCP connection pool with a fixed tool list."""
+
+    def __init__(self, tools):
+        self.tools = tools
+
+    async def get_tools(self):
+        return self.tools
+
+
+@pytest.fixture
+def tool_calls(monkeypatch) -> List[str]:
+    """Wire the service to a scripted model and a recording tool; returns the tool's calls."""
+    calls: List[str] = []
+
+    def get_revenue(year: str) -> str:
+        calls.append(year)
+        return "42 million"
+
+    tool = StructuredTool.from_function(get_revenue, name="get_revenue", description="Get the revenue of a year.")
+    model = ScriptedChatModel(replies=iter([
+        AIMessage(content="", tool_calls=[{"name": "get_revenue", "args": {"year": "2024"}, "id": "call-1"}]),
+        AIMessage(content=FINAL_ANSWER),
+    ]))
+    checkpointer = InMemorySaver()
+
+    async def get_checkpointer():
+        return checkpointer
+
+    async def has_checkpoint(user_id, session_id):
+        return False
+
+    monkeypatch.setattr(deepagent_service, "_agent_cache", OrderedDict())
+    monkeypatch.setattr(deepagent_service, "_get_model", lambda: model)
+    monkeypatch.setattr(deepagent_service, "get_mcp_pool", lambda: StaticToolPool([tool]))
+    monkeypatch.setattr(deepagent_service, "get_checkpointer", get_checkpointer)
+    monkeypatch.setattr(deepagent_service, "has_checkpoint", has_checkpoint)
+    return calls
+
+
+async def collect(message: str) -> List[dict]:
+    return [event async for event in deepagent_service.generate_deepagent_response(message)]
+
+
+def answer_text(events: List[dict]) -> str:
+    return "".join(event["data"] for event in events if event["event"] == "text")
+
+
+async def test_streamed_answer_runs_tool_once(tool_calls):
+    events = await collect("What was the revenue in 2024?")
+
+    assert tool_calls == ["2024"]
+    assert answer_text(events) == FINAL_ANSWER
+    assert [event["event"] for event in events if event["event"].startswith("tool_")] == ["tool_start", "tool_end"]
+    assert events[-1]["event"] == "end"
+
+
+async def test_fallback_answer_from_state_runs_tool_once(tool_calls, monkeypatch):
+    # A model that streams no text: the answer must come from the captured state, not a second run
+    monkeypatch.setattr(deepagent_service, "_text_from_chunk", lambda chunk: [])
+
+    events = await collect("What was the revenue in 2024?")
+
+    assert tool_calls == ["2024"]
+    assert answer_text(events) == FINAL_ANSWER
+    assert events[-1]["event"] == "end"
@@ -0,0 +1,93 @@
+"""Tests for the LLM service's use of stored chat history."""
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.models.schemas import ChatMessage
+from app.services import llm_service
+from app.services.context_window import ContextWindow
+from app.services.session_storage import SessionStorage
+
+
+class RecordingChatModel(BaseChatModel):
+    """Fake chat model that records the messages of every call."""
+
+    calls: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls.append(messages)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="Revenue was 42."))])
+
+
+async def collect(events) -> List[dict]:
+    return [event async for event in events]
+
+
+async def test_stored_history_sends_new_message_once(tmp_path, monkeypatch):
+    model = RecordingChatModel(calls=[])
+    monkeypatch.setattr(llm_service, "_get_llm", lambda: model)
+    storage = SessionStorage(str(tmp_path))
+    session = storage.create_session("user-1")
+    for role, content in [
+        ("user", "Show me the sales data"),
+        ("assistant", "Here is the sales data."),
+        # Stored by the frontend before it starts the stream
+        ("user", "What was the revenue?"),
+    ]:
+        storage.add_message("user-1", session.session_id, ChatMessage(role=role, content=content))
+
+    events = await collect(llm_service.generate_llm_response(
+        "What was the revenue?", session_id=session.session_id, user_id="user-1", storage=storage
+    ))
+
+    assert [event["event"] for event in events] == ["text", "end"]
+    assert len(model.calls) == 1
+    sent = model.calls[0]
+    human_texts = [message.content for message in sent if isinstance(message, HumanMessage)]
+    assert human_texts == ["Show me the sales data", "What was the revenue?"]
+    assert sent[-1].content == "What was the revenue?"
+
+
+async def test_message_not_yet_stored_is_appended(tmp_path, monkeypatch):
+    model = RecordingChatModel(calls=[])
+    monkeypatch.setattr(llm_service, "_get_llm", lambda: model)
+    storage = SessionStorage(str(tmp_path))
+    session = storage.create_session("user-1")
+    storage.add_message("user-1", session.session_id, ChatMessage(role="user", content="Hello"))
+    storage.add_message("user-1", session.session_id, ChatMessage(role="assistant", content="Hi!"))
+
+    await collect(llm_service.generate_llm_response(
+        "What was the revenue?", session_id=session.session_id, user_id="user-1", storage=storage
+    ))
+
+    human_texts = [message.content for message in model.calls[0] if isinstance(message, HumanMessage)]
+    assert human_texts == ["Hello", "What was the revenue?"]
+
+
+async def test_summary_is_part_of_the_single_system_message(tmp_path, monkeypatch):
+    model = RecordingChatModel(calls=[])
+    monkeypatch.setattr(llm_service, "_get_llm", lambda: model)
+    storage = SessionStorage(str(tmp_path))
+    session = storage.create_session("user-1")
+    storage.add_message("user-1", session.session_id, ChatMessage(role="user", content="Hello"))
+    storage.add_message("user-1", session.session_id, ChatMessage(role="assistant", content="Hi!"))
+
+    async def summarized_window(storage, user_id, session, messages, model_name):
+        return ContextWindow(summary="The user asked about Q1 sales.", messages=messages[-1:], tokens=0)
+
+    monkeypatch.setattr(llm_service, "build_context_window", summarized_window)
+
+    await collect(llm_service.generate_llm_response(
+        "What was the revenue?", session_id=session.session_id, user_id="user-1", storage=storage
+    ))
+
+    sent = model.calls[0]
+    system_messages = [message for message in sent if isinstance(message, SystemMessage)]
+    assert len(system_messages) == 1 and sent[0] is system_messages[0]
+    assert "The user asked about Q1 sales." in system_messages[0].content
@@ -0,0 +1,124 @@
+"""Tests for the MCP connection pool against a local FastMCP server."""
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from app.core.config import settings
+from app.services import mcp_pool
+from app.services.mcp_pool import MCPConnectionPool
+
+SERVER_SCRIPT = Path(__file__).parent / "fastmcp_server.py"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class LocalServer:
+    """FastMCP server in a subprocess that can be stopped and restarted on the same port."""
+
+    def __init__(self):
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}/mcp"
+        self.process = None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [sys.executable, str(SERVER_SCRIPT), str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 15
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.2).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise RuntimeError("FastMCP test server did not start")
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+
+@pytest.fixture
+def server():
+    local_server = LocalServer()
+    local_server.start()
+    yield local_server
+    if local_server.process.poll() is None:
+        local_server.stop()
+
+
+@pytest.fixture
+async def pool(server, monkeypatch):
+    # Fast health checks and reconnects so the tests do not wait for the production intervals
+    monkeypatch.setattr(settings, "mcp_health_interval_seconds", 0.2)
+    monkeypatch.setattr(settings, "mcp_reconnect_max_seconds", 0.5)
+    monkeypatch.setattr(mcp_pool, "_RECONNECT_BASE_SECONDS", 0.1)
+    connection_pool = MCPConnectionPool({"transport": "streamable_http", "url": server.url}, size=2)
+    yield connection_pool
+    await connection_pool.close()
+
+
+async def wait_for(condition: Callable[[], bool], timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        await asyncio.sleep(0.05)
+
+
+def ready_sessions(pool: MCPConnectionPool) -> int:
+    return sum(1 for session in pool._sessions if session.state == "ready")
+
+
+async def call(pool: MCPConnectionPool, name: str, arguments: dict):
+    tools = {tool.name: tool for tool in await pool.get_tools()}
+    return await tools[name].ainvoke(arguments)
+
+
+async def test_pooled_sessions_connect_and_call_tools(pool):
+    tools = await pool.get_tools()
+
+    assert sorted(tool.name for tool in tools) == ["add", "register_multiply"]
+    assert "5" in str(await call(pool, "add", {"a": 2, "b": 3}))
+    await wait_for(lambda: ready_sessions(pool) == 2)
+    # Unchanged definitions keep the same tool objects, so compiled agent graphs stay cached
+    assert await pool.get_tools() is tools
+
+
+async def test_reconnects_after_server_restart(pool, server):
+    assert "5" in str(await call(pool, "add", {"a": 2, "b": 3}))
+
+    server.stop()
+    # Failed pings end the sessions, which then back off and retry
+    await wait_for(lambda: ready_sessions(pool) == 0)
+    with pytest.raises(mcp_pool.MCPUnavailableError):
+        await pool.call_tool("add", {"a": 1, "b": 1})
+
+    server.start()
+    await wait_for(lambda: ready_sessions(pool) == 2)
+    assert "7" in str(await call(pool, "add", {"a": 3, "b": 4}))
+
+
+async def test_tool_list_changed_reloads_tools(pool):
+    await call(pool, "register_multiply", {})
+
+    async def tool_names():
+        return {tool.name for tool in await pool.get_tools()}
+
+    deadline = time.monotonic() + 15
+    while "multiply" not in await tool_names():
+        assert time.monotonic() < deadline, "Tool list was not reloaded"
+        await asyncio.sleep(0.05)
+    assert "6" in str(await call(pool, "multiply", {"a": 2, "b": 3}))
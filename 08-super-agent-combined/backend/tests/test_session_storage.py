@@ -0,0 +1,104 @@
+"""Tests for attachment handling in the session storage backends."""
+import base64
+
+import pytest
+
+from app.models.schemas import ChatAttachment, ChatMessage
+from app.services import attachment_store as attachment_store_module
+from app.services.attachment_store import AttachmentStore
+from app.services.session_storage import SessionStorage
+from app.services.sqlite_session_storage import SqliteSessionStorage
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n fake image"
+
+
+@pytest.fixture
+def blobs(tmp_path, monkeypatch) -> AttachmentStore:
+    store = AttachmentStore(str(tmp_path / "attachments"))
+    monkeypatch.setattr(attachment_store_module, "_attachment_store", store)
+    return store
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path, blobs):
+    if request.param == "json":
+        backend = SessionStorage(str(tmp_path / "sessions"))
+    else:
+        backend = SqliteSessionStorage(str(tmp_path / "sessions.db"))
+    yield backend
+    backend.close()
+
+
+def image_message(content: bytes = PNG_BYTES) -> ChatMessage:
+    attachment = ChatAttachment(
+        id="att-1", name="chart.png", mime_type="image/png", size=len(content),
+        data=base64.b64encode(content).decode("ascii"),
+    )
+    return ChatMessage(role="user", content="What does this chart show?", attachments=[attachment])
+
+
+def blob_count(blobs: AttachmentStore) -> int:
+    return sum(1 for path in blobs.data_dir.rglob("*") if path.is_file() and path.suffix != ".mime")
+
+
+def test_add_message_stores_blob_reference_without_modifying_message(storage, blobs):
+    session = storage.create_session("alice")
+    message = image_message()
+
+    assert storage.add_message("alice", session.session_id, message)
+
+    assert message.attachments[0].data is not None
+    assert message.attachments[0].hash is None
+    stored = storage.get_session("alice", session.session_id).messages[0].attachments[0]
+    assert stored.data is None
+    assert blobs.read_base64(stored.hash) == message.attachments[0].data
+    assert storage.references_attachment("alice", stored.hash)
+    assert not storage.references_attachment("bob", stored.hash)
+
+
+def test_add_message_to_unknown_session_writes_no_blob(storage, blobs):
+    storage.create_session("alice")
+
+    assert not storage.add_message("alice", "no-such-session", image_message())
+
+    assert blob_count(blobs) == 0
+
+
+def test_update_session_keeps_callers_attachment_data(storage):
+    session = storage.create_session("alice")
+    session.messages.append(image_message())
+
+    storage.update_session("alice", session)
+
+    assert session.messages[0].attachments[0].data is not None
+    stored = storage.get_session("alice", session.session_id).messages[0].attachments[0]
+    assert stored.data is None and stored.hash
+
+
+def test_attachment_references_follow_updates_and_deletes(storage):
+    first = storage.create_session("alice")
+    second = storage.create_session("alice")
+    storage.add_message("alice", first.session_id, image_message())
+    storage.add_message("alice", second.session_id, image_message())
+    blob_hash = storage.get_session("alice", first.session_id).messages[0].attachments[0].hash
+
+    storage.delete_session("alice", first.session_id)
+    assert storage.references_attachment("alice", blob_hash)
+
+    session = storage.get_session("alice", second.session_id)
+    session.messages = []
+    storage.update_session("alice", session)
+    assert not storage.references_attachment("alice", blob_hash)
+
+
+def test_attachment_map_is_built_for_existing_users(tmp_path, blobs):
+    storage = SessionStorage(str(tmp_path / "sessions"))
+    session = storage.create_session("alice")
+    storage.add_message("alice", session.session_id, image_message())
+    blob_hash = storage.get_session("alice", session.session_id).messages[0].attachments[0].hash
+    # Data written before the map existed
+    storage._attachment_index_file("alice").unlink()
+
+    assert storage.references_attachment("alice", blob_hash)
+    assert storage._attachment_index_file("alice").exists()
+    assert not storage.references_attachment("alice", "0" * 64)
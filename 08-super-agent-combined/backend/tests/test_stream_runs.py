@@ -0,0 +1,66 @@
+"""Tests for spilling and purging of resumable stream runs."""
+import asyncio
+
+from app.core.config import settings
+from app.services import stream_runs
+from app.services.stream_runs import StreamRun, StreamRunManager
+
+
+async def text_events(count: int):
+    for i in range(count):
+        yield {"event": "text", "data": f"token {i} "}
+        # Let spill writes interleave with production, as with a real model stream
+        await asyncio.sleep(0)
+    yield {"event": "end", "data": ""}
+
+
+async def replay(run: StreamRun, after_seq: int = 0):
+    return [item async for item in run.subscribe(after_seq)]
+
+
+async def test_replay_includes_spilled_events(tmp_path):
+    run = StreamRun("run-1", "alice", buffer_size=5, spill_dir=tmp_path)
+    await run.produce(text_events(50))
+
+    events = await replay(run)
+
+    assert [seq for seq, _ in events] == list(range(1, 52))
+    assert events[10][1] == {"event": "text", "data": "token 10 "}
+    assert run._spill_path.exists()
+
+    await run.cleanup()
+    assert not run._spill_path.exists()
+
+
+async def test_replay_while_producing_has_no_gaps_or_duplicates(tmp_path):
+    run = StreamRun("run-2", "alice", buffer_size=3, spill_dir=tmp_path)
+    run.task = asyncio.create_task(run.produce(text_events(200)))
+
+    async def resume_later():
+        # Reconnects mid-run, when the events after 7 are in the spill file or still being written
+        for _ in range(50):
+            await asyncio.sleep(0)
+        return await replay(run, after_seq=7)
+
+    tail, late = await asyncio.gather(replay(run), resume_later())
+
+    assert [seq for seq, _ in tail] == list(range(1, 202))
+    assert [seq for seq, _ in late] == list(range(8, 202))
+    await run.cleanup()
+
+
+async def test_finished_runs_are_purged_without_new_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(stream_runs, "_PURGE_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "stream_run_ttl_seconds", 0.0)
+    monkeypatch.setattr(settings, "stream_run_spill_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "stream_run_buffer_events", 2)
+    manager = StreamRunManager()
+
+    run = manager.start("alice", text_events(10))
+    await run.task
+    assert manager.get(run.run_id, "alice") is run
+
+    await asyncio.sleep(0.1)
+    assert manager.get(run.run_id, "alice") is None
+    assert list(tmp_path.iterdir()) == []
+    await manager.close()
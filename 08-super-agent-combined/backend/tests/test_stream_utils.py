@@ -0,0 +1,50 @@
+"""Tests for the stream post-processing helpers."""
+import asyncio
+
+from app.services.stream_utils import batch_frames, coalesce_text_events, with_heartbeat
+
+
+async def endless_events():
+    """Source that produces events faster than anyone reads them."""
+    i = 0
+    while True:
+        yield {"event": "table", "data": {"row": i}}
+        i += 1
+        await asyncio.sleep(0)
+
+
+async def endless_frames():
+    async for event in endless_events():
+        yield f"data: {event['data']['row']}\n\n"
+
+
+async def close_with_full_queue(stream):
+    """Read one item, let the pump fill its queue, then close the stream."""
+    await stream.__anext__()
+    await asyncio.sleep(0.05)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.wait_for(stream.aclose(), timeout=2)
+    assert loop.time() - start < 1
+
+
+async def test_coalesce_closes_while_pump_queue_is_full():
+    await close_with_full_queue(coalesce_text_events(endless_events()))
+
+
+async def test_batch_frames_closes_while_pump_queue_is_full():
+    await close_with_full_queue(batch_frames(endless_frames()))
+
+
+async def test_heartbeat_closes_while_pump_queue_is_full():
+    await close_with_full_queue(with_heartbeat(endless_frames(), 10, lambda: ": ping\n\n"))
+
+
+async def test_coalesce_merges_text_and_keeps_order():
+    async def events():
+        for text in ["Hel", "lo", " world"]:
+            yield {"event": "text", "data": text}
+        yield {"event": "end", "data": ""}
+
+    merged = [event async for event in coalesce_text_events(events(), window_ms=50)]
+    assert merged == [{"event": "text", "data": "Hello world"}, {"event": "end", "data": ""}]
@@ -0,0 +1,54 @@
+"""Tests for the scoping of cached MCP tool results."""
+from typing import List
+
+from mcp import types
+
+from app.services.tool_cache import ToolResultCache, tool_cache_scope
+
+
+def counting_call(calls: List[str], name: str):
+    async def call() -> types.CallToolResult:
+        calls.append(name)
+        return types.CallToolResult(content=[types.TextContent(type="text", text=f"result {len(calls)}")])
+    return call
+
+
+def build_cache() -> ToolResultCache:
+    return ToolResultCache(ttls=[], default_ttl=60, metadata_ttl=60, global_tools=["get_*_documentation"])
+
+
+async def test_results_are_not_shared_between_users():
+    cache = build_cache()
+    calls: List[str] = []
+    args = {"entity": "A_Product", "top": 5}
+
+    tool_cache_scope.set("alice")
+    first = await cache.get_or_call("product_api", args, counting_call(calls, "product_api"))
+    again = await cache.get_or_call("product_api", args, counting_call(calls, "product_api"))
+    tool_cache_scope.set("bob")
+    other_user = await cache.get_or_call("product_api", args, counting_call(calls, "product_api"))
+
+    assert len(calls) == 2
+    assert again is first
+    assert other_user is not first
+
+
+async def test_global_tools_are_shared_between_users():
+    cache = build_cache()
+    calls: List[str] = []
+
+    for user_id in ("alice", "bob"):
+        tool_cache_scope.set(user_id)
+        await cache.get_or_call("get_product_api_documentation", {}, counting_call(calls, "docs"))
+
+    assert calls == ["docs"]
+
+
+async def test_calls_without_user_are_not_cached():
+    cache = build_cache()
+    calls: List[str] = []
+
+    for _ in range(2):
+        await cache.get_or_call("product_api", {}, counting_call(calls, "product_api"))
+
+    assert len(calls) == 2
@@ -89,7 +89,8 @@ export function ChatInput() {
         {
           message: messageToSend,
           session_id: activeSessionId || undefined,
-          timezone: Intl.DateTimeFormat().resolvedOptions().timeZone
+          timezone: Intl.DateTimeFormat().resolvedOptions().timeZone,
+          coalesce: true
         },
         (event: SSEEvent) => {
           // Handle each SSE event
@@ -18,9 +18,16 @@ export async function checkHealth(): Promise<HealthResponse> {
   return response.json();
 }
 
+// Reconnect attempts after the connection drops mid-answer
+const MAX_RESUME_ATTEMPTS = 3;
+
 /**
  * Stream chat responses using Server-Sent Events (SSE).
  * 
+ * The answer is produced by a backend run that survives dropped connections:
+ * if the stream ends before the 'end' event, it is resumed from the last
+ * received event id (GET /api/chat-stream/{run_id} with Last-Event-ID).
+ * 
  * @param request - Chat request with message and optional session_id
  * @param onEvent - Callback for each SSE event
  * @param onError - Callback for errors
@@ -33,82 +40,118 @@ export async function streamChat(
   onComplete: () => void
 ): Promise<void> {
   try {
-    const response = await fetch(`${API_BASE_URL}/api/chat-stream`, {
+    let response = await fetch(`${API_BASE_URL}/api/chat-stream`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify(request),
     });
+    const runId = response.headers.get('X-Run-Id');
+    const position = { lastEventId: null as string | null };
+
+    for (let attempt = 0; ; attempt++) {
+      try {
+        if (await readEventStream(response, onEvent, position)) {
+          onComplete();
+          return;
+        }
+      } catch (error) {
+        if (!runId || attempt >= MAX_RESUME_ATTEMPTS) {
+          throw error;
+        }
+        console.warn('Chat stream interrupted, resuming:', error);
+      }
+      if (!runId || attempt >= MAX_RESUME_ATTEMPTS) {
+        break;
+      }
 
-    if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+      await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+      response = await fetch(`${API_BASE_URL}/api/chat-stream/${runId}`, {
+        headers: position.lastEventId ? { 'Last-Event-ID': position.lastEventId } : {},
+      });
     }
 
-    if (!response.body) {
-      throw new Error('Response body is null');
-    }
+    onComplete();
+  } catch (error) {
+    onError(error instanceof Error ? error : new Error(String(error)));
+  }
+}
+
+/**
+ * Read SSE events from a chat stream response.
+ * 
+ * @returns true if the 'end' event was received, false if the stream closed early
+ */
+async function readEventStream(
+  response: Response,
+  onEvent: (event: SSEEvent) => void,
+  position: { lastEventId: string | null }
+): Promise<boolean> {
+  if (!response.ok) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
 
-    // Read the stream
-    const reader = response.body.getReader();
-    const decoder = new TextDecoder();
-    let buffer = '';
+  if (!response.body) {
+    throw new Error('Response body is null');
+  }
 
-    while (true) {
-      const { done, value } = await reader.read();
-      
-      if (done) {
-        break;
-      }
+  // Read the stream
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
 
-      // Decode the chunk and add to buffer
-      buffer += decoder.decode(value, { stream: true });
-
-      // Process complete SSE messages
-      // Split by double newline to get complete events (SSE spec)
-      const events = buffer.split('\n\n');
-      buffer = events.pop() || ''; // Keep incomplete event in buffer
-
-      for (const eventBlock of events) {
-        if (!eventBlock.trim()) continue;
-
-        let currentEvent: string | null = null;
-        const dataLines: string[] = [];
-
-        // Parse each line in the event block
-        const lines = eventBlock.split('\n');
-        for (const line of lines) {
-          if (line.startsWith('event:')) {
-            currentEvent = line.substring(6).trim();
-          } else if (line.startsWith('data:')) {
-            // Remove 'data:' prefix and the single space after it (SSE spec)
-            // Multiple data lines are joined with newlines
-            dataLines.push(line.substring(6));
-          }
+  while (true) {
+    const { done, value } = await reader.read();
+    
+    if (done) {
+      return false;
+    }
+
+    // Decode the chunk and add to buffer
+    buffer += decoder.decode(value, { stream: true });
+
+    // Process complete SSE messages
+    // Split by double newline to get complete events (SSE spec)
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || ''; // Keep incomplete event in buffer
+
+    for (const eventBlock of events) {
+      if (!eventBlock.trim()) continue;
+
+      let currentEvent: string | null = null;
+      const dataLines: string[] = [];
+
+      // Parse each line in the event block
+      const lines = eventBlock.split('\n');
+      for (const line of lines) {
+        if (line.startsWith('event:')) {
+          currentEvent = line.substring(6).trim();
+        } else if (line.startsWith('data:')) {
+          // Remove 'data:' prefix and the single space after it (SSE spec)
+          // Multiple data lines are joined with newlines
+          dataLines.push(line.substring(6));
+        } else if (line.startsWith('id:')) {
+          position.lastEventId = line.substring(3).trim();
         }
+      }
 
-        // Process the complete event
-        if (currentEvent && dataLines.length > 0) {
-          try {
-            const currentData = dataLines.join('\n');
-            const event = parseSSEEvent(currentEvent, currentData);
-            onEvent(event);
-            
-            // Check if this is the end event
-            if (event.type === 'end') {
-              onComplete();
-              return;
-            }
-          } catch (error) {
-            console.error('Error parsing SSE event:', error);
+      // Process the complete event
+      if (currentEvent && dataLines.length > 0) {
+        try {
+          const currentData = dataLines.join('\n');
+          const event = parseSSEEvent(currentEvent, currentData);
+          onEvent(event);
+          
+          // Check if this is the end event
+          if (event.type === 'end') {
+            return true;
           }
+        } catch (error) {
+          console.error('Error parsing SSE event:', error);
         }
       }
     }
-
-    onComplete();
-  } catch (error) {
-    onError(error instanceof Error ? error : new Error(String(error)));
   }
 }
 
@@ -150,6 +193,15 @@ function parseSSEEvent(eventType: string, data: string): SSEEvent {
       };
     }
 
+    case 'tool_args_delta': {
+      const parsed = JSON.parse(data);
+      return {
+        type: 'tool_args_delta',
+        tool_id: parsed.tool_id,
+        delta: parsed.delta,
+      };
+    }
+
     case 'tool_end': {
       const parsed = JSON.parse(data);
       return {
@@ -159,6 +211,23 @@ function parseSSEEvent(eventType: string, data: string): SSEEvent {
       };
     }
 
+    case 'progress': {
+      const parsed = JSON.parse(data);
+      return {
+        type: 'progress',
+        elapsed_seconds: parsed.elapsed_seconds,
+      };
+    }
+
+    case 'queue': {
+      const parsed = JSON.parse(data);
+      return {
+        type: 'queue',
+        position: parsed.position,
+        queue_depth: parsed.queue_depth,
+      };
+    }
+
     default:
       throw new Error(`Unknown event type: ${eventType}`);
   }
@@ -26,7 +26,10 @@ function parseUtcTimestamp(ts: string): Date {
 }
 
 /**
- * Convert API attachment format to frontend format
+ * Convert API attachment format to frontend format.
+ *
+ * Stored attachments only carry a content hash; their bytes are served by
+ * the attachments endpoint. Inline base64 data is only present for legacy sessions.
  */
 function convertApiAttachment(apiAtt: ChatAttachmentApi) {
   return {
@@ -34,7 +37,9 @@ function convertApiAttachment(apiAtt: ChatAttachmentApi) {
     name: apiAtt.name,
     type: apiAtt.mime_type,
     size: apiAtt.size,
-    previewUrl: `data:${apiAtt.mime_type};base64,${apiAtt.data}`,
+    previewUrl: apiAtt.data
+      ? `data:${apiAtt.mime_type};base64,${apiAtt.data}`
+      : `${API_BASE_URL}/api/attachments/${apiAtt.hash}`,
   };
 }
 
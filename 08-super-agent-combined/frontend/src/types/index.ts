@@ -41,6 +41,7 @@ export interface ChatRequest {
   message: string;
   session_id?: string;
   timezone?: string;
+  coalesce?: boolean;  // Merge streamed text chunks into fewer events
 }
 
 export interface ChatSession {
@@ -80,7 +81,8 @@ export interface ChatAttachmentApi {
   name: string;
   mime_type: string;
   size: number;
-  data: string;
+  data?: string;
+  hash?: string;
 }
 
 export interface ChatMessageApi {
@@ -109,7 +111,7 @@ export interface TableData {
 // SSE Event Types
 // ============================================================================
 
-export type SSEEventType = 'text' | 'table' | 'error' | 'end' | 'tool_start' | 'tool_end';
+export type SSEEventType = 'text' | 'table' | 'error' | 'end' | 'tool_start' | 'tool_args_delta' | 'tool_end' | 'progress' | 'queue';
 
 export interface SSETextEvent {
   type: 'text';
@@ -137,13 +139,30 @@ export interface SSEToolStartEvent {
   args?: Record<string, unknown>;
 }
 
+export interface SSEToolArgsDeltaEvent {
+  type: 'tool_args_delta';
+  tool_id: string;
+  delta: string;  // Raw JSON fragment of the tool call arguments
+}
+
 export interface SSEToolEndEvent {
   type: 'tool_end';
   tool_id: string;
   success: boolean;
 }
 
-export type SSEEvent = SSETextEvent | SSETableEvent | SSEErrorEvent | SSEEndEvent | SSEToolStartEvent | SSEToolEndEvent;
+export interface SSEProgressEvent {
+  type: 'progress';
+  elapsed_seconds: number;  // Heartbeat while the backend is busy
+}
+
+export interface SSEQueueEvent {
+  type: 'queue';
+  position: number;  // Estimated position while waiting for a free slot
+  queue_depth: number;
+}
+
+export type SSEEvent = SSETextEvent | SSETableEvent | SSEErrorEvent | SSEEndEvent | SSEToolStartEvent | SSEToolArgsDeltaEvent | SSEToolEndEvent | SSEProgressEvent | SSEQueueEvent;
 
 // ============================================================================
 // Theme Types